@@ -0,0 +1,313 @@
+"""
+Headless performance benchmark of the annotation canvas.
+
+Runs the canvas engines (CanvasWidget and GraphicsCanvasWidget) on the offscreen Qt platform
+with synthetic scenes (N boxes or polygons with M vertices each, on images of several sizes)
+and writes the measurements to JSON, so the results of two releases or of the two engines can
+be compared. It does not need a display.
+
+Usage:
+    python benchmark/canvas_benchmark.py --objects 100 1000 5000 --vertices 4 32 --output results.json
+    python benchmark/canvas_benchmark.py --engines widget graphics --objects 1000 5000
+"""
+import os
+import sys
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir)))
+
+import argparse
+import contextlib
+import io
+import json
+import math
+import platform
+import random
+import statistics
+import tempfile
+import time
+from PyQt5.QtCore import QEvent, QObject, QPoint, QT_VERSION_STR, PYQT_VERSION_STR
+from PyQt5.QtGui import QColor, QImage, QPainter
+from PyQt5.QtWidgets import QApplication, QWidget
+from labelvim.utils.config import ANNOTATION_TYPE, ANNOTATION_MODE
+from labelvim.widgets.canvas_widget import CanvasWidget
+from labelvim.widgets.graphics_canvas import GraphicsCanvasWidget
+
+try:
+    import resource
+except ImportError: # not available on Windows
+    resource = None
+
+# the canvas engines, by the name given on the command line
+ENGINES = {
+    'widget': CanvasWidget,
+    'graphics': GraphicsCanvasWidget,
+}
+
+
+class PaintCounter(QObject):
+    """
+    Event filter counting the paint events of a widget.
+    """
+
+    def __init__(self):
+        super(PaintCounter, self).__init__()
+        self.count = 0
+
+    def eventFilter(self, obj, event):
+        if event.type() == QEvent.Paint:
+            self.count += 1
+        return False
+
+
+def peak_rss_mb():
+    """
+    Get the peak resident memory of the process.
+
+    Returns:
+        float: The peak RSS in MB, None if it can not be measured on this platform.
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def summary(samples):
+    """
+    Summarize timing samples.
+
+    Args:
+        samples (list): The timings in milliseconds.
+
+    Returns:
+        dict: The mean, median, 95th percentile and max of the samples.
+    """
+    ordered = sorted(samples)
+    return {
+        "mean_ms": statistics.fmean(ordered),
+        "p50_ms": ordered[len(ordered) // 2],
+        "p95_ms": ordered[min(int(len(ordered) * 0.95), len(ordered) - 1)],
+        "max_ms": ordered[-1],
+    }
+
+
+def timed(function, *args):
+    """
+    Call a function and time it.
+
+    Returns:
+        tuple: The elapsed time in milliseconds and the result of the function.
+    """
+    start = time.perf_counter()
+    result = function(*args)
+    return (time.perf_counter() - start) * 1000, result
+
+
+def make_image(directory, width, height):
+    """
+    Write a synthetic image with some structure to draw.
+
+    Args:
+        directory (str): The directory to write the image to.
+        width (int): The image width.
+        height (int): The image height.
+
+    Returns:
+        str: The path of the image.
+    """
+    file_name = os.path.join(directory, f'image_{width}x{height}.jpg')
+    if not os.path.exists(file_name):
+        image = QImage(width, height, QImage.Format_RGB32)
+        image.fill(QColor(40, 70, 100))
+        painter = QPainter(image)
+        painter.setPen(QColor(200, 200, 80))
+        for x in range(0, width, 97):
+            painter.drawLine(x, 0, width - x, height)
+        painter.end()
+        image.save(file_name, quality=90)
+    return file_name
+
+
+def make_annotations(count, vertices, width, height, annotation_type, rng):
+    """
+    Build synthetic annotations in the json format saved by the tool.
+
+    Args:
+        count (int): The number of objects.
+        vertices (int): The number of vertices of every polygon.
+        width (int): The image width.
+        height (int): The image height.
+        annotation_type (ANNOTATION_TYPE): BBOX for boxes only, POLYGON for polygons.
+        rng (random.Random): The random generator.
+
+    Returns:
+        list: The annotations.
+    """
+    annotations = []
+    max_size = max(int(math.sqrt(width * height / max(count, 1))), 8)
+    for object_id in range(count):
+        w, h = rng.randint(4, max_size), rng.randint(4, max_size)
+        x, y = rng.randint(0, width - w - 1), rng.randint(0, height - h - 1)
+        segmentation = []
+        if annotation_type == ANNOTATION_TYPE.POLYGON:
+            polygon = []
+            for i in range(vertices):
+                angle = 2 * math.pi * i / vertices
+                radius = 0.5 + 0.5 * rng.random()
+                polygon.append(int(x + w / 2 + radius * w / 2 * math.cos(angle)))
+                polygon.append(int(y + h / 2 + radius * h / 2 * math.sin(angle)))
+            segmentation.append(polygon)
+        annotations.append({"id": object_id, "category_id": object_id % 5, "bbox": [x, y, w, h],
+                            "area": w * h, "segmentation": segmentation, "iscrowd": 0})
+    return annotations
+
+
+def random_widget_points(canvas, count, rng):
+    """
+    Pick random positions over the displayed image.
+
+    Returns:
+        list: The QPoint positions in widget coordinates.
+    """
+    offset_x, offset_y = canvas.image_offset()
+    return [QPoint(offset_x + rng.randrange(canvas.display_size.width()),
+                   offset_y + rng.randrange(canvas.display_size.height())) for _ in range(count)]
+
+
+def wait_for_background(app, canvas, timeout=60):
+    """
+    Process events until the image pyramid and the idle smooth repaint are done.
+    """
+    deadline = time.perf_counter() + timeout
+    while (canvas.pyramid_builder is not None or canvas.smooth_zoom_timer.isActive()) and time.perf_counter() < deadline:
+        app.processEvents()
+
+
+def run_scene(app, engine, image_file, image_size, count, vertices, annotation_type, args, rng):
+    """
+    Measure one synthetic scene on one canvas engine.
+
+    Returns:
+        dict: The measurements of the scene.
+    """
+    width, height = image_size
+    root = QWidget()
+    root.resize(1400, 820)
+    canvas = ENGINES[engine](root)
+    # the graphics view paints on its viewport
+    surface = canvas.viewport() if engine == 'graphics' else canvas
+    counter = PaintCounter()
+    surface.installEventFilter(counter)
+    annotations = make_annotations(count, vertices, width, height, annotation_type, rng)
+    result = {"engine": engine, "image": f"{width}x{height}", "type": annotation_type.name, "objects": count,
+              "vertices": vertices if annotation_type == ANNOTATION_TYPE.POLYGON else 4}
+    # the canvas reports its progress with print, keep it out of the benchmark output
+    with contextlib.redirect_stdout(io.StringIO()):
+        canvas.update_annotation_type(annotation_type)
+        canvas.update_label_list([f'label_{i}' for i in range(5)])
+        root.show()
+        start = time.perf_counter()
+        result["load_image_ms"], _ = timed(canvas.load_image, image_file)
+        # the pixels are decoded in a worker thread, the GUI thread only reads the header
+        while canvas.image_pyramid is None and canvas.image_loader is not None and time.perf_counter() - start < 60:
+            app.processEvents()
+        # a large image is drawn from a preview decoded at the window resolution before the original
+        result["first_pixels_ms"] = (time.perf_counter() - start) * 1000
+        while canvas.image_loader is not None and time.perf_counter() - start < 60:
+            app.processEvents()
+        result["image_ready_ms"] = (time.perf_counter() - start) * 1000
+        wait_for_background(app, canvas)
+        result["from_json_ms"], _ = timed(canvas.update_annotation_from_json, annotations)
+        result["to_json_ms"], _ = timed(canvas.update_annotation_to_json)
+        canvas.set_annotation_mode(ANNOTATION_MODE.EDIT)
+        app.processEvents()
+
+        # the first frame records the overlay pictures, the next ones replay them
+        result["first_paint_ms"], _ = timed(surface.repaint)
+        result["paint_fit"] = summary([timed(surface.repaint)[0] for _ in range(args.frames)])
+
+        # the hit-tests run at fit to window zoom
+        points = random_widget_points(canvas, args.hit_tests, rng)
+        if annotation_type == ANNOTATION_TYPE.BBOX:
+            result["find_object_to_edit"] = summary([timed(canvas.find_object_to_edit, point)[0] for point in points])
+        else:
+            mapped = [canvas.map_to_original_image(point) for point in points]
+            result["find_polygon_to_edit"] = summary([timed(canvas.find_polygon_to_edit, point)[0] for point in mapped])
+
+        zoom_steps = []
+        for _ in range(args.zoom_steps):
+            elapsed, _ = timed(lambda: (canvas.zoom_in(), surface.repaint()))
+            zoom_steps.append(elapsed)
+        result["zoom_step"] = summary(zoom_steps)
+        wait_for_background(app, canvas)
+        result["paint_zoomed"] = summary([timed(surface.repaint)[0] for _ in range(args.frames)])
+
+        # an idle canvas should not paint at all
+        counter.count = 0
+        deadline = time.perf_counter() + args.idle_seconds
+        while time.perf_counter() < deadline:
+            app.processEvents()
+            time.sleep(0.001)
+        result["idle_paints_per_second"] = counter.count / args.idle_seconds
+    result["peak_rss_mb"] = peak_rss_mb()
+    root.close()
+    root.deleteLater()
+    app.processEvents()
+    return result
+
+
+def parse_size(value):
+    width, height = value.lower().split('x')
+    return int(width), int(height)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless performance benchmark of the annotation canvas.")
+    parser.add_argument('--objects', type=int, nargs='+', default=[100, 1000, 5000], help="Numbers of objects per scene.")
+    parser.add_argument('--vertices', type=int, nargs='+', default=[8, 64], help="Numbers of vertices per polygon.")
+    parser.add_argument('--image-sizes', type=parse_size, nargs='+', default=[(1920, 1080), (8000, 6000)], help="Image sizes, e.g. 1920x1080.")
+    parser.add_argument('--engines', nargs='+', choices=list(ENGINES), default=list(ENGINES), help="Canvas engines.")
+    parser.add_argument('--types', nargs='+', choices=['BBOX', 'POLYGON'], default=['BBOX', 'POLYGON'], help="Annotation types.")
+    parser.add_argument('--frames', type=int, default=20, help="Frames painted per measurement.")
+    parser.add_argument('--hit-tests', type=int, default=500, help="Hit-tests per scene.")
+    parser.add_argument('--zoom-steps', type=int, default=6, help="Zoom in steps per scene.")
+    parser.add_argument('--idle-seconds', type=float, default=1.0, help="Time spent counting idle repaints.")
+    parser.add_argument('--seed', type=int, default=0, help="Seed of the synthetic scenes.")
+    parser.add_argument('--output', default='canvas_benchmark.json', help="The json file to write the results to.")
+    args = parser.parse_args()
+
+    app = QApplication.instance() or QApplication(sys.argv)
+    rng = random.Random(args.seed)
+    scenes = []
+    with tempfile.TemporaryDirectory() as directory:
+        for image_size in args.image_sizes:
+            image_file = make_image(directory, *image_size)
+            for type_name in args.types:
+                annotation_type = ANNOTATION_TYPE[type_name]
+                vertex_counts = args.vertices if annotation_type == ANNOTATION_TYPE.POLYGON else [4]
+                for vertices in vertex_counts:
+                    for count in args.objects:
+                        # every engine is measured on the same objects and the same hit-test points
+                        state = rng.getstate()
+                        for engine in args.engines:
+                            print(f"{image_size[0]}x{image_size[1]} {type_name} objects={count} vertices={vertices} engine={engine}")
+                            rng.setstate(state)
+                            scenes.append(run_scene(app, engine, image_file, image_size, count, vertices, annotation_type, args, rng))
+    report = {
+        "created": time.strftime('%Y-%m-%dT%H:%M:%S'),
+        "platform": platform.platform(),
+        "python": platform.python_version(),
+        "qt": QT_VERSION_STR,
+        "pyqt": PYQT_VERSION_STR,
+        "qpa_platform": os.environ.get('QT_QPA_PLATFORM'),
+        "settings": {key: value for key, value in vars(args).items() if key != 'output'},
+        "scenes": scenes,
+    }
+    with open(args.output, 'w') as file:
+        json.dump(report, file, indent=2)
+    print(f"Results written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
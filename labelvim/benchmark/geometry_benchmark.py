@@ -0,0 +1,170 @@
+"""
+Micro-benchmarks of the geometry kernels against the per-point loops they replace.
+
+The loops are copies of the code the canvas and the exporters used before
+labelvim.utils.geometry: the QPolygon shoelace of CanvasWidget.calculate_polygon_area, one
+CanvasWidget.distance_to_line_segment call per edge, and the per-coordinate cocoseg2yolo.
+Every pair is checked to give the same result before it is timed.
+
+Usage:
+    python benchmark/geometry_benchmark.py --polygons 1000 --vertices 8 64 512 --output geometry_benchmark.json
+"""
+import os
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir)))
+
+import argparse
+import json
+import math
+import platform
+import random
+import time
+import numpy as np
+from PyQt5.QtCore import QPoint
+from PyQt5.QtGui import QPolygon
+from labelvim.utils import geometry
+
+
+## The loops replaced by the kernels
+
+def loop_polygon_area(polygon):
+    area = 0
+    polygon = QPolygon(polygon)
+    for i in range(polygon.count()):
+        j = (i + 1) % polygon.count()
+        area += polygon.point(i).x() * polygon.point(j).y()
+        area -= polygon.point(j).x() * polygon.point(i).y()
+    return abs(area) / 2
+
+
+def loop_distance(p1, p2):
+    return ((p1.x() - p2.x())**2 + (p1.y() - p2.y())**2)**0.5
+
+
+def loop_distance_to_line_segment(p, v, w):
+    l2 = loop_distance(v, w) ** 2
+    if l2 == 0.0:
+        return loop_distance(p, v)
+    t = max(0, min(1, ((p.x() - v.x()) * (w.x() - v.x()) + (p.y() - v.y()) * (w.y() - v.y())) / l2))
+    projection = QPoint(int(v.x() + t * (w.x() - v.x())), int(v.y() + t * (w.y() - v.y())))
+    return loop_distance(p, projection)
+
+
+def loop_cocoseg2yolo(segmentation, image_width, image_height):
+    yolo_segmentation = []
+    for i in range(0, len(segmentation), 2):
+        yolo_segmentation.append(segmentation[i] / image_width)
+        yolo_segmentation.append(segmentation[i+1] / image_height)
+    return yolo_segmentation
+
+
+def loop_bounds(polygon):
+    rect = QPolygon(polygon).boundingRect()
+    return rect.left(), rect.top(), rect.right(), rect.bottom()
+
+
+## Benchmark
+
+def timed(function, repeat):
+    """
+    Call a function several times and keep the best time.
+
+    Returns:
+        float: The best time of a call in milliseconds.
+    """
+    best = math.inf
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def make_polygons(count, vertices, rng, width=4000, height=3000):
+    """
+    Build random star shaped polygons, as flat [x0, y0, x1, y1, ...] lists.
+    """
+    polygons = []
+    for _ in range(count):
+        cx, cy, radius = rng.randint(100, width - 100), rng.randint(100, height - 100), rng.randint(10, 100)
+        polygon = []
+        for i in range(vertices):
+            angle = 2 * math.pi * i / vertices
+            scale = 0.5 + 0.5 * rng.random()
+            polygon += [int(cx + scale * radius * math.cos(angle)), int(cy + scale * radius * math.sin(angle))]
+        polygons.append(polygon)
+    return polygons
+
+
+def run_case(count, vertices, args, rng):
+    """
+    Measure every kernel against its loop on one set of polygons.
+
+    Returns:
+        dict: The loop and kernel time of every operation in milliseconds, and their ratio.
+    """
+    width, height = 4000, 3000
+    polygons = make_polygons(count, vertices, rng, width, height)
+    qpoints = [[QPoint(p[i], p[i + 1]) for i in range(0, len(p), 2)] for p in polygons]
+    points, starts, counts = geometry.pack_polygons(polygons)
+    points = points.astype(np.int32)
+    click = (polygons[0][0] + 3, polygons[0][1] + 4)
+    click_point = QPoint(*click)
+    following = np.concatenate([np.roll(np.arange(start, start + n), -1) for start, n in zip(starts, counts)])
+
+    cases = {
+        "area": (lambda: [loop_polygon_area(p) for p in qpoints],
+                 lambda: geometry.polygon_areas(points, starts, counts)),
+        "bounds": (lambda: [loop_bounds(p) for p in qpoints],
+                   lambda: geometry.polygon_bounds(points, starts, counts)),
+        "segment_distance": (lambda: [loop_distance_to_line_segment(click_point, p[i], p[(i + 1) % len(p)]) for p in qpoints for i in range(len(p))],
+                             lambda: geometry.point_segment_distances(click, points, points[following])),
+        "normalize": (lambda: [loop_cocoseg2yolo(p, width, height) for p in polygons],
+                      lambda: geometry.normalize_points(points, width, height)),
+    }
+    # the kernels must agree with the loops before they are compared
+    assert np.allclose(cases["area"][0](), cases["area"][1]())
+    assert np.array_equal(np.array(cases["bounds"][0]()), cases["bounds"][1]()[0])
+    # the loop rounds the projection to a pixel, the kernel does not
+    assert np.allclose(cases["segment_distance"][0](), cases["segment_distance"][1](), atol=1.5)
+    assert np.allclose(np.concatenate(cases["normalize"][0]()), cases["normalize"][1]().ravel())
+
+    result = {"polygons": count, "vertices": vertices}
+    for name, (loop, kernel) in cases.items():
+        loop_ms, kernel_ms = timed(loop, args.repeat), timed(kernel, args.repeat)
+        result[name] = {"loop_ms": loop_ms, "kernel_ms": kernel_ms, "speedup": loop_ms / kernel_ms if kernel_ms else None}
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Micro-benchmarks of the geometry kernels.")
+    parser.add_argument('--polygons', type=int, nargs='+', default=[100, 1000], help="Numbers of polygons per case.")
+    parser.add_argument('--vertices', type=int, nargs='+', default=[8, 64, 512], help="Numbers of vertices per polygon.")
+    parser.add_argument('--repeat', type=int, default=5, help="Runs per measurement, the best one is kept.")
+    parser.add_argument('--seed', type=int, default=0, help="Seed of the synthetic polygons.")
+    parser.add_argument('--output', default='geometry_benchmark.json', help="The json file to write the results to.")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    cases = []
+    for vertices in args.vertices:
+        for count in args.polygons:
+            result = run_case(count, vertices, args, rng)
+            print(f"polygons={count} vertices={vertices} " + " ".join(
+                f"{name}={result[name]['speedup']:.1f}x" for name in ("area", "bounds", "segment_distance", "normalize")))
+            cases.append(result)
+    report = {
+        "created": time.strftime('%Y-%m-%dT%H:%M:%S'),
+        "platform": platform.platform(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "settings": {key: value for key, value in vars(args).items() if key != 'output'},
+        "cases": cases,
+    }
+    with open(args.output, 'w') as file:
+        json.dump(report, file, indent=2)
+    print(f"Results written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -83,20 +83,23 @@ class AnnotationManager:
             Delete an annotation label by ID.
         
     """
-    def __init__(self, save_dir, file_name) -> None:
+    def __init__(self, save_dir, file_name, annotation=None) -> None:
         """
         Initialize the annotation manager with the save directory and file name.
         
         Args:
             save_dir (str): The directory to save the annotation label to.
             file_name (str): The name of the annotation label file.
+            annotation (dict, optional): The annotation label data already read from the file, e.g. by the prefetcher. Defaults to None.
         
         Example:
             >>> manager = AnnotationManager("data", "file_name.json")
         """
         self.save_dir = save_dir
         self.file_name = file_name
-        if self.check_annotation_exists():
+        if annotation is not None:
+            self.annotation = annotation
+        elif self.check_annotation_exists():
             self.annotation = self.load_annotation()
         else:
             self.annotation = {
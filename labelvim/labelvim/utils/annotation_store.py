@@ -0,0 +1,693 @@
+from itertools import islice
+import numpy as np
+from PyQt5.QtGui import QPolygon
+from labelvim.utils.config import ANNOTATION_CHANGE
+from labelvim.utils.geometry import polygon_areas, polygon_bounds
+
+
+class AnnotationRecord:
+    """
+    One annotation object of the store. The polygon vertices are not kept in the record,
+    only the offsets of its polygons in the coordinate buffer of the store.
+
+    Records can be read like the annotation dictionaries used before the store,
+    e.g. record['id'] or record['category_id'].
+
+    Attributes:
+        id (int): The id of the object.
+        category_id (int): The index of the label of the object.
+        bbox (list): The bounding box [x, y, width, height] of the object.
+        spans (list): The [start, count] of every polygon of the object in the coordinate buffer.
+        extents (list): The [x0, y0, x1, y1] bounds of every polygon of the object, None for a polygon without vertex.
+    """
+    __slots__ = ('id', 'category_id', 'bbox', 'spans', 'extents')
+
+    def __init__(self, object_id, category_id, bbox, spans=None, extents=None):
+        self.id = object_id
+        self.category_id = category_id
+        self.bbox = bbox
+        self.spans = spans if spans is not None else []
+        self.extents = extents if extents is not None else []
+
+    def __getitem__(self, key):
+        return getattr(self, key)
+
+    def __repr__(self):
+        return f"AnnotationRecord(id={self.id}, category_id={self.category_id}, bbox={self.bbox}, polygons={len(self.spans)})"
+
+
+class AnnotationChange:
+    """
+    A change of the objects of an AnnotationStore, sent to its listeners after every edit.
+
+    Attributes:
+        kind (ANNOTATION_CHANGE): What changed.
+        object_ids (list): The ids of the changed objects, every object of the store for RESET.
+        records (list): The AnnotationRecord of the added objects, of the objects whose category
+            changed, or of every object for RESET; empty for REMOVED and GEOMETRY.
+    """
+    __slots__ = ('kind', 'object_ids', 'records')
+
+    def __init__(self, kind, object_ids, records=()):
+        self.kind = kind
+        self.object_ids = list(object_ids)
+        self.records = list(records)
+
+    def __repr__(self):
+        return f"AnnotationChange({self.kind.name}, ids={self.object_ids})"
+
+
+def polygon_extent(points):
+    """
+    Get the bounds of the points of a polygon.
+
+    Args:
+        points (np.ndarray): The (n, 2) int32 array of the points.
+
+    Returns:
+        list: The [x0, y0, x1, y1] bounds, None if there is no point.
+    """
+    if not len(points):
+        return None
+    lower, upper = points.min(axis=0), points.max(axis=0)
+    return [int(lower[0]), int(lower[1]), int(upper[0]), int(upper[1])]
+
+
+def to_qpolygon(points):
+    """
+    Build a QPolygon from an array of points without creating a QPoint per vertex.
+
+    Args:
+        points (np.ndarray): The (n, 2) int32 array of the points.
+
+    Returns:
+        QPolygon: The polygon.
+    """
+    points = np.ascontiguousarray(points, dtype=np.int32)
+    polygon = QPolygon(len(points))
+    if len(points):
+        buffer = polygon.data()
+        buffer.setsize(points.nbytes)
+        np.frombuffer(buffer, dtype=np.int32)[:] = points.ravel()
+    return polygon
+
+
+class AnnotationStore:
+    """
+    Compact store of the annotation objects of an image. The vertices of every polygon of
+    every object live in one contiguous int32 buffer of (x, y) pairs, and every record keeps
+    the offsets of its polygons in it. Records are kept by id in drawing order, so finding,
+    adding and removing an object does not depend on the number of objects.
+
+    Every record also keeps the bounds of each of its polygons, updated by the edit methods,
+    so the bounding box of an object is found without reading its vertices. A moved vertex only
+    forces a new scan of its polygon when it was on the bounds and moved inside them.
+
+    Ids are stable: a new object gets the next value of a counter that only grows, and
+    removing an object does not change the id of the others.
+
+    A polygon that grows is moved to the end of the buffer, and removed objects leave their
+    vertices behind; the buffer is compacted once more than half of it is unused.
+
+    Every edit is reported to the listeners as an AnnotationChange holding only the ids of the
+    changed objects, so the views of the store can update in proportion to the edit. The COCO
+    dictionaries of to_coco are kept until their object changes.
+
+    Attributes:
+        objects (dict): The AnnotationRecord of every object keyed by id, in drawing order.
+        next_id (int): The id given to the next new object.
+        coords (np.ndarray): The (capacity, 2) int32 coordinate buffer.
+        size (int): The number of points in use at the start of the buffer.
+        garbage (int): The number of points in the buffer no polygon refers to.
+        listeners (list): The callables receiving the AnnotationChange of every edit.
+        coco (dict): The COCO dictionary of the unchanged objects, keyed by id.
+    """
+
+    def __init__(self, capacity: int = 1024):
+        """
+        Initializes the AnnotationStore.
+
+        Args:
+            capacity (int, optional): The initial number of points of the buffer. Defaults to 1024.
+        """
+        self.objects = {}
+        self.next_id = 0
+        self.coords = np.zeros((capacity, 2), dtype=np.int32)
+        self.size = 0
+        self.garbage = 0
+        self.listeners = []
+        self.coco = {}
+
+    def __len__(self):
+        return len(self.objects)
+
+    def __iter__(self):
+        return iter(self.objects.values())
+
+    def __contains__(self, object_id):
+        return object_id in self.objects
+
+    @property
+    def records(self):
+        """
+        list: The AnnotationRecord of every object, in drawing order.
+        """
+        return list(self.objects.values())
+
+    def get(self, object_id):
+        """
+        Get an object by its id.
+
+        Args:
+            object_id (int): The id of the object.
+
+        Returns:
+            AnnotationRecord: The object, None if there is no object with this id.
+        """
+        return self.objects.get(object_id)
+
+    def new_id(self):
+        """
+        Reserve the id of a new object.
+
+        Returns:
+            int: An id no object of the store ever had.
+        """
+        object_id = self.next_id
+        self.next_id += 1
+        return object_id
+
+    def clear(self):
+        """
+        Remove every object from the store.
+        """
+        self._reset()
+        self._notify(ANNOTATION_CHANGE.RESET, [])
+
+    def _reset(self):
+        self.objects = {}
+        self.next_id = 0
+        self.size = 0
+        self.garbage = 0
+        self.coco = {}
+
+    ## Change events
+
+    def subscribe(self, listener):
+        """
+        Send the changes of the store to a listener.
+
+        Args:
+            listener (callable): Called with the AnnotationChange of every edit.
+        """
+        self.listeners.append(listener)
+
+    def unsubscribe(self, listener):
+        """
+        Stop sending the changes of the store to a listener.
+
+        Args:
+            listener (callable): A subscribed listener.
+        """
+        if listener in self.listeners:
+            self.listeners.remove(listener)
+
+    def _notify(self, kind, object_ids, records=()):
+        if kind in (ANNOTATION_CHANGE.REMOVED, ANNOTATION_CHANGE.CATEGORY, ANNOTATION_CHANGE.GEOMETRY):
+            for object_id in object_ids:
+                self.coco.pop(object_id, None)
+        change = AnnotationChange(kind, object_ids, records)
+        for listener in self.listeners:
+            listener(change)
+
+    def geometry_changed(self, record):
+        """
+        Report an edit of an object made outside the store, e.g. of its bbox.
+
+        Args:
+            record (AnnotationRecord): The changed object.
+        """
+        self._notify(ANNOTATION_CHANGE.GEOMETRY, [record.id])
+
+    ## Coordinate buffer
+
+    def _reserve(self, count):
+        if self.size + count > len(self.coords):
+            capacity = max(len(self.coords) * 2, self.size + count)
+            coords = np.zeros((capacity, 2), dtype=np.int32)
+            coords[:self.size] = self.coords[:self.size]
+            self.coords = coords
+
+    def _append_points(self, points):
+        points = np.asarray(points, dtype=np.int32).reshape(-1, 2)
+        self._reserve(len(points))
+        start = self.size
+        self.coords[start:start + len(points)] = points
+        self.size += len(points)
+        return [start, len(points)]
+
+    def compact(self):
+        """
+        Move the polygons of every object to the start of the buffer, dropping the unused points.
+        """
+        spans = [span for record in self.objects.values() for span in record.spans]
+        count = sum(span[1] for span in spans)
+        coords = np.zeros((max(count, 1024), 2), dtype=np.int32)
+        position = 0
+        for span in spans:
+            start, length = span
+            coords[position:position + length] = self.coords[start:start + length]
+            span[0] = position
+            position += length
+        self.coords = coords
+        self.size = position
+        self.garbage = 0
+
+    def _release(self, count):
+        self.garbage += count
+        if self.garbage > self.size // 2:
+            self.compact()
+
+    ## Objects
+
+    def add(self, category_id, bbox, polygons=(), object_id=None, position=None):
+        """
+        Add an object on top of the others.
+
+        Args:
+            category_id (int): The index of the label of the object.
+            bbox (list): The bounding box [x, y, width, height] of the object.
+            polygons (list, optional): The polygons of the object, each a sequence of (x, y) points.
+            object_id (int, optional): The id of the object, a new id when None. Defaults to None.
+            position (int, optional): The index of the object in the drawing order, e.g. to put
+                back a removed object; on top of the others when None. Defaults to None.
+
+        Returns:
+            AnnotationRecord: The added object.
+        """
+        if object_id is None:
+            object_id = self.new_id()
+        else:
+            self.next_id = max(self.next_id, object_id + 1)
+        record = AnnotationRecord(object_id, category_id, list(bbox))
+        for points in polygons:
+            self._append_polygon(record, points)
+        if position is not None and position < len(self.objects):
+            items = list(self.objects.items())
+            items.insert(position, (object_id, record))
+            self.objects = dict(items)
+        else:
+            self.objects[object_id] = record
+        self._notify(ANNOTATION_CHANGE.ADDED, [object_id], [record])
+        return record
+
+    def restore_objects(self, objects):
+        """
+        Put many removed objects back at their places in the drawing order, e.g. to undo the
+        delete of a selection, reported to the listeners as one change.
+
+        Args:
+            objects (list): The (position, object_id, category_id, bbox, polygons) of every object,
+                by increasing position in the drawing order once they are all back.
+
+        Returns:
+            list: The added AnnotationRecord, in the order of objects.
+        """
+        records = []
+        for position, object_id, category_id, bbox, polygons in objects:
+            self.next_id = max(self.next_id, object_id + 1)
+            record = AnnotationRecord(object_id, category_id, list(bbox))
+            for points in polygons:
+                self._append_polygon(record, points)
+            records.append((position, record))
+        # one pass over the drawing order, instead of one per object
+        items = []
+        remaining = iter(self.objects.items())
+        for position, record in records:
+            while len(items) < position:
+                item = next(remaining, None)
+                if item is None:
+                    break
+                items.append(item)
+            items.append((record.id, record))
+        items.extend(remaining)
+        self.objects = dict(items)
+        if records:
+            self._notify(ANNOTATION_CHANGE.ADDED, [record.id for _, record in records], [record for _, record in records])
+        return [record for _, record in records]
+
+    def on_top(self, object_ids):
+        """
+        Check if objects are the top ones of the drawing order, e.g. when they were just added.
+
+        Args:
+            object_ids (list): The ids of the objects, from the bottom up.
+
+        Returns:
+            bool: True if the objects are on top of all the others, in this order.
+        """
+        return list(islice(reversed(self.objects), len(object_ids)))[::-1] == list(object_ids)
+
+    def _append_polygon(self, record, points):
+        span = self._append_points(points)
+        record.spans.append(span)
+        record.extents.append(polygon_extent(self.coords[span[0]:span[0] + span[1]]))
+
+    def add_polygon(self, record, points):
+        """
+        Add a polygon to an object.
+
+        Args:
+            record (AnnotationRecord): The object.
+            points (sequence): The (x, y) points of the polygon.
+        """
+        self._append_polygon(record, points)
+        self._notify(ANNOTATION_CHANGE.GEOMETRY, [record.id])
+
+    def remove_polygon(self, record, polygon_index):
+        """
+        Remove a polygon from an object.
+
+        Args:
+            record (AnnotationRecord): The object.
+            polygon_index (int): The index of the polygon in the object.
+        """
+        _, count = record.spans.pop(polygon_index)
+        record.extents.pop(polygon_index)
+        self._release(count)
+        self._notify(ANNOTATION_CHANGE.GEOMETRY, [record.id])
+
+    def set_category(self, record, category_id):
+        """
+        Change the label of an object.
+
+        Args:
+            record (AnnotationRecord): The object.
+            category_id (int): The index of the new label.
+        """
+        record.category_id = category_id
+        self._notify(ANNOTATION_CHANGE.CATEGORY, [record.id], [record])
+
+    def remove(self, object_id):
+        """
+        Remove an object. The polygons of the removed record are no longer readable from the store.
+
+        Args:
+            object_id (int): The id of the object.
+
+        Returns:
+            AnnotationRecord: The removed object, None if there is no object with this id.
+        """
+        record = self.objects.pop(object_id, None)
+        if record is None:
+            return None
+        self._release(sum(span[1] for span in record.spans))
+        self._notify(ANNOTATION_CHANGE.REMOVED, [object_id])
+        return record
+
+    def remove_objects(self, object_ids):
+        """
+        Remove many objects at once, reported to the listeners as one change.
+
+        Args:
+            object_ids (list): The ids of the objects, unknown ids are ignored.
+
+        Returns:
+            list: The removed AnnotationRecord, in the order of object_ids.
+        """
+        records = [self.objects.pop(object_id) for object_id in object_ids if object_id in self.objects]
+        if records:
+            self._release(sum(span[1] for record in records for span in record.spans))
+            self._notify(ANNOTATION_CHANGE.REMOVED, [record.id for record in records])
+        return records
+
+    def set_categories(self, records, category_id):
+        """
+        Change the label of many objects at once, reported to the listeners as one change.
+
+        Args:
+            records (list): The objects.
+            category_id (int): The index of the new label.
+        """
+        for record in records:
+            record.category_id = category_id
+        if records:
+            self._notify(ANNOTATION_CHANGE.CATEGORY, [record.id for record in records], records)
+
+    def position(self, object_id):
+        """
+        Get the index of an object in the drawing order.
+
+        Args:
+            object_id (int): The id of the object.
+
+        Returns:
+            int: The index, 0 for the bottom object, -1 if there is no object with this id.
+        """
+        for position, key in enumerate(self.objects):
+            if key == object_id:
+                return position
+        return -1
+
+    ## Polygons
+
+    def polygon(self, record, polygon_index):
+        """
+        Get the points of a polygon of an object.
+
+        Args:
+            record (AnnotationRecord): The object.
+            polygon_index (int): The index of the polygon in the object.
+
+        Returns:
+            np.ndarray: The (n, 2) int32 view of the points in the buffer, changes write through.
+        """
+        start, count = record.spans[polygon_index]
+        return self.coords[start:start + count]
+
+    def polygons(self, record):
+        """
+        Get the points of every polygon of an object.
+
+        Args:
+            record (AnnotationRecord): The object.
+
+        Returns:
+            list: The (n, 2) int32 view of every polygon.
+        """
+        return [self.coords[start:start + count] for start, count in record.spans]
+
+    def vertex_count(self, record):
+        """
+        Get the number of vertices of all the polygons of an object.
+
+        Args:
+            record (AnnotationRecord): The object.
+
+        Returns:
+            int: The number of vertices.
+        """
+        return sum(span[1] for span in record.spans)
+
+    def set_vertex(self, record, polygon_index, vertex_index, x, y):
+        """
+        Move a vertex of a polygon.
+
+        Args:
+            record (AnnotationRecord): The object.
+            polygon_index (int): The index of the polygon in the object.
+            vertex_index (int): The index of the vertex in the polygon.
+            x (int): The new x coordinate.
+            y (int): The new y coordinate.
+        """
+        start, _ = record.spans[polygon_index]
+        old_x, old_y = self.coords[start + vertex_index].tolist()
+        self.coords[start + vertex_index] = (x, y)
+        extent = record.extents[polygon_index]
+        if (extent is None or (old_x == extent[0] and x > old_x) or (old_x == extent[2] and x < old_x)
+                or (old_y == extent[1] and y > old_y) or (old_y == extent[3] and y < old_y)):
+            # the vertex left the bounds, they may have shrunk
+            record.extents[polygon_index] = polygon_extent(self.polygon(record, polygon_index))
+        else:
+            extent[0], extent[1] = min(extent[0], x), min(extent[1], y)
+            extent[2], extent[3] = max(extent[2], x), max(extent[3], y)
+        self._notify(ANNOTATION_CHANGE.GEOMETRY, [record.id])
+
+    def translate_polygon(self, record, polygon_index, dx, dy):
+        """
+        Move every vertex of a polygon.
+
+        Args:
+            record (AnnotationRecord): The object.
+            polygon_index (int): The index of the polygon in the object.
+            dx (int): The move along x.
+            dy (int): The move along y.
+        """
+        self.polygon(record, polygon_index)[:] += np.array((dx, dy), dtype=np.int32)
+        extent = record.extents[polygon_index]
+        if extent is not None:
+            record.extents[polygon_index] = [extent[0] + dx, extent[1] + dy, extent[2] + dx, extent[3] + dy]
+        self._notify(ANNOTATION_CHANGE.GEOMETRY, [record.id])
+
+    def translate_objects(self, records, dx, dy):
+        """
+        Move every vertex and the bounding box of many objects at once. The vertices of all
+        the objects are moved by one indexed addition over the buffer, and the move is
+        reported to the listeners as one change.
+
+        Args:
+            records (list): The objects.
+            dx (int): The move along x.
+            dy (int): The move along y.
+        """
+        spans = np.array([span for record in records for span in record.spans], dtype=np.int64).reshape(-1, 2)
+        if len(spans):
+            # the buffer index of every vertex of every span, without a loop over the spans
+            counts = spans[:, 1]
+            offsets = np.repeat(spans[:, 0] - np.cumsum(counts) + counts, counts)
+            self.coords[offsets + np.arange(len(offsets))] += np.array((dx, dy), dtype=np.int32)
+        for record in records:
+            record.bbox[0] += dx
+            record.bbox[1] += dy
+            record.extents = [[extent[0] + dx, extent[1] + dy, extent[2] + dx, extent[3] + dy] if extent is not None else None
+                              for extent in record.extents]
+        if records:
+            self._notify(ANNOTATION_CHANGE.GEOMETRY, [record.id for record in records])
+
+    def insert_vertex(self, record, polygon_index, vertex_index, x, y):
+        """
+        Insert a vertex in a polygon. The grown polygon is moved to the end of the buffer.
+
+        Args:
+            record (AnnotationRecord): The object.
+            polygon_index (int): The index of the polygon in the object.
+            vertex_index (int): The index of the new vertex in the polygon.
+            x (int): The x coordinate of the new vertex.
+            y (int): The y coordinate of the new vertex.
+        """
+        points = np.insert(self.polygon(record, polygon_index), vertex_index, (x, y), axis=0)
+        released = record.spans[polygon_index][1]
+        record.spans[polygon_index] = self._append_points(points)
+        self._release(released)
+        extent = record.extents[polygon_index]
+        if extent is None:
+            record.extents[polygon_index] = [x, y, x, y]
+        else:
+            record.extents[polygon_index] = [min(extent[0], x), min(extent[1], y), max(extent[2], x), max(extent[3], y)]
+        self._notify(ANNOTATION_CHANGE.GEOMETRY, [record.id])
+
+    def remove_vertex(self, record, polygon_index, vertex_index):
+        """
+        Remove a vertex from a polygon. The polygon shrinks in place.
+
+        Args:
+            record (AnnotationRecord): The object.
+            polygon_index (int): The index of the polygon in the object.
+            vertex_index (int): The index of the vertex in the polygon.
+        """
+        points = self.polygon(record, polygon_index)
+        points[vertex_index:-1] = points[vertex_index + 1:].copy()
+        record.spans[polygon_index][1] -= 1
+        self._release(1)
+        record.extents[polygon_index] = polygon_extent(self.polygon(record, polygon_index))
+        self._notify(ANNOTATION_CHANGE.GEOMETRY, [record.id])
+
+    def bounds(self, record):
+        """
+        Get the rectangle around the polygons of an object, from the bounds kept for every polygon.
+
+        Args:
+            record (AnnotationRecord): The object.
+
+        Returns:
+            tuple: The (x0, y0, x1, y1) bounds of the polygons, None if the object has no vertex.
+        """
+        extents = [extent for extent in record.extents if extent is not None]
+        if not extents:
+            return None
+        return (min(extent[0] for extent in extents), min(extent[1] for extent in extents),
+                max(extent[2] for extent in extents), max(extent[3] for extent in extents))
+
+    def update_bbox(self, record):
+        """
+        Set the bounding box of an object to the rectangle around its polygons, the same
+        rectangle as QPolygon.boundingRect.
+
+        Args:
+            record (AnnotationRecord): The object.
+        """
+        bounds = self.bounds(record)
+        if bounds is not None:
+            x0, y0, x1, y1 = bounds
+            record.bbox = [x0, y0, x1 - x0 + 1, y1 - y0 + 1]
+            self.coco.pop(record.id, None)
+
+    ## COCO conversion
+
+    def load_coco(self, annotations):
+        """
+        Replace the objects of the store with COCO style annotations. The flat segmentation
+        lists of all the objects are converted to the buffer at once. An object whose id is
+        already used by an earlier object of the list is kept under a new id.
+
+        Args:
+            annotations (list): The annotations, each with 'id', 'category_id', 'bbox' and
+                'segmentation' as a list of flat [x0, y0, x1, y1, ...] lists.
+        """
+        self._reset()
+        lengths = [len(polygon) // 2 for annotation in annotations for polygon in annotation['segmentation']]
+        total = sum(lengths)
+        flat = np.fromiter((value for annotation in annotations for polygon in annotation['segmentation']
+                            for value in polygon[:len(polygon) // 2 * 2]), dtype=np.int32, count=total * 2)
+        self.coords = np.zeros((max(total, 1024), 2), dtype=np.int32)
+        self.coords[:total] = flat.reshape(-1, 2)
+        self.size = total
+        starts = np.concatenate(([0], np.cumsum(lengths, dtype=np.int64)[:-1])) if lengths else np.zeros(0, dtype=np.int64)
+        # the bounds of all the polygons in one pass over the buffer
+        bounds, filled = polygon_bounds(self.coords[:total], starts, lengths)
+        extents = [extent if has_vertex else None for extent, has_vertex in zip(bounds.tolist(), filled.tolist())]
+        starts = starts.tolist()
+        next_id = max((annotation['id'] for annotation in annotations), default=-1) + 1
+        position = 0
+        for annotation in annotations:
+            count = len(annotation['segmentation'])
+            spans = [[starts[index], lengths[index]] for index in range(position, position + count)]
+            object_id = annotation['id']
+            if object_id in self.objects:
+                # the objects are keyed by id, a duplicate would replace the earlier object
+                print(f"Duplicate annotation id {object_id}, the object is renumbered to {next_id}")
+                object_id = next_id
+                next_id += 1
+            self.objects[object_id] = AnnotationRecord(object_id, annotation['category_id'], list(annotation['bbox']),
+                                                       spans, extents[position:position + count])
+            position += count
+        self.next_id = max(self.objects, default=-1) + 1
+        self._notify(ANNOTATION_CHANGE.RESET, list(self.objects), self.objects.values())
+
+    def to_coco(self):
+        """
+        Convert the objects of the store to COCO style annotations. The area of an object with
+        polygons is the sum of the areas of its polygons, the area of a box is its width by its height.
+        Only the objects changed since the last call are converted again, the returned dictionaries
+        are shared with the store and must not be modified.
+
+        Returns:
+            list: The annotations, with 'segmentation' as a list of flat [x0, y0, x1, y1, ...] lists.
+        """
+        changed = [record for record in self.objects.values() if record.id not in self.coco]
+        spans = np.array([span for record in changed for span in record.spans], dtype=np.int64).reshape(-1, 2)
+        areas = polygon_areas(self.coords, spans[:, 0], spans[:, 1]).tolist()
+        position = 0
+        for record in changed:
+            x, y, w, h = record.bbox
+            count = len(record.spans)
+            self.coco[record.id] = {
+                "id": record.id,
+                "category_id": record.category_id,
+                "bbox": [x, y, w, h],
+                "area": sum(areas[position:position + count]) if count else w * h,
+                "segmentation": [self.coords[start:start + count].ravel().tolist() for start, count in record.spans],
+                "iscrowd": 0
+            }
+            position += count
+        return [self.coco[object_id] for object_id in self.objects]
@@ -13,6 +13,7 @@ class ANNOTATION_MODE(Enum):
     DUPLICATE = 4
     CLEAR = 5
 
+# no longer sent by the canvas, the object list follows ANNOTATION_CHANGE; kept for Backup/canvas_widget_backup.py
 class OBJECT_LIST_ACTION(Enum):
     ADD = 0
     REMOVE = 1
@@ -22,6 +23,17 @@ class OBJECT_LIST_ACTION(Enum):
     EDIT = 5
     NONE = 6
 
+class ANNOTATION_CHANGE(Enum):
+    ADDED = 0
+    REMOVED = 1
+    CATEGORY = 2
+    GEOMETRY = 3
+    RESET = 4
+
+class CANVAS_ENGINE(Enum):
+    WIDGET = 0
+    GRAPHICS_SCENE = 1
+
 # class TaskType(Enum):
 #     OBJECT_DETECTION = 0
 #     SEGMENTATION = 1
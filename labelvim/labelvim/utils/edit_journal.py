@@ -0,0 +1,552 @@
+from collections import deque
+import numpy as np
+
+
+# the approximate size of a command object and its small fields, on top of the vertices it keeps
+COMMAND_BYTES = 160
+
+
+class EditCommand:
+    """
+    One edit of the objects of an AnnotationStore that can be undone and done again.
+    A command only keeps what the edit changed, never a copy of the other objects.
+
+    Attributes:
+        object_id (int): The id of the edited object.
+    """
+    __slots__ = ('object_id',)
+
+    def __init__(self, object_id):
+        self.object_id = object_id
+
+    def undo(self, store):
+        """
+        Revert the edit.
+
+        Args:
+            store (AnnotationStore): The store holding the object.
+        """
+        raise NotImplementedError
+
+    def redo(self, store):
+        """
+        Apply the edit again after it was undone.
+
+        Args:
+            store (AnnotationStore): The store holding the object.
+        """
+        raise NotImplementedError
+
+    def merge(self, command):
+        """
+        Fold the next step of the same drag into this command.
+
+        Args:
+            command (EditCommand): The command recorded after this one.
+
+        Returns:
+            bool: True if the command was merged and must not be recorded on its own.
+        """
+        return False
+
+    def nbytes(self):
+        """
+        Get the memory used by the command.
+
+        Returns:
+            int: The approximate size of the command and the vertices it keeps in bytes.
+        """
+        return COMMAND_BYTES
+
+    def __repr__(self):
+        return f"{type(self).__name__}(id={self.object_id})"
+
+
+class PolygonEditCommand(EditCommand):
+    """
+    An edit of the polygons of an object. The bbox of the object before the edit is kept, as
+    a loaded bbox is not always the rectangle around the polygons; after the edit it is.
+
+    Attributes:
+        object_id (int): The id of the edited object.
+        old_bbox (list): The bounding box [x, y, width, height] of the object before the edit.
+    """
+    __slots__ = ('old_bbox',)
+
+    def __init__(self, object_id, old_bbox):
+        super(PolygonEditCommand, self).__init__(object_id)
+        self.old_bbox = list(old_bbox)
+
+    def _restore_bbox(self, store, record):
+        record.bbox[:] = self.old_bbox
+        store.coco.pop(record.id, None)
+
+
+class VertexMoved(PolygonEditCommand):
+    """
+    A vertex of a polygon moved from one position to another.
+    """
+    __slots__ = ('polygon_index', 'vertex_index', 'old', 'new')
+
+    def __init__(self, object_id, old_bbox, polygon_index, vertex_index, old, new):
+        super(VertexMoved, self).__init__(object_id, old_bbox)
+        self.polygon_index = polygon_index
+        self.vertex_index = vertex_index
+        self.old = tuple(old)
+        self.new = tuple(new)
+
+    def undo(self, store):
+        record = store.get(self.object_id)
+        store.set_vertex(record, self.polygon_index, self.vertex_index, *self.old)
+        self._restore_bbox(store, record)
+
+    def redo(self, store):
+        record = store.get(self.object_id)
+        store.set_vertex(record, self.polygon_index, self.vertex_index, *self.new)
+        store.update_bbox(record)
+
+    def merge(self, command):
+        if (type(command) is VertexMoved and command.object_id == self.object_id
+                and command.polygon_index == self.polygon_index and command.vertex_index == self.vertex_index):
+            self.new = command.new
+            return True
+        return False
+
+
+class VertexInserted(PolygonEditCommand):
+    """
+    A vertex was inserted in a polygon. Dragging the new vertex right after is part of the insertion.
+    """
+    __slots__ = ('polygon_index', 'vertex_index', 'point')
+
+    def __init__(self, object_id, old_bbox, polygon_index, vertex_index, point):
+        super(VertexInserted, self).__init__(object_id, old_bbox)
+        self.polygon_index = polygon_index
+        self.vertex_index = vertex_index
+        self.point = tuple(point)
+
+    def undo(self, store):
+        record = store.get(self.object_id)
+        store.remove_vertex(record, self.polygon_index, self.vertex_index)
+        self._restore_bbox(store, record)
+
+    def redo(self, store):
+        record = store.get(self.object_id)
+        store.insert_vertex(record, self.polygon_index, self.vertex_index, *self.point)
+        store.update_bbox(record)
+
+    def merge(self, command):
+        if (type(command) is VertexMoved and command.object_id == self.object_id
+                and command.polygon_index == self.polygon_index and command.vertex_index == self.vertex_index):
+            self.point = command.new
+            return True
+        return False
+
+
+class Translated(PolygonEditCommand):
+    """
+    A polygon of an object, or the box of a bounding box object, moved by dx, dy.
+    """
+    __slots__ = ('polygon_index', 'dx', 'dy')
+
+    def __init__(self, object_id, old_bbox, polygon_index, dx, dy):
+        """
+        Args:
+            object_id (int): The id of the object.
+            old_bbox (list): The bounding box of the object before the move.
+            polygon_index (int): The index of the moved polygon, None when the bbox itself moved.
+            dx (int): The move along x.
+            dy (int): The move along y.
+        """
+        super(Translated, self).__init__(object_id, old_bbox)
+        self.polygon_index = polygon_index
+        self.dx = dx
+        self.dy = dy
+
+    def undo(self, store):
+        record = store.get(self.object_id)
+        if self.polygon_index is not None:
+            store.translate_polygon(record, self.polygon_index, -self.dx, -self.dy)
+            self._restore_bbox(store, record)
+        else:
+            self._restore_bbox(store, record)
+            store.geometry_changed(record)
+
+    def redo(self, store):
+        record = store.get(self.object_id)
+        if self.polygon_index is not None:
+            store.translate_polygon(record, self.polygon_index, self.dx, self.dy)
+            store.update_bbox(record)
+        else:
+            record.bbox[0] += self.dx
+            record.bbox[1] += self.dy
+            store.geometry_changed(record)
+
+    def merge(self, command):
+        if type(command) is Translated and command.object_id == self.object_id and command.polygon_index == self.polygon_index:
+            self.dx += command.dx
+            self.dy += command.dy
+            return True
+        return False
+
+
+class BoxResized(EditCommand):
+    """
+    The bounding box of an object changed from one rectangle to another.
+    """
+    __slots__ = ('old', 'new')
+
+    def __init__(self, object_id, old, new):
+        super(BoxResized, self).__init__(object_id)
+        self.old = list(old)
+        self.new = list(new)
+
+    def _set(self, store, bbox):
+        record = store.get(self.object_id)
+        record.bbox[:] = bbox
+        store.geometry_changed(record)
+
+    def undo(self, store):
+        self._set(store, self.old)
+
+    def redo(self, store):
+        self._set(store, self.new)
+
+    def merge(self, command):
+        if type(command) is BoxResized and command.object_id == self.object_id:
+            self.new = command.new
+            return True
+        return False
+
+
+class CategoryChanged(EditCommand):
+    """
+    The label of an object changed.
+    """
+    __slots__ = ('old', 'new')
+
+    def __init__(self, object_id, old, new):
+        super(CategoryChanged, self).__init__(object_id)
+        self.old = old
+        self.new = new
+
+    def undo(self, store):
+        store.set_category(store.get(self.object_id), self.old)
+
+    def redo(self, store):
+        store.set_category(store.get(self.object_id), self.new)
+
+
+class PolygonAdded(PolygonEditCommand):
+    """
+    A polygon was added to an existing object. The vertices are kept to add it again.
+    """
+    __slots__ = ('polygon_index', 'points')
+
+    def __init__(self, object_id, old_bbox, polygon_index, points):
+        super(PolygonAdded, self).__init__(object_id, old_bbox)
+        self.polygon_index = polygon_index
+        self.points = np.array(points, dtype=np.int32).reshape(-1, 2)
+
+    def undo(self, store):
+        record = store.get(self.object_id)
+        store.remove_polygon(record, self.polygon_index)
+        self._restore_bbox(store, record)
+
+    def redo(self, store):
+        record = store.get(self.object_id)
+        store.add_polygon(record, self.points)
+        store.update_bbox(record)
+
+    def nbytes(self):
+        return COMMAND_BYTES + self.points.nbytes
+
+
+class ObjectAdded(EditCommand):
+    """
+    An object was added. The object is kept, with a copy of its vertices, to add it again
+    at the same place in the drawing order.
+    """
+    __slots__ = ('position', 'category_id', 'bbox', 'polygons')
+
+    def __init__(self, store, record, position=None):
+        """
+        Args:
+            store (AnnotationStore): The store holding the object.
+            record (AnnotationRecord): The object, still in the store.
+            position (int, optional): The index of the object in the drawing order, read
+                from the store when None. Defaults to None.
+        """
+        super(ObjectAdded, self).__init__(record.id)
+        if position is None:
+            # a new object is on top of the others, only an object under others is looked up
+            on_top = next(reversed(store.objects), None) == record.id
+            position = len(store.objects) - 1 if on_top else store.position(record.id)
+        self.position = position
+        self.category_id = record.category_id
+        self.bbox = list(record.bbox)
+        self.polygons = [polygon.copy() for polygon in store.polygons(record)]
+
+    def _add(self, store):
+        store.add(self.category_id, self.bbox, self.polygons, object_id=self.object_id, position=self.position)
+
+    def undo(self, store):
+        store.remove(self.object_id)
+
+    def redo(self, store):
+        self._add(store)
+
+    def nbytes(self):
+        return COMMAND_BYTES + sum(polygon.nbytes for polygon in self.polygons)
+
+
+class ObjectRemoved(ObjectAdded):
+    """
+    An object was removed, the inverse of ObjectAdded.
+    """
+    __slots__ = ()
+
+    def undo(self, store):
+        self._add(store)
+
+    def redo(self, store):
+        store.remove(self.object_id)
+
+
+class GroupCommand(EditCommand):
+    """
+    One edit of many objects at once, e.g. of a rubber band selection. The object_id of a
+    group command is None, the edited objects are in object_ids.
+
+    Attributes:
+        object_ids (list): The ids of the edited objects.
+    """
+    __slots__ = ('object_ids',)
+
+    def __init__(self, object_ids):
+        super(GroupCommand, self).__init__(None)
+        self.object_ids = list(object_ids)
+
+    def nbytes(self):
+        return COMMAND_BYTES + 8 * len(self.object_ids)
+
+    def __repr__(self):
+        return f"{type(self).__name__}(ids={len(self.object_ids)})"
+
+
+class ObjectsTranslated(GroupCommand):
+    """
+    Many objects moved by dx, dy as a whole. The steps of one drag are merged.
+    """
+    __slots__ = ('dx', 'dy')
+
+    def __init__(self, object_ids, dx, dy):
+        super(ObjectsTranslated, self).__init__(object_ids)
+        self.dx = dx
+        self.dy = dy
+
+    def undo(self, store):
+        store.translate_objects([store.get(object_id) for object_id in self.object_ids], -self.dx, -self.dy)
+
+    def redo(self, store):
+        store.translate_objects([store.get(object_id) for object_id in self.object_ids], self.dx, self.dy)
+
+    def merge(self, command):
+        if type(command) is ObjectsTranslated and command.object_ids == self.object_ids:
+            self.dx += command.dx
+            self.dy += command.dy
+            return True
+        return False
+
+
+class CategoriesChanged(GroupCommand):
+    """
+    The label of many objects changed to the same label.
+    """
+    __slots__ = ('old', 'new')
+
+    def __init__(self, object_ids, old, new):
+        """
+        Args:
+            object_ids (list): The ids of the objects.
+            old (list): The label of every object before the edit.
+            new (int): The label of the objects after the edit.
+        """
+        super(CategoriesChanged, self).__init__(object_ids)
+        self.old = list(old)
+        self.new = new
+
+    def undo(self, store):
+        groups = {}
+        for object_id, category_id in zip(self.object_ids, self.old):
+            groups.setdefault(category_id, []).append(store.get(object_id))
+        for category_id, records in groups.items():
+            store.set_categories(records, category_id)
+
+    def redo(self, store):
+        store.set_categories([store.get(object_id) for object_id in self.object_ids], self.new)
+
+    def nbytes(self):
+        return COMMAND_BYTES + 16 * len(self.object_ids)
+
+
+class ObjectsRemoved(GroupCommand):
+    """
+    Many objects were removed. Every object is kept as an ObjectRemoved, to put them back
+    at their places in the drawing order.
+    """
+    __slots__ = ('removed',)
+
+    def __init__(self, store, records):
+        """
+        Args:
+            store (AnnotationStore): The store holding the objects.
+            records (list): The objects, still in the store.
+        """
+        super(ObjectsRemoved, self).__init__([record.id for record in records])
+        # the positions of all the objects in one pass over the drawing order
+        positions = {object_id: position for position, object_id in enumerate(store.objects)}
+        self.removed = sorted((ObjectRemoved(store, record, positions[record.id]) for record in records),
+                              key=lambda command: command.position)
+
+    def undo(self, store):
+        # every object goes back under the ones above it, in one pass over the drawing order
+        store.restore_objects([(command.position, command.object_id, command.category_id, command.bbox, command.polygons)
+                               for command in self.removed])
+
+    def redo(self, store):
+        store.remove_objects(self.object_ids)
+
+    def nbytes(self):
+        return COMMAND_BYTES + sum(command.nbytes() for command in self.removed)
+
+
+class EditJournal:
+    """
+    Undo and redo history of the edits of an AnnotationStore, as a list of compact commands.
+    The commands of the steps of one drag are merged into one command until the journal is
+    sealed, e.g. when the mouse is released. The oldest commands are dropped when the history
+    uses more memory than its budget.
+
+    Attributes:
+        budget (int): The memory the commands may use in bytes.
+        undo_stack (deque): The commands that can be undone, the last one on the right.
+        redo_stack (list): The undone commands that can be done again, the last undone one at the end.
+        nbytes (int): The memory used by the commands of both stacks in bytes, both count in the budget.
+        sealed (bool): Whether the next command starts a new edit instead of merging into the last one.
+    """
+
+    def __init__(self, budget: int = 16 * 1024 * 1024):
+        """
+        Initializes the EditJournal.
+
+        Args:
+            budget (int, optional): The memory the commands may use in bytes. Defaults to 16 MB.
+        """
+        self.budget = budget
+        self.undo_stack = deque()
+        self.redo_stack = []
+        self.nbytes = 0
+        self.sealed = True
+
+    def __len__(self):
+        return len(self.undo_stack)
+
+    def can_undo(self):
+        """bool: Whether there is an edit to undo."""
+        return bool(self.undo_stack)
+
+    def can_redo(self):
+        """bool: Whether there is an undone edit to do again."""
+        return bool(self.redo_stack)
+
+    def set_budget(self, budget):
+        """
+        Change the memory budget, dropping the oldest commands if needed.
+
+        Args:
+            budget (int): The memory the commands may use in bytes.
+        """
+        self.budget = budget
+        self._trim()
+
+    def record(self, command):
+        """
+        Record an edit that was just applied to the store. The undone commands can no longer be done again.
+
+        Args:
+            command (EditCommand): The edit.
+        """
+        for undone in self.redo_stack:
+            self.nbytes -= undone.nbytes()
+        self.redo_stack.clear()
+        if not self.sealed and self.undo_stack:
+            last = self.undo_stack[-1]
+            size = last.nbytes()
+            if last.merge(command):
+                self.nbytes += last.nbytes() - size
+                self._trim()
+                return
+        self.undo_stack.append(command)
+        self.nbytes += command.nbytes()
+        self.sealed = False
+        self._trim()
+
+    def seal(self):
+        """
+        End the current edit, the next command is not merged into the last one.
+        """
+        self.sealed = True
+
+    def undo(self, store):
+        """
+        Revert the last edit.
+
+        Args:
+            store (AnnotationStore): The edited store.
+
+        Returns:
+            EditCommand: The undone command, None if there is nothing to undo.
+        """
+        self.sealed = True
+        if not self.undo_stack:
+            return None
+        command = self.undo_stack.pop()
+        command.undo(store)
+        self.redo_stack.append(command)
+        return command
+
+    def redo(self, store):
+        """
+        Apply the last undone edit again.
+
+        Args:
+            store (AnnotationStore): The edited store.
+
+        Returns:
+            EditCommand: The done command, None if there is nothing to redo.
+        """
+        self.sealed = True
+        if not self.redo_stack:
+            return None
+        command = self.redo_stack.pop()
+        command.redo(store)
+        self.undo_stack.append(command)
+        return command
+
+    def clear(self):
+        """
+        Forget every edit, e.g. when another image is loaded.
+        """
+        self.undo_stack.clear()
+        self.redo_stack.clear()
+        self.nbytes = 0
+        self.sealed = True
+
+    def _trim(self):
+        # the oldest edits go first, then the undone edits farthest from the current state;
+        # the last edit, or the next one to redo, is always kept even when it alone is over the budget
+        while self.nbytes > self.budget and len(self.undo_stack) > 1:
+            self.nbytes -= self.undo_stack.popleft().nbytes()
+        while self.nbytes > self.budget and self.redo_stack and (self.undo_stack or len(self.redo_stack) > 1):
+            self.nbytes -= self.redo_stack.pop(0).nbytes()
@@ -0,0 +1,248 @@
+"""
+Batch geometry kernels over many polygons at once.
+
+A set of polygons is passed as ragged arrays: one (N, 2) array holding the vertices of all
+the polygons, and the start and count of every polygon in it. The polygons do not have to be
+contiguous or in order, so the coordinate buffer of the AnnotationStore can be passed as is.
+pack_polygons builds the ragged arrays from COCO style segmentation lists.
+"""
+import numpy as np
+
+
+def pack_polygons(polygons):
+    """
+    Pack polygons into ragged arrays.
+
+    Args:
+        polygons (list): The polygons, each a flat [x0, y0, x1, y1, ...] list or a sequence of (x, y) points.
+
+    Returns:
+        tuple: The (N, 2) float64 points, and the int64 starts and counts of the polygons.
+    """
+    parts = [np.asarray(polygon, dtype=np.float64).reshape(-1) for polygon in polygons]
+    # a trailing odd coordinate is dropped, as the canvas does when it loads a polygon
+    parts = [part[:len(part) // 2 * 2].reshape(-1, 2) for part in parts]
+    counts = np.array([len(part) for part in parts], dtype=np.int64)
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1])).astype(np.int64) if len(counts) else np.zeros(0, dtype=np.int64)
+    points = np.concatenate(parts) if parts else np.zeros((0, 2), dtype=np.float64)
+    return points, starts, counts
+
+
+def split_polygons(points, starts, counts):
+    """
+    Split ragged polygons into one array per polygon, e.g. for cv2.fillPoly.
+
+    Args:
+        points (np.ndarray): The (N, 2) vertices of all the polygons.
+        starts (np.ndarray): The index of the first vertex of every polygon.
+        counts (np.ndarray): The number of vertices of every polygon.
+
+    Returns:
+        list: The (n, 2) view of every polygon.
+    """
+    return [points[start:start + count] for start, count in zip(np.asarray(starts).tolist(), np.asarray(counts).tolist())]
+
+
+def _contiguous(points, starts, counts):
+    """
+    Gather ragged polygons into one contiguous array, polygon after polygon.
+
+    Returns:
+        tuple: The gathered points and the offset of every polygon in them.
+    """
+    starts = np.asarray(starts, dtype=np.int64)
+    counts = np.asarray(counts, dtype=np.int64)
+    offsets = np.concatenate(([0], np.cumsum(counts)[:-1])).astype(np.int64) if len(counts) else np.zeros(0, dtype=np.int64)
+    if len(counts) and np.array_equal(starts, offsets) and offsets[-1] + counts[-1] == len(points):
+        return np.asarray(points), offsets
+    index = np.repeat(starts - offsets, counts) + np.arange(int(counts.sum()), dtype=np.int64)
+    return np.asarray(points)[index], offsets
+
+
+def polygon_areas(points, starts, counts):
+    """
+    Compute the area of every polygon with the shoelace formula.
+
+    Args:
+        points (np.ndarray): The (N, 2) vertices of all the polygons.
+        starts (np.ndarray): The index of the first vertex of every polygon.
+        counts (np.ndarray): The number of vertices of every polygon.
+
+    Returns:
+        np.ndarray: The float64 area of every polygon, 0 for a polygon of less than 3 vertices.
+    """
+    counts = np.asarray(counts, dtype=np.int64)
+    areas = np.zeros(len(counts), dtype=np.float64)
+    filled = counts > 0
+    if not filled.any():
+        return areas
+    packed, offsets = _contiguous(points, starts, counts)
+    x = packed[:, 0].astype(np.float64)
+    y = packed[:, 1].astype(np.float64)
+    # the vertex after the last one of a polygon is its first one
+    following = np.arange(1, len(packed) + 1, dtype=np.int64)
+    following[offsets[filled] + counts[filled] - 1] = offsets[filled]
+    cross = x * y[following] - x[following] * y
+    areas[filled] = np.abs(np.add.reduceat(cross, offsets[filled])) / 2
+    return areas
+
+
+def polygon_area(points):
+    """
+    Compute the area of one polygon with the shoelace formula.
+
+    Args:
+        points (np.ndarray): The (n, 2) vertices of the polygon.
+
+    Returns:
+        float: The area of the polygon.
+    """
+    points = np.asarray(points).reshape(-1, 2)
+    return float(polygon_areas(points, [0], [len(points)])[0])
+
+
+def polygon_bounds(points, starts, counts):
+    """
+    Compute the bounds of every polygon.
+
+    Args:
+        points (np.ndarray): The (N, 2) vertices of all the polygons.
+        starts (np.ndarray): The index of the first vertex of every polygon.
+        counts (np.ndarray): The number of vertices of every polygon.
+
+    Returns:
+        tuple: The (k, 4) [x0, y0, x1, y1] bounds of the polygons in the dtype of the points, and
+            the (k,) bool mask of the polygons that have a vertex; the bounds of the others are 0.
+    """
+    counts = np.asarray(counts, dtype=np.int64)
+    filled = counts > 0
+    bounds = np.zeros((len(counts), 4), dtype=np.asarray(points).dtype)
+    if filled.any():
+        packed, offsets = _contiguous(points, starts, counts)
+        bounds[filled, :2] = np.minimum.reduceat(packed, offsets[filled], axis=0)
+        bounds[filled, 2:] = np.maximum.reduceat(packed, offsets[filled], axis=0)
+    return bounds, filled
+
+
+def points_in_polygon(queries, polygon):
+    """
+    Test which points are inside a polygon with the even-odd rule.
+
+    Args:
+        queries (np.ndarray): The (m, 2) points to test.
+        polygon (np.ndarray): The (n, 2) vertices of the polygon.
+
+    Returns:
+        np.ndarray: The (m,) bool mask of the points inside the polygon.
+    """
+    queries = np.asarray(queries, dtype=np.float64).reshape(-1, 2)
+    polygon = np.asarray(polygon, dtype=np.float64).reshape(-1, 2)
+    if len(polygon) < 3:
+        return np.zeros(len(queries), dtype=bool)
+    x0, y0 = polygon[:, 0], polygon[:, 1]
+    x1, y1 = np.roll(x0, -1), np.roll(y0, -1)
+    qx, qy = queries[:, :1], queries[:, 1:]
+    # count the edges crossed by a ray going right from every point, (m, n) at once
+    straddle = (y0 > qy) != (y1 > qy)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        crossing_x = x0 + (qy - y0) * (x1 - x0) / (y1 - y0)
+    crossed = straddle & (qx < crossing_x)
+    return np.count_nonzero(crossed, axis=1) % 2 == 1
+
+
+def point_segment_distances(point, segment_starts, segment_ends):
+    """
+    Compute the distance from a point to many line segments.
+
+    Args:
+        point (tuple): The (x, y) point.
+        segment_starts (np.ndarray): The (m, 2) first ends of the segments.
+        segment_ends (np.ndarray): The (m, 2) second ends of the segments.
+
+    Returns:
+        np.ndarray: The (m,) float64 distances.
+    """
+    p = np.asarray(point, dtype=np.float64)
+    v = np.asarray(segment_starts, dtype=np.float64).reshape(-1, 2)
+    w = np.asarray(segment_ends, dtype=np.float64).reshape(-1, 2)
+    direction = w - v
+    length2 = np.einsum('ij,ij->i', direction, direction)
+    # the projection of the point on every segment, a zero length segment projects to its start
+    with np.errstate(divide='ignore', invalid='ignore'):
+        t = np.where(length2 > 0, np.einsum('ij,ij->i', p - v, direction) / length2, 0.0)
+    projection = v + np.clip(t, 0.0, 1.0)[:, None] * direction
+    return np.hypot(*(p - projection).T)
+
+
+def point_distances(point, points):
+    """
+    Compute the distance from a point to many points.
+
+    Args:
+        point (tuple): The (x, y) point.
+        points (np.ndarray): The (m, 2) points.
+
+    Returns:
+        np.ndarray: The (m,) float64 distances.
+    """
+    delta = np.asarray(points, dtype=np.float64).reshape(-1, 2) - np.asarray(point, dtype=np.float64)
+    return np.hypot(delta[:, 0], delta[:, 1])
+
+
+def normalize_points(points, width, height):
+    """
+    Divide the coordinates of points by the image size, e.g. for YOLO labels.
+
+    Args:
+        points (np.ndarray): The (n, 2) points, or a flat [x0, y0, x1, y1, ...] list.
+        width (int): The image width.
+        height (int): The image height.
+
+    Returns:
+        np.ndarray: The (n, 2) float64 normalized points.
+    """
+    return np.asarray(points, dtype=np.float64).reshape(-1, 2) / np.array((width, height), dtype=np.float64)
+
+
+def denormalize_points(points, width, height):
+    """
+    Multiply normalized coordinates by the image size.
+
+    Args:
+        points (np.ndarray): The (n, 2) normalized points, or a flat [x0, y0, x1, y1, ...] list.
+        width (int): The image width.
+        height (int): The image height.
+
+    Returns:
+        np.ndarray: The (n, 2) float64 points.
+    """
+    return np.asarray(points, dtype=np.float64).reshape(-1, 2) * np.array((width, height), dtype=np.float64)
+
+
+def clip_points(points, width, height):
+    """
+    Move the points outside the image onto its border.
+
+    Args:
+        points (np.ndarray): The (n, 2) points, or a flat [x0, y0, x1, y1, ...] list.
+        width (int): The image width.
+        height (int): The image height.
+
+    Returns:
+        np.ndarray: The (n, 2) points clipped to [0, width] x [0, height].
+    """
+    points = np.asarray(points).reshape(-1, 2)
+    return np.clip(points, 0, np.array((width, height), dtype=points.dtype))
+
+
+def segmentation_area(segmentation):
+    """
+    Compute the area covered by the polygons of a COCO style segmentation, the sum of their areas.
+
+    Args:
+        segmentation (list): The polygons, each a flat [x0, y0, x1, y1, ...] list.
+
+    Returns:
+        float: The area.
+    """
+    return float(polygon_areas(*pack_polygons(segmentation)).sum())
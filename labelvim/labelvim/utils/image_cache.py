@@ -0,0 +1,168 @@
+import os
+import numpy as np
+from PyQt5.QtGui import QImage, QImageReader
+from labelvim.utils.lru_cache import ByteBudgetLRUCache
+from labelvim.utils.tile_source import pixmap_bytes
+
+PREVIEW = 'fit' # Variant of a cached image scaled to fit the window
+
+
+def file_mtime(file_name):
+    """
+    Get the modification time of a file.
+
+    Args:
+        file_name (str): The path of the file.
+
+    Returns:
+        int: The modification time in nanoseconds, None if the file does not exist.
+    """
+    try:
+        return os.stat(file_name).st_mtime_ns
+    except OSError:
+        return None
+
+
+def qimage_to_rgb_array(image):
+    """
+    Convert a QImage to an RGB array, as returned by cv2.imread followed by cv2.cvtColor(COLOR_BGR2RGB).
+
+    Args:
+        image (QImage): The image.
+
+    Returns:
+        np.ndarray: The (height, width, 3) uint8 array, None if the image is null.
+    """
+    if image is None or image.isNull():
+        return None
+    image = image.convertToFormat(QImage.Format_RGB888)
+    width, height, stride = image.width(), image.height(), image.bytesPerLine()
+    pixels = image.constBits()
+    pixels.setsize(stride * height)
+    # the rows are padded to 32 bits, the padding is cut before the copy
+    return np.frombuffer(pixels, dtype=np.uint8).reshape(height, stride)[:, :width * 3].reshape(height, width, 3).copy()
+
+
+class DecodedImageCache:
+    """
+    Decoded images shared by the canvas, the prefetcher and the mask saving, so an image file
+    is decoded once. The images are kept in an LRU cache with a byte budget, together with the
+    modification time of their file; an image whose file changed since it was decoded is dropped.
+
+    Every file can have several variants, e.g. the full image and its fit to window preview.
+    The cache is only used from the GUI thread, the workers send their images to it.
+
+    Attributes:
+        images (ByteBudgetLRUCache): The (mtime, QImage) pairs, keyed by (file name, variant).
+        stale (int): The number of lookups that found an image of a changed file.
+    """
+
+    def __init__(self, budget=512 * 1024 * 1024):
+        """
+        Initializes the DecodedImageCache.
+
+        Args:
+            budget (int, optional): The memory of the decoded images in bytes. Defaults to 512 MB.
+        """
+        self.images = ByteBudgetLRUCache(budget, lambda entry: pixmap_bytes(entry[1]))
+        self.stale = 0
+
+    def __repr__(self):
+        return (f"DecodedImageCache(images={len(self.images)}, mb={self.images.total / (1024 * 1024):.1f}, "
+                f"hits={self.hits}, misses={self.misses})")
+
+    @property
+    def hits(self):
+        """int: The number of lookups that found an up to date image."""
+        return self.images.hits - self.stale
+
+    @property
+    def misses(self):
+        """int: The number of lookups that had to decode the image again."""
+        return self.images.misses + self.stale
+
+    def set_budget(self, budget):
+        """
+        Change the memory budget, evicting the least recently used images if needed.
+
+        Args:
+            budget (int): The memory of the decoded images in bytes.
+        """
+        self.images.set_budget(budget)
+
+    def contains(self, file_name, variant=None):
+        """
+        Check if an image is cached, without checking its file or counting a lookup.
+
+        Args:
+            file_name (str): The path of the image file.
+            variant (str, optional): The variant of the image, None for the full image. Defaults to None.
+
+        Returns:
+            bool: True if the image is cached.
+        """
+        return (file_name, variant) in self.images
+
+    def get(self, file_name, variant=None):
+        """
+        Get a decoded image, unless its file changed since it was decoded.
+
+        Args:
+            file_name (str): The path of the image file.
+            variant (str, optional): The variant of the image, None for the full image. Defaults to None.
+
+        Returns:
+            QImage: The decoded image, None if it is not cached or out of date.
+        """
+        entry = self.images.get((file_name, variant))
+        if entry is None:
+            return None
+        mtime, image = entry
+        if mtime != file_mtime(file_name):
+            self.stale += 1
+            self.invalidate(file_name)
+            return None
+        return image
+
+    def put(self, file_name, image, mtime, variant=None):
+        """
+        Cache a decoded image as the most recently used.
+
+        Args:
+            file_name (str): The path of the image file.
+            image (QImage): The decoded image, null images are not cached.
+            mtime (int): The modification time of the file read before decoding it, see file_mtime.
+            variant (str, optional): The variant of the image, None for the full image. Defaults to None.
+        """
+        if image is not None and not image.isNull() and mtime is not None:
+            self.images.put((file_name, variant), (mtime, image))
+
+    def invalidate(self, file_name):
+        """
+        Drop every variant of an image.
+
+        Args:
+            file_name (str): The path of the image file.
+        """
+        for key in [key for key in self.images.entries if key[0] == file_name]:
+            self.images.pop(key)
+
+    def load(self, file_name):
+        """
+        Get the full image of a file, decoding and caching it on a miss.
+
+        Args:
+            file_name (str): The path of the image file.
+
+        Returns:
+            QImage: The decoded image, null if it can not be decoded.
+        """
+        image = self.get(file_name)
+        if image is None:
+            mtime = file_mtime(file_name)
+            reader = QImageReader(file_name)
+            image = reader.read()
+            if image.isNull():
+                print(f"Failed to decode {file_name}: {reader.errorString()}")
+            self.put(file_name, image, mtime)
+        return image
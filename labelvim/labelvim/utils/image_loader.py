@@ -0,0 +1,96 @@
+from PyQt5.QtCore import QObject, QRunnable, pyqtSignal
+from PyQt5.QtGui import QImage, QImageReader
+from labelvim.utils.image_cache import file_mtime
+
+
+class ImageLoaderSignals(QObject):
+    """
+    Signals of the ImageLoader, a QRunnable can not emit signals by itself.
+    """
+    loaded = pyqtSignal(str, QImage, int) # Signal to transmit the file name, the decoded image and the load token
+
+
+class LoadGeneration:
+    """
+    Generation token of the loads of the displayed image. Every load takes the next token;
+    a background job of an older load is skipped if it did not start yet, and its result is
+    dropped if it did, so during a fast navigation only the most recent load finishes.
+
+    The token is changed in the GUI thread only, the worker threads just read it.
+
+    Attributes:
+        current (int): The token of the most recent load.
+    """
+
+    def __init__(self):
+        self.current = 0
+
+    def next(self):
+        """
+        Start a new load, the older ones become stale.
+
+        Returns:
+            int: The token of the new load.
+        """
+        self.current += 1
+        return self.current
+
+    def is_current(self, token):
+        """
+        Check if a load is still the most recent one.
+
+        Args:
+            token (int): The token of the load.
+
+        Returns:
+            bool: True if no other load started since.
+        """
+        return token == self.current
+
+
+class ImageLoader(QRunnable):
+    """
+    Decodes an image file into a QImage in a worker thread. Only the upload of the decoded
+    image to a QPixmap is left to the GUI thread, so the window stays responsive while a
+    large image is decoded.
+
+    With a scaled size, the image is decoded straight to that size, e.g. a JPEG is decoded
+    at a fraction of its resolution, which is much faster than decoding it whole.
+
+    Attributes:
+        file_name (str): The path of the image file.
+        scaled_size (QSize): The size the image is decoded to, None for the original size.
+        generation (LoadGeneration): The generation of the loads, the loader is skipped once it is stale.
+        token (int): The token of the load the loader belongs to.
+        mtime (int): The modification time of the file read before decoding it, None until the loader runs.
+        signals (ImageLoaderSignals): Emits the decoded image, a null QImage if decoding failed.
+    """
+
+    def __init__(self, file_name, scaled_size=None, generation=None):
+        """
+        Initializes the ImageLoader.
+
+        Args:
+            file_name (str): The path of the image file.
+            scaled_size (QSize, optional): The size the image is decoded to. Defaults to None.
+            generation (LoadGeneration, optional): The generation of the loads, the loader belongs to the current one. Defaults to None.
+        """
+        super(ImageLoader, self).__init__()
+        self.file_name = file_name
+        self.scaled_size = scaled_size
+        self.generation = generation
+        self.token = generation.current if generation is not None else 0
+        self.mtime = None
+        self.signals = ImageLoaderSignals()
+
+    def run(self):
+        if self.generation is not None and not self.generation.is_current(self.token):
+            return # another image was loaded before the decode started
+        self.mtime = file_mtime(self.file_name)
+        reader = QImageReader(self.file_name)
+        if self.scaled_size is not None:
+            reader.setScaledSize(self.scaled_size)
+        image = reader.read()
+        if image.isNull():
+            print(f"Failed to decode {self.file_name}: {reader.errorString()}")
+        self.signals.loaded.emit(self.file_name, image, self.token)
@@ -0,0 +1,264 @@
+import hashlib
+import os
+import shutil
+from PyQt5.QtCore import QObject, QRunnable, Qt, pyqtSignal
+from PyQt5.QtGui import QImage, QPixmap
+
+
+def pyramid_cache_key(file_name):
+    """
+    Get the on-disk cache key of an image. The key changes whenever the file is replaced or edited.
+
+    Args:
+        file_name (str): The path of the image file.
+
+    Returns:
+        str: The hex digest of the absolute path, modification time and size of the file.
+    """
+    stat = os.stat(file_name)
+    key = f"{os.path.abspath(file_name)}|{stat.st_mtime_ns}|{stat.st_size}"
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+
+def trim_pyramid_cache(cache_dir, budget, keep=None):
+    """
+    Remove the least recently used pyramids from the on-disk cache until its size is within the budget.
+    An entry is used when it is written or read back, which sets the modification time of its directory.
+
+    Args:
+        cache_dir (str): The directory of the on-disk pyramid cache.
+        budget (int): The size of the cache in bytes, 0 or less to keep every pyramid.
+        keep (str, optional): The cache directory of an image that is never removed. Defaults to None.
+
+    Returns:
+        int: The size of the cache in bytes after the trim.
+    """
+    entries = []
+    total = 0
+    with os.scandir(cache_dir) as it:
+        for entry in it:
+            if not entry.is_dir(follow_symlinks=False):
+                continue
+            try:
+                size = sum(f.stat().st_size for f in os.scandir(entry.path) if f.is_file())
+                entries.append((entry.stat().st_mtime, size, entry.path))
+            except OSError:
+                continue # the entry is removed by another builder
+            total += size
+    if budget <= 0:
+        return total
+    entries.sort() # oldest first
+    for _, size, path in entries:
+        if total <= budget:
+            break
+        if keep is not None and os.path.abspath(path) == os.path.abspath(keep):
+            continue
+        shutil.rmtree(path, ignore_errors=True)
+        total -= size
+    return total
+
+
+class ImagePyramid:
+    """
+    Mip pyramid of the displayed image. Level 0 is the original image and every following
+    level halves the resolution of the previous one, so the canvas can draw a zoomed out
+    image from a level close to the screen resolution instead of resampling every source pixel.
+
+    Until the original image is decoded, the pyramid can hold a reduced preview only; it is
+    drawn at every zoom level, and the original takes over once set_original is called.
+
+    Attributes:
+        file_name (str): The path of the image file.
+        size (QSize): The size of the original image.
+        levels (list): The QPixmap of every level, the largest first.
+    """
+
+    def __init__(self, file_name, pixmap, size=None):
+        """
+        Initializes the ImagePyramid with one image only, the other levels are added once built.
+
+        Args:
+            file_name (str): The path of the image file.
+            pixmap (QPixmap): The original image, or a preview of it.
+            size (QSize, optional): The size of the original image, the size of pixmap when None. Defaults to None.
+        """
+        self.file_name = file_name
+        self.size = size if size is not None else pixmap.size()
+        self.levels = [pixmap]
+
+    def has_original(self):
+        """
+        Check if the original image is decoded.
+
+        Returns:
+            bool: True if level 0 has the size of the original image.
+        """
+        return self.levels[0].size() == self.size
+
+    def set_original(self, pixmap):
+        """
+        Put the decoded original image on top of the preview.
+
+        Args:
+            pixmap (QPixmap): The original image.
+        """
+        self.levels = [pixmap] + [level for level in self.levels if level.width() < pixmap.width()]
+
+    def set_levels(self, images):
+        """
+        Add the reduced levels of the pyramid, they replace the preview.
+
+        Args:
+            images (list): The QImage of every level after level 0.
+        """
+        self.levels = self.levels[:1] + [QPixmap.fromImage(image) for image in images]
+
+    def level_for_scale(self, scale_factor):
+        """
+        Get the smallest level that still has at least the screen resolution at a zoom level.
+
+        Args:
+            scale_factor (float): The zoom level of the canvas, relative to the original image.
+
+        Returns:
+            tuple: The QPixmap of the level and its (x, y) scale relative to the original image.
+        """
+        original = self.size
+        level = 0
+        while level + 1 < len(self.levels) and self.levels[level + 1].width() >= original.width() * scale_factor:
+            level += 1
+        pixmap = self.levels[level]
+        return pixmap, (pixmap.width() / original.width(), pixmap.height() / original.height())
+
+
+class PyramidBuilderSignals(QObject):
+    """
+    Signals of the PyramidBuilder, a QRunnable can not emit signals by itself.
+    """
+    finished = pyqtSignal(str, list, int) # Signal to transmit the file name, the built levels and the load token
+
+
+class PyramidBuilder(QRunnable):
+    """
+    Builds the reduced levels of an image pyramid in a worker thread. When a cache directory
+    is given, the levels are read from it if the same file was seen before, and written to it otherwise;
+    after a write, the least recently used pyramids are removed while the cache is over its budget.
+
+    Attributes:
+        file_name (str): The path of the image file.
+        image (QImage): The original image.
+        cache_dir (str): The directory of the on-disk pyramid cache, None to disable it.
+        cache_budget (int): The size of the on-disk pyramid cache in bytes, 0 to keep every pyramid.
+        min_size (int): The largest side of the last level.
+        generation (LoadGeneration): The generation of the loads, the builder is skipped once it is stale.
+        token (int): The token of the load the builder belongs to.
+        signals (PyramidBuilderSignals): Emits the levels once they are built.
+    """
+
+    def __init__(self, file_name, image, cache_dir=None, min_size=256, generation=None, cache_budget=0):
+        """
+        Initializes the PyramidBuilder.
+
+        Args:
+            file_name (str): The path of the image file.
+            image (QImage): The original image.
+            cache_dir (str, optional): The directory of the on-disk pyramid cache. Defaults to None.
+            min_size (int, optional): The largest side of the last level. Defaults to 256.
+            generation (LoadGeneration, optional): The generation of the loads, the builder belongs to the current one. Defaults to None.
+            cache_budget (int, optional): The size of the on-disk pyramid cache in bytes, 0 to keep every pyramid. Defaults to 0.
+        """
+        super(PyramidBuilder, self).__init__()
+        self.file_name = file_name
+        self.image = image
+        self.cache_dir = cache_dir
+        self.cache_budget = cache_budget
+        self.min_size = min_size
+        self.generation = generation
+        self.token = generation.current if generation is not None else 0
+        self.signals = PyramidBuilderSignals()
+
+    def run(self):
+        if self.generation is not None and not self.generation.is_current(self.token):
+            return # another image was loaded before the build started
+        levels = None
+        cache_path = None
+        if self.cache_dir:
+            try:
+                cache_path = os.path.join(self.cache_dir, pyramid_cache_key(self.file_name))
+                levels = self.read_cache(cache_path)
+                if levels is not None:
+                    os.utime(cache_path) # the pyramid is used, it is removed last
+            except OSError as e:
+                print(f"Pyramid cache not available: {e}")
+                cache_path = None
+        if levels is None:
+            levels = self.build_levels()
+            if cache_path:
+                self.write_cache(cache_path, levels)
+                if self.cache_budget > 0:
+                    try:
+                        trim_pyramid_cache(self.cache_dir, self.cache_budget, keep=cache_path)
+                    except OSError as e:
+                        print(f"Failed to trim the pyramid cache: {e}")
+        self.signals.finished.emit(self.file_name, levels, self.token)
+
+    def build_levels(self):
+        """
+        Halve the original image until its largest side is below min_size.
+
+        Returns:
+            list: The QImage of every level after level 0.
+        """
+        levels = []
+        image = self.image
+        while max(image.width(), image.height()) > self.min_size:
+            image = image.scaled(max(image.width() // 2, 1), max(image.height() // 2, 1),
+                                 Qt.IgnoreAspectRatio, Qt.SmoothTransformation)
+            levels.append(image)
+        return levels
+
+    @staticmethod
+    def read_cache(cache_path):
+        """
+        Read the levels of a pyramid from the cache.
+
+        Args:
+            cache_path (str): The cache directory of the image.
+
+        Returns:
+            list: The QImage of every level after level 0, None if the image is not cached or its entry is corrupt.
+        """
+        index_file = os.path.join(cache_path, 'levels.txt')
+        if not os.path.exists(index_file):
+            return None
+        with open(index_file, 'r') as file:
+            try:
+                count = int(file.read().strip() or 0)
+            except ValueError:
+                return None # a corrupt entry is built and written again
+        levels = []
+        for level in range(1, count + 1):
+            image = QImage(os.path.join(cache_path, f'level_{level}.png'))
+            if image.isNull():
+                return None
+            levels.append(image)
+        return levels
+
+    @staticmethod
+    def write_cache(cache_path, levels):
+        """
+        Write the levels of a pyramid to the cache. The level count is written last,
+        so a partly written pyramid is never read back.
+
+        Args:
+            cache_path (str): The cache directory of the image.
+            levels (list): The QImage of every level after level 0.
+        """
+        try:
+            os.makedirs(cache_path, exist_ok=True)
+            for level, image in enumerate(levels, start=1):
+                image.save(os.path.join(cache_path, f'level_{level}.png'))
+            with open(os.path.join(cache_path, 'levels.txt'), 'w') as file:
+                file.write(str(len(levels)))
+        except OSError as e:
+            print(f"Failed to write the pyramid cache: {e}")
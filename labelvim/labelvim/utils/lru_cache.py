@@ -0,0 +1,113 @@
+from collections import OrderedDict
+
+
+class ByteBudgetLRUCache:
+    """
+    Least recently used cache bounded by the total size of its values in bytes instead of
+    their count. When a new value does not fit, the least recently used values are evicted.
+
+    Attributes:
+        budget (int): The maximum total size of the cached values in bytes.
+        cost (callable): Returns the size in bytes of a value.
+        entries (OrderedDict): The cached (value, size) pairs, least recently used first.
+        total (int): The total size of the cached values in bytes.
+        hits (int): The number of lookups that found their key.
+        misses (int): The number of lookups that did not find their key.
+    """
+
+    def __init__(self, budget, cost):
+        """
+        Initializes the ByteBudgetLRUCache.
+
+        Args:
+            budget (int): The maximum total size of the cached values in bytes.
+            cost (callable): Returns the size in bytes of a value.
+        """
+        self.budget = budget
+        self.cost = cost
+        self.entries = OrderedDict()
+        self.total = 0
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def get(self, key, default=None):
+        """
+        Get a cached value and mark it as the most recently used.
+
+        Args:
+            key (hashable): The key of the value.
+            default (optional): Returned when the key is not cached. Defaults to None.
+
+        Returns:
+            The cached value, or default.
+        """
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return default
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return entry[0]
+
+    def put(self, key, value):
+        """
+        Cache a value as the most recently used, evicting older values until it fits.
+        A value larger than the whole budget is not cached.
+
+        Args:
+            key (hashable): The key of the value.
+            value: The value to cache.
+        """
+        self.pop(key)
+        size = self.cost(value)
+        if size > self.budget:
+            return
+        self._evict(self.budget - size)
+        self.entries[key] = (value, size)
+        self.total += size
+
+    def set_budget(self, budget):
+        """
+        Change the budget, evicting the least recently used values if needed.
+
+        Args:
+            budget (int): The maximum total size of the cached values in bytes.
+        """
+        self.budget = budget
+        self._evict(budget)
+
+    def _evict(self, limit):
+        # least recently used values first, until the total is within the limit
+        while self.entries and self.total > limit:
+            _, (_, evicted_size) = self.entries.popitem(last=False)
+            self.total -= evicted_size
+
+    def pop(self, key, default=None):
+        """
+        Remove a value from the cache.
+
+        Args:
+            key (hashable): The key of the value.
+            default (optional): Returned when the key is not cached. Defaults to None.
+
+        Returns:
+            The removed value, or default.
+        """
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            return default
+        self.total -= entry[1]
+        return entry[0]
+
+    def clear(self):
+        """
+        Remove every value from the cache.
+        """
+        self.entries.clear()
+        self.total = 0
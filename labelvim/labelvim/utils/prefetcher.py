@@ -0,0 +1,197 @@
+import json
+from PyQt5.QtCore import QObject, QRunnable, QSize, QThreadPool, Qt, pyqtSignal
+from PyQt5.QtGui import QImageReader
+from labelvim.utils.image_cache import PREVIEW, DecodedImageCache, file_mtime
+
+
+class PrefetchedImage:
+    """
+    An image read ahead of the navigation: the decoded image, its fit to window version and its annotation.
+
+    Attributes:
+        file_name (str): The path of the image file.
+        mtime (int): The modification time of the image file when it was decoded.
+        image (QImage): The decoded image, None if it was not decoded, e.g. a tiled image.
+        preview (QImage): The image scaled to fit the window, None if the image is not larger than the window.
+        annotation_file (str): The path of the annotation file, None if the image has no annotation.
+        annotation_mtime (int): The modification time of the annotation file when it was read.
+        annotation (dict): The annotation data read from the file, None once it was handed out.
+    """
+
+    def __init__(self, file_name, mtime, image=None, preview=None, annotation_file=None, annotation_mtime=None, annotation=None):
+        self.file_name = file_name
+        self.mtime = mtime
+        self.image = image
+        self.preview = preview
+        self.annotation_file = annotation_file
+        self.annotation_mtime = annotation_mtime
+        self.annotation = annotation
+
+
+class PrefetchLoaderSignals(QObject):
+    """
+    Signals of the PrefetchLoader, a QRunnable can not emit signals by itself.
+    """
+    loaded = pyqtSignal(str, object) # Signal to transmit the file name and the PrefetchedImage
+
+
+class PrefetchLoader(QRunnable):
+    """
+    Reads one image ahead of the navigation in a worker thread: decodes the image, scales it to
+    fit the window and parses its annotation file.
+
+    Attributes:
+        file_name (str): The path of the image file.
+        annotation_file (str): The path of the annotation file, None if the image has no annotation.
+        fit_size (QSize): The size of the window the preview is scaled to fit.
+        max_pixels (int): Images with more pixels are not decoded, only their annotation is read.
+        decode (bool): False when the image is cached already and only the annotation is read.
+        signals (PrefetchLoaderSignals): Emits the PrefetchedImage.
+    """
+
+    def __init__(self, file_name, annotation_file, fit_size, max_pixels, decode=True):
+        """
+        Initializes the PrefetchLoader.
+
+        Args:
+            file_name (str): The path of the image file.
+            annotation_file (str): The path of the annotation file, None if the image has no annotation.
+            fit_size (QSize): The size of the window the preview is scaled to fit.
+            max_pixels (int): Images with more pixels are not decoded.
+            decode (bool, optional): Decode the image. Defaults to True.
+        """
+        super(PrefetchLoader, self).__init__()
+        self.setAutoDelete(False)
+        self.file_name = file_name
+        self.annotation_file = annotation_file
+        self.fit_size = fit_size
+        self.max_pixels = max_pixels
+        self.decode = decode
+        self.signals = PrefetchLoaderSignals()
+
+    def run(self):
+        item = PrefetchedImage(self.file_name, file_mtime(self.file_name), annotation_file=self.annotation_file)
+        reader = QImageReader(self.file_name)
+        size = reader.size()
+        if self.decode and size.isValid() and size.width() * size.height() <= self.max_pixels:
+            image = reader.read()
+            if not image.isNull():
+                item.image = image
+                if image.width() > self.fit_size.width() or image.height() > self.fit_size.height():
+                    item.preview = image.scaled(self.fit_size, Qt.KeepAspectRatio, Qt.SmoothTransformation)
+        if self.annotation_file:
+            item.annotation_mtime = file_mtime(self.annotation_file)
+            try:
+                with open(self.annotation_file, 'r') as file:
+                    item.annotation = json.load(file)
+            except (OSError, ValueError) as e:
+                print(f"Failed to prefetch {self.annotation_file}: {e}")
+        self.signals.loaded.emit(self.file_name, item)
+
+
+class ImagePrefetcher(QObject):
+    """
+    Reads the images around the displayed one before the annotator steps to them. The next
+    images in the direction of the navigation and a few images behind it are decoded and
+    scaled to fit the window into the shared decoded image cache, and their annotations are
+    parsed, in the background.
+
+    Attributes:
+        ahead (int): The number of images read ahead in the direction of the navigation.
+        behind (int): The number of images read in the opposite direction.
+        fit_size (QSize): The size of the window the previews are scaled to fit.
+        max_pixels (int): Images with more pixels are not decoded ahead, see CanvasWidget.tiled_image_pixels.
+        image_cache (DecodedImageCache): The decoded images and previews, shared with the canvas.
+        annotations (dict): The PrefetchedImage of the read images around the displayed one, keyed by file name.
+        pending (dict): The queued or running loaders, keyed by file name.
+        last_index (int): The index of the image displayed last, None before the first image.
+        direction (int): 1 when the annotator goes forward through the list, -1 when going back.
+    """
+
+    def __init__(self, ahead=3, behind=1, image_cache=None, parent=None):
+        """
+        Initializes the ImagePrefetcher.
+
+        Args:
+            ahead (int, optional): The number of images read ahead. Defaults to 3.
+            behind (int, optional): The number of images read behind. Defaults to 1.
+            image_cache (DecodedImageCache, optional): The shared decoded image cache, a new one when None. Defaults to None.
+            parent (QObject, optional): The parent object. Defaults to None.
+        """
+        super(ImagePrefetcher, self).__init__(parent)
+        self.ahead = ahead
+        self.behind = behind
+        self.fit_size = QSize(1310, 790)
+        self.max_pixels = 64 * 1024 * 1024
+        self.image_cache = image_cache if image_cache is not None else DecodedImageCache()
+        self.annotations = {}
+        self.pending = {}
+        self.last_index = None
+        self.direction = 1
+
+    def prefetch(self, file_names, index, annotation_file):
+        """
+        Follow the navigation to an image and start reading the images around it.
+        Loaders of images that left the window and did not start yet are dropped.
+
+        Args:
+            file_names (list): The paths of the images in the order of the list.
+            index (int): The index of the displayed image.
+            annotation_file (callable): Returns the path of the annotation file of an image, None if it has none.
+        """
+        if self.last_index is not None and index != self.last_index:
+            self.direction = 1 if index > self.last_index else -1
+        self.last_index = index
+        order = [index + self.direction * step for step in range(1, self.ahead + 1)]
+        order += [index - self.direction * step for step in range(1, self.behind + 1)]
+        wanted = [file_names[i] for i in order if 0 <= i < len(file_names)]
+        pool = QThreadPool.globalInstance()
+        for file_name, loader in list(self.pending.items()):
+            if file_name not in wanted and pool.tryTake(loader):
+                del self.pending[file_name]
+        # only the annotations of the window are kept, the images stay in the shared cache
+        self.annotations = {file_name: item for file_name, item in self.annotations.items() if file_name in wanted}
+        for file_name in wanted:
+            decode = not self.image_cache.contains(file_name)
+            if file_name in self.pending or (not decode and file_name in self.annotations):
+                continue
+            loader = PrefetchLoader(file_name, annotation_file(file_name), self.fit_size, self.max_pixels, decode)
+            loader.signals.loaded.connect(self.receive)
+            self.pending[file_name] = loader
+            # the displayed image is decoded first, the closest images ahead next
+            pool.start(loader, -1)
+
+    def receive(self, file_name, item):
+        """
+        Receive a read image from a worker thread.
+
+        Args:
+            file_name (str): The path of the image file.
+            item (PrefetchedImage): The read image.
+        """
+        if self.pending.pop(file_name, None) is None:
+            return
+        self.image_cache.put(file_name, item.image, item.mtime)
+        self.image_cache.put(file_name, item.preview, item.mtime, PREVIEW)
+        # the pixels live in the cache, only the annotation is kept here
+        item.image = None
+        item.preview = None
+        self.annotations[file_name] = item
+
+    def take_annotation(self, file_name, annotation_file):
+        """
+        Get the read annotation of an image when the annotator steps to it. It is handed out once,
+        as it is edited by its AnnotationManager, and not at all if the file changed since it was read.
+
+        Args:
+            file_name (str): The path of the image file.
+            annotation_file (str): The path of the expected annotation file, None if the image has none.
+
+        Returns:
+            dict: The annotation data, None if it was not read.
+        """
+        item = self.annotations.pop(file_name, None)
+        if (item is None or not annotation_file or item.annotation is None or item.annotation_file != annotation_file
+                or item.annotation_mtime != file_mtime(annotation_file)):
+            return None
+        return item.annotation
@@ -3,6 +3,7 @@ import numpy as np
 import os
 import json
 from PIL import Image
+from labelvim.utils.geometry import pack_polygons, split_polygons
 
 # random_colors_palette = np.random.randint(0, 255, (30, 3))
 random_colors_palette =np.array([[143, 195,  54],
@@ -95,13 +96,17 @@ def create_mask(image=None, annotations=None, label_map=None, include_img = Fals
         >>> mask = create_mask(image, annotations)
     """
     mask = np.zeros((image.shape[0], image.shape[1], 3), dtype=np.uint8)
+    if mask_type == 'polygon':
+        # the polygons of all the annotations are converted to int32 arrays at once
+        points, starts, counts = pack_polygons([polygon for annotation in annotations for polygon in annotation['segmentation']])
+        polygons = split_polygons(points.astype(np.int32), starts, counts)
+    position = 0
     for annotation in annotations:
         if mask_type == 'polygon':
             segmentation = annotation['segmentation']
-            for polygon in segmentation:
-                polygon = np.array(polygon).reshape(-1, 2)
-                polygon = polygon.astype(np.int32)
+            for polygon in polygons[position:position + len(segmentation)]:
                 cv2.fillPoly(mask, [polygon], color=random_colors_palette[annotation['category_id']].tolist())
+            position += len(segmentation)
             label = label_map[annotation['category_id']]
             bbox = annotation['bbox']
             x, y, w, h = bbox
@@ -0,0 +1,394 @@
+from collections import defaultdict
+
+
+class GridIndex:
+    """
+    A uniform grid over axis aligned rectangles. Every key is stored in the cells its
+    rectangle overlaps, so a query only looks at the keys of the cells it touches.
+    Rectangles spanning too many cells are kept in a separate list that every query returns.
+
+    Attributes:
+        cell_size (int): The width and height of a grid cell.
+        max_cells (int): The number of cells above which a rectangle is kept in the large list.
+        cells (dict): The keys stored in every cell, keyed by the (column, row) of the cell.
+        rects (dict): The rectangle (x0, y0, x1, y1) of every key.
+        large (set): The keys whose rectangle spans more than max_cells cells.
+    """
+
+    def __init__(self, cell_size: int = 64, max_cells: int = 256):
+        """
+        Initializes the GridIndex.
+
+        Args:
+            cell_size (int, optional): The width and height of a grid cell. Defaults to 64.
+            max_cells (int, optional): The number of cells above which a rectangle is kept
+                in the large list. Defaults to 256.
+        """
+        self.cell_size = cell_size
+        self.max_cells = max_cells
+        self.cells = defaultdict(set)
+        self.rects = {}
+        self.large = set()
+
+    def __len__(self):
+        return len(self.rects)
+
+    def _cell_range(self, x0, y0, x1, y1):
+        size = self.cell_size
+        return int(x0 // size), int(y0 // size), int(x1 // size), int(y1 // size)
+
+    def insert(self, key, rect):
+        """
+        Insert a key, replacing its previous rectangle if the key is already stored.
+
+        Args:
+            key (hashable): The key to store.
+            rect (tuple): The rectangle (x0, y0, x1, y1) of the key.
+        """
+        if key in self.rects:
+            self.remove(key)
+        x0, y0, x1, y1 = rect
+        rect = (min(x0, x1), min(y0, y1), max(x0, x1), max(y0, y1))
+        self.rects[key] = rect
+        c0, r0, c1, r1 = self._cell_range(*rect)
+        if (c1 - c0 + 1) * (r1 - r0 + 1) > self.max_cells:
+            self.large.add(key)
+            return
+        for column in range(c0, c1 + 1):
+            for row in range(r0, r1 + 1):
+                self.cells[(column, row)].add(key)
+
+    def remove(self, key):
+        """
+        Remove a key from the index. Unknown keys are ignored.
+
+        Args:
+            key (hashable): The key to remove.
+        """
+        rect = self.rects.pop(key, None)
+        if rect is None:
+            return
+        if key in self.large:
+            self.large.discard(key)
+            return
+        c0, r0, c1, r1 = self._cell_range(*rect)
+        for column in range(c0, c1 + 1):
+            for row in range(r0, r1 + 1):
+                cell = self.cells.get((column, row))
+                if cell is not None:
+                    cell.discard(key)
+                    if not cell:
+                        del self.cells[(column, row)]
+
+    def query(self, x0, y0, x1, y1):
+        """
+        Find the keys whose rectangle intersects a query rectangle.
+
+        Args:
+            x0 (float): The left edge of the query rectangle.
+            y0 (float): The top edge of the query rectangle.
+            x1 (float): The right edge of the query rectangle.
+            y1 (float): The bottom edge of the query rectangle.
+
+        Returns:
+            set: The keys intersecting the query rectangle.
+        """
+        found = set()
+        c0, r0, c1, r1 = self._cell_range(x0, y0, x1, y1)
+        if (c1 - c0 + 1) * (r1 - r0 + 1) > len(self.cells):
+            # the query covers more cells than are in use, walk the used cells instead
+            candidates = set()
+            for (column, row), cell in self.cells.items():
+                if c0 <= column <= c1 and r0 <= row <= r1:
+                    candidates.update(cell)
+        else:
+            candidates = set()
+            for column in range(c0, c1 + 1):
+                for row in range(r0, r1 + 1):
+                    cell = self.cells.get((column, row))
+                    if cell:
+                        candidates.update(cell)
+        candidates.update(self.large)
+        for key in candidates:
+            kx0, ky0, kx1, ky1 = self.rects[key]
+            if kx0 <= x1 and x0 <= kx1 and ky0 <= y1 and y0 <= ky1:
+                found.add(key)
+        return found
+
+    def clear(self):
+        """
+        Remove every key from the index.
+        """
+        self.cells.clear()
+        self.rects.clear()
+        self.large.clear()
+
+
+class SpatialIndex:
+    """
+    Spatial index of the annotation objects of an image, used by the canvas for hit-testing.
+    Object bounding boxes and polygon edges are kept in two grids in original image
+    coordinates. Polygon vertices are the end points of the edges, so they are found
+    through the edges too.
+
+    Edges are keyed by (object_id, polygon_index, edge_index), where edge i goes from
+    vertex i to vertex (i + 1) % n of the polygon.
+
+    Objects inserted without their polygons have their edges indexed lazily: the polygons
+    are read from polygon_source the first time an edge query reaches the bounding box of
+    the object, so loading many objects only indexes their bounding boxes.
+
+    Attributes:
+        objects (GridIndex): The bounding box of every object.
+        edges (GridIndex): The bounding box of every polygon edge.
+        order (dict): The drawing order of every object, objects drawn later are on top.
+        polygon_sizes (dict): The number of vertices of every polygon of every object.
+        polygon_source (callable): Returns the polygons of an object, each a list of (x, y) points.
+        unindexed (set): The objects whose edges are not indexed yet.
+    """
+
+    def __init__(self, object_cell_size: int = 256, edge_cell_size: int = 64, polygon_source=None):
+        """
+        Initializes the SpatialIndex.
+
+        Args:
+            object_cell_size (int, optional): The grid cell size for object bounding boxes. Defaults to 256.
+            edge_cell_size (int, optional): The grid cell size for polygon edges. Defaults to 64.
+            polygon_source (callable, optional): Returns the polygons of an object by id,
+                needed to insert objects without their polygons. Defaults to None.
+        """
+        self.objects = GridIndex(object_cell_size)
+        self.edges = GridIndex(edge_cell_size)
+        self.order = {}
+        self.polygon_sizes = {}
+        self.polygon_source = polygon_source
+        self.unindexed = set()
+        self._next_order = 0
+
+    def __len__(self):
+        return len(self.order)
+
+    def __contains__(self, object_id):
+        return object_id in self.order
+
+    @staticmethod
+    def _bbox_rect(bbox):
+        x, y, w, h = bbox
+        return (x, y, x + w, y + h)
+
+    def _insert_edges(self, object_id, polygon_index, points):
+        count = len(points)
+        for i in range(count):
+            x0, y0 = points[i]
+            x1, y1 = points[(i + 1) % count]
+            self.edges.insert((object_id, polygon_index, i), (x0, y0, x1, y1))
+
+    def _remove_edges(self, object_id, polygon_index):
+        sizes = self.polygon_sizes.get(object_id, [])
+        if polygon_index < len(sizes):
+            for i in range(sizes[polygon_index]):
+                self.edges.remove((object_id, polygon_index, i))
+
+    def _index_polygons(self, object_id, polygons):
+        self.unindexed.discard(object_id)
+        self.polygon_sizes[object_id] = [len(points) for points in polygons]
+        for polygon_index, points in enumerate(polygons):
+            self._insert_edges(object_id, polygon_index, points)
+
+    def insert_object(self, object_id, bbox, polygons=None):
+        """
+        Insert an object on top of the others, or replace it keeping its drawing order if it is already indexed.
+
+        Args:
+            object_id (int): The id of the object.
+            bbox (list): The bounding box [x, y, width, height] of the object.
+            polygons (list, optional): The polygons of the object, each a list of (x, y) points.
+                When None, the edges are indexed lazily from polygon_source. Defaults to None.
+        """
+        if object_id in self.order:
+            for polygon_index in range(len(self.polygon_sizes.get(object_id, []))):
+                self._remove_edges(object_id, polygon_index)
+        else:
+            self.order[object_id] = self._next_order
+            self._next_order += 1
+        self.objects.insert(object_id, self._bbox_rect(bbox))
+        if polygons is None and self.polygon_source is not None:
+            self.polygon_sizes.pop(object_id, None)
+            self.unindexed.add(object_id)
+        else:
+            self._index_polygons(object_id, polygons or [])
+
+    def update_object(self, object_id, bbox, polygons=()):
+        """
+        Re-index every polygon of an object after it changed.
+
+        Args:
+            object_id (int): The id of the object.
+            bbox (list): The bounding box [x, y, width, height] of the object.
+            polygons (list): The polygons of the object, each a list of (x, y) points.
+        """
+        self.insert_object(object_id, bbox, polygons)
+
+    def update_bbox(self, object_id, bbox):
+        """
+        Re-index the bounding box of an object.
+
+        Args:
+            object_id (int): The id of the object.
+            bbox (list): The bounding box [x, y, width, height] of the object.
+        """
+        self.objects.insert(object_id, self._bbox_rect(bbox))
+
+    def update_polygon(self, object_id, polygon_index, points, bbox):
+        """
+        Re-index one polygon of an object, e.g. after it was moved or a vertex was inserted.
+
+        Args:
+            object_id (int): The id of the object.
+            polygon_index (int): The index of the polygon in the object.
+            points (list): The (x, y) points of the polygon.
+            bbox (list): The bounding box [x, y, width, height] of the object.
+        """
+        if object_id in self.unindexed:
+            # the edges will be read from the polygon source when they are needed
+            self.update_bbox(object_id, bbox)
+            return
+        sizes = self.polygon_sizes.setdefault(object_id, [])
+        self._remove_edges(object_id, polygon_index)
+        while len(sizes) <= polygon_index:
+            sizes.append(0)
+        sizes[polygon_index] = len(points)
+        self._insert_edges(object_id, polygon_index, points)
+        self.update_bbox(object_id, bbox)
+
+    def update_vertex(self, object_id, polygon_index, vertex_index, previous_point, point, next_point, bbox):
+        """
+        Re-index the two edges touching a vertex after the vertex was moved.
+
+        Args:
+            object_id (int): The id of the object.
+            polygon_index (int): The index of the polygon in the object.
+            vertex_index (int): The index of the moved vertex.
+            previous_point (tuple): The (x, y) of the vertex before the moved one.
+            point (tuple): The new (x, y) of the moved vertex.
+            next_point (tuple): The (x, y) of the vertex after the moved one.
+            bbox (list): The bounding box [x, y, width, height] of the object.
+        """
+        if object_id in self.unindexed:
+            self.update_bbox(object_id, bbox)
+            return
+        count = self.polygon_sizes[object_id][polygon_index]
+        self.edges.insert((object_id, polygon_index, (vertex_index - 1) % count), (*previous_point, *point))
+        self.edges.insert((object_id, polygon_index, vertex_index), (*point, *next_point))
+        self.update_bbox(object_id, bbox)
+
+    def move_objects(self, object_ids, bboxes):
+        """
+        Re-index many objects after they moved as a whole, e.g. a dragged selection. Only the
+        bounding boxes are indexed again, the edges are dropped and read again lazily from
+        polygon_source the first time a hit-test reaches the object.
+
+        Args:
+            object_ids (list): The ids of the objects.
+            bboxes (list): The bounding box [x, y, width, height] of every object.
+        """
+        for object_id, bbox in zip(object_ids, bboxes):
+            if self.polygon_source is not None and object_id not in self.unindexed:
+                for polygon_index in range(len(self.polygon_sizes.get(object_id, []))):
+                    self._remove_edges(object_id, polygon_index)
+                self.polygon_sizes.pop(object_id, None)
+                self.unindexed.add(object_id)
+            self.objects.insert(object_id, self._bbox_rect(bbox))
+
+    def remove_object(self, object_id):
+        """
+        Remove an object and its polygons from the index.
+
+        Args:
+            object_id (int): The id of the object.
+        """
+        for polygon_index in range(len(self.polygon_sizes.get(object_id, []))):
+            self._remove_edges(object_id, polygon_index)
+        self.polygon_sizes.pop(object_id, None)
+        self.unindexed.discard(object_id)
+        self.objects.remove(object_id)
+        self.order.pop(object_id, None)
+
+    def objects_at(self, x, y, radius=0):
+        """
+        Find the objects whose bounding box is within a radius of a point.
+
+        Args:
+            x (float): The x coordinate of the point.
+            y (float): The y coordinate of the point.
+            radius (float, optional): The search radius. Defaults to 0.
+
+        Returns:
+            list: The object ids, topmost object first.
+        """
+        found = self.objects.query(x - radius, y - radius, x + radius, y + radius)
+        return sorted(found, key=self.order.__getitem__, reverse=True)
+
+    def objects_in_rect(self, x0, y0, x1, y1):
+        """
+        Find the objects whose bounding box intersects a rectangle.
+
+        Args:
+            x0 (float): The left edge of the rectangle.
+            y0 (float): The top edge of the rectangle.
+            x1 (float): The right edge of the rectangle.
+            y1 (float): The bottom edge of the rectangle.
+
+        Returns:
+            list: The object ids in drawing order, bottom object first.
+        """
+        found = self.objects.query(x0, y0, x1, y1)
+        return sorted(found, key=self.order.__getitem__)
+
+    def objects_within(self, x0, y0, x1, y1):
+        """
+        Find the objects whose bounding box lies entirely inside a rectangle, e.g. a rubber band selection.
+
+        Args:
+            x0 (float): The left edge of the rectangle.
+            y0 (float): The top edge of the rectangle.
+            x1 (float): The right edge of the rectangle.
+            y1 (float): The bottom edge of the rectangle.
+
+        Returns:
+            list: The object ids in drawing order, bottom object first.
+        """
+        rects = self.objects.rects
+        found = [object_id for object_id in self.objects.query(x0, y0, x1, y1)
+                 if x0 <= rects[object_id][0] and y0 <= rects[object_id][1] and rects[object_id][2] <= x1 and rects[object_id][3] <= y1]
+        return sorted(found, key=self.order.__getitem__)
+
+    def edges_near(self, x, y, radius):
+        """
+        Find the polygon edges whose bounding box is within a radius of a point.
+
+        Args:
+            x (float): The x coordinate of the point.
+            y (float): The y coordinate of the point.
+            radius (float): The search radius.
+
+        Returns:
+            list: The (object_id, polygon_index, edge_index) keys, topmost object first,
+                then by polygon and edge index.
+        """
+        if self.unindexed:
+            for object_id in self.objects.query(x - radius, y - radius, x + radius, y + radius) & self.unindexed:
+                self._index_polygons(object_id, self.polygon_source(object_id))
+        found = self.edges.query(x - radius, y - radius, x + radius, y + radius)
+        return sorted(found, key=lambda key: (-self.order[key[0]], key[1], key[2]))
+
+    def clear(self):
+        """
+        Remove every object from the index.
+        """
+        self.objects.clear()
+        self.edges.clear()
+        self.order.clear()
+        self.polygon_sizes.clear()
+        self.unindexed.clear()
+        self._next_order = 0
@@ -0,0 +1,258 @@
+import math
+from PyQt5.QtCore import QObject, QRect, QRectF, QRunnable, QSize, QThreadPool, Qt, pyqtSignal
+from PyQt5.QtGui import QColor, QImage, QImageIOHandler, QImageReader, QPainter, QPixmap
+
+
+def pixmap_bytes(pixmap):
+    """
+    Get the memory used by the pixels of a QPixmap or QImage.
+
+    Args:
+        pixmap (QPixmap | QImage): The image.
+
+    Returns:
+        int: The size of the pixels in bytes.
+    """
+    return pixmap.width() * pixmap.height() * max(pixmap.depth(), 8) // 8
+
+
+class TileLoaderSignals(QObject):
+    """
+    Signals of the TileLoader, a QRunnable can not emit signals by itself.
+    """
+    loaded = pyqtSignal(object, QImage) # Signal to transmit the tile key and the decoded tile
+
+
+class TileLoader(QRunnable):
+    """
+    Decodes one region of an image file in a worker thread, optionally at a reduced size.
+
+    Attributes:
+        file_name (str): The path of the image file.
+        key (hashable): The key of the region, sent back with the decoded image.
+        clip_rect (QRect): The region to decode on the original image, None for the whole image.
+        scaled_size (QSize): The size to decode the region at, None for the original size.
+        signals (TileLoaderSignals): Emits the decoded image.
+    """
+
+    def __init__(self, file_name, key, clip_rect=None, scaled_size=None):
+        """
+        Initializes the TileLoader.
+
+        Args:
+            file_name (str): The path of the image file.
+            key (hashable): The key of the region.
+            clip_rect (QRect, optional): The region to decode. Defaults to None.
+            scaled_size (QSize, optional): The size to decode the region at. Defaults to None.
+        """
+        super(TileLoader, self).__init__()
+        self.setAutoDelete(False)
+        self.file_name = file_name
+        self.key = key
+        self.clip_rect = clip_rect
+        self.scaled_size = scaled_size
+        self.signals = TileLoaderSignals()
+
+    def run(self):
+        reader = QImageReader(self.file_name)
+        if self.clip_rect is not None:
+            reader.setClipRect(self.clip_rect)
+        if self.scaled_size is not None:
+            reader.setScaledSize(self.scaled_size)
+        image = reader.read()
+        if image.isNull():
+            print(f"Failed to decode {self.file_name} {self.key}: {reader.errorString()}")
+        self.signals.loaded.emit(self.key, image)
+
+
+class TiledImageSource(QObject):
+    """
+    Image drawn from 512 px tiles decoded on demand, for images too large to decode at once.
+    Only the tiles of the visible region are decoded, in the background, and kept in a shared
+    LRU cache with a byte budget. A reduced overview of the whole image is decoded first; it is
+    drawn when zoomed out and used as the placeholder of the tiles that are not decoded yet.
+
+    Only formats whose reader can decode a clip rect without decoding the whole image can be tiled,
+    see TiledImageSource.supports.
+
+    Attributes:
+        file_name (str): The path of the image file.
+        image_size (QSize): The size of the original image.
+        tile_size (int): The width and height of a tile.
+        tile_cache (ByteBudgetLRUCache): The decoded tiles, keyed by (file_name, column, row).
+        overview (QPixmap): The reduced image, None until it is decoded.
+        pending (dict): The queued or running loaders, keyed by tile key.
+    """
+    tile_ready = pyqtSignal(QRect) # Signal to transmit the area of the original image that can be drawn again
+    placeholder_color = QColor(128, 128, 128)
+
+    def __init__(self, file_name, tile_cache, tile_size=512, overview_size=2048, parent=None):
+        """
+        Initializes the TiledImageSource and starts decoding the overview.
+
+        Args:
+            file_name (str): The path of the image file.
+            tile_cache (ByteBudgetLRUCache): The cache of the decoded tiles.
+            tile_size (int, optional): The width and height of a tile. Defaults to 512.
+            overview_size (int, optional): The largest side of the overview. Defaults to 2048.
+            parent (QObject, optional): The parent object. Defaults to None.
+        """
+        super(TiledImageSource, self).__init__(parent)
+        self.file_name = file_name
+        self.image_size = QImageReader(file_name).size()
+        self.tile_size = tile_size
+        self.tile_cache = tile_cache
+        self.overview = None
+        self.pending = {}
+        overview = self.image_size.scaled(QSize(overview_size, overview_size), Qt.KeepAspectRatio)
+        self.load('overview', scaled_size=overview)
+
+    @staticmethod
+    def supports(file_name):
+        """
+        Check if an image file can be decoded one tile at a time.
+
+        Args:
+            file_name (str): The path of the image file.
+
+        Returns:
+            bool: True if the reader of the format can decode a clip rect and a scaled size.
+        """
+        reader = QImageReader(file_name)
+        return (reader.supportsOption(QImageIOHandler.ClipRect)
+                and reader.supportsOption(QImageIOHandler.ScaledSize)
+                and reader.size().isValid())
+
+    def tile_rect(self, column, row):
+        """
+        Get the area of a tile on the original image.
+
+        Args:
+            column (int): The column of the tile.
+            row (int): The row of the tile.
+
+        Returns:
+            QRect: The tile area, clipped to the image.
+        """
+        size = self.tile_size
+        return QRect(column * size, row * size, size, size).intersected(QRect(0, 0, self.image_size.width(), self.image_size.height()))
+
+    def load(self, key, clip_rect=None, scaled_size=None):
+        """
+        Queue the decoding of a region, unless it is already queued.
+
+        Args:
+            key (hashable): The tile key, or 'overview'.
+            clip_rect (QRect, optional): The region to decode. Defaults to None.
+            scaled_size (QSize, optional): The size to decode the region at. Defaults to None.
+        """
+        if key in self.pending:
+            return
+        loader = TileLoader(self.file_name, key, clip_rect, scaled_size)
+        loader.signals.loaded.connect(self.receive_tile)
+        self.pending[key] = loader
+        QThreadPool.globalInstance().start(loader)
+
+    def receive_tile(self, key, image):
+        """
+        Receive a decoded tile or the overview from a worker thread.
+
+        Args:
+            key (hashable): The tile key, or 'overview'.
+            image (QImage): The decoded image.
+        """
+        if self.pending.pop(key, None) is None or image.isNull():
+            return
+        if key == 'overview':
+            self.overview = QPixmap.fromImage(image)
+            self.tile_ready.emit(QRect(0, 0, self.image_size.width(), self.image_size.height()))
+            return
+        self.tile_cache.put(key, QPixmap.fromImage(image))
+        self.tile_ready.emit(self.tile_rect(key[1], key[2]))
+
+    def cancel(self, keep=()):
+        """
+        Drop the loaders that did not start yet, except the ones of some tiles.
+
+        Args:
+            keep (set, optional): The tile keys to keep loading. Defaults to ().
+        """
+        pool = QThreadPool.globalInstance()
+        for key, loader in list(self.pending.items()):
+            if key != 'overview' and key not in keep and pool.tryTake(loader):
+                del self.pending[key]
+
+    def draw(self, painter, x0, y0, x1, y1, scale_factor, smooth=True, view_rect=None):
+        """
+        Draw the visible part of the image. The painter must map the original image coordinates
+        to the screen. Missing tiles are requested and drawn from the overview until they arrive.
+
+        A paint may only expose a part of the view, e.g. the area of a tile that just arrived,
+        so the tiles still loading are only dropped once they are outside of the whole view.
+
+        Args:
+            painter (QPainter): The painter of the canvas.
+            x0 (float): The left edge of the visible area on the original image.
+            y0 (float): The top edge of the visible area on the original image.
+            x1 (float): The right edge of the visible area on the original image.
+            y1 (float): The bottom edge of the visible area on the original image.
+            scale_factor (float): The zoom level of the canvas.
+            smooth (bool, optional): Use smooth filtering. Defaults to True.
+            view_rect (tuple, optional): The (x0, y0, x1, y1) area of the whole view on the original image,
+                the drawn area when None. Defaults to None.
+        """
+        painter.setRenderHint(QPainter.SmoothPixmapTransform, smooth)
+        x0, y0 = max(x0, 0), max(y0, 0)
+        x1, y1 = min(x1, self.image_size.width()), min(y1, self.image_size.height())
+        if x1 <= x0 or y1 <= y0:
+            return
+        if self.overview is not None and self.overview.width() >= self.image_size.width() * scale_factor:
+            # the overview has enough pixels for the zoom level, no tile is needed
+            self.cancel()
+            self.draw_overview(painter, QRectF(x0, y0, x1 - x0, y1 - y0))
+            return
+        for key in self.tile_keys(x0, y0, x1, y1):
+            rect = self.tile_rect(key[1], key[2])
+            tile = self.tile_cache.get(key)
+            if tile is not None:
+                painter.drawPixmap(QRectF(rect), tile, QRectF(tile.rect()))
+                continue
+            self.load(key, clip_rect=rect)
+            self.draw_overview(painter, QRectF(rect))
+        # tiles that scrolled out of view before their loader started are not decoded
+        self.cancel(keep=set(self.tile_keys(*(view_rect if view_rect is not None else (x0, y0, x1, y1)))))
+
+    def tile_keys(self, x0, y0, x1, y1):
+        """
+        Get the keys of the tiles covering an area of the image.
+
+        Args:
+            x0 (float): The left edge of the area on the original image.
+            y0 (float): The top edge of the area on the original image.
+            x1 (float): The right edge of the area on the original image.
+            y1 (float): The bottom edge of the area on the original image.
+
+        Returns:
+            list: The (file_name, column, row) keys, row by row.
+        """
+        x0, y0 = max(x0, 0), max(y0, 0)
+        x1, y1 = min(x1, self.image_size.width()), min(y1, self.image_size.height())
+        size = self.tile_size
+        return [(self.file_name, column, row) for row in range(int(y0 // size), int(math.ceil(y1 / size)))
+                for column in range(int(x0 // size), int(math.ceil(x1 / size)))]
+
+    def draw_overview(self, painter, rect):
+        """
+        Draw an area of the image from the overview, or the placeholder color if it is not decoded yet.
+
+        Args:
+            painter (QPainter): The painter of the canvas.
+            rect (QRectF): The area on the original image.
+        """
+        if self.overview is None:
+            painter.fillRect(rect, self.placeholder_color)
+            return
+        scale_x = self.overview.width() / self.image_size.width()
+        scale_y = self.overview.height() / self.image_size.height()
+        source = QRectF(rect.x() * scale_x, rect.y() * scale_y, rect.width() * scale_x, rect.height() * scale_y)
+        painter.drawPixmap(rect, self.overview, source)
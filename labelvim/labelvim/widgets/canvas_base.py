@@ -0,0 +1,606 @@
+from PyQt5.QtCore import Qt, QPoint, QRect, QThreadPool, QTimer
+from PyQt5.QtGui import QBrush, QColor, QImageReader, QPen, QPixmap, QPolygon
+from labelvim.widgets.label_pupop import LabelPopup
+from labelvim.widgets.canvas_overlay import TitleCache, screen_polygon
+from labelvim.utils.config import ANNOTATION_MODE, ANNOTATION_TYPE
+from labelvim.utils.annotation_store import AnnotationStore, to_qpolygon
+from labelvim.utils.edit_journal import EditJournal
+from labelvim.utils.image_cache import PREVIEW, DecodedImageCache
+from labelvim.utils.image_loader import ImageLoader, LoadGeneration
+from labelvim.utils.image_pyramid import ImagePyramid, PyramidBuilder
+from labelvim.utils.lru_cache import ByteBudgetLRUCache
+from labelvim.utils.tile_source import TiledImageSource, pixmap_bytes
+
+
+class CanvasBase:
+    """
+    Image decoding, drawing and selection shared by the canvas engines, CanvasWidget and
+    GraphicsCanvasWidget. The engines inherit it next to their Qt widget class, set up its
+    state with init_canvas_state and implement the methods below that raise NotImplementedError.
+
+    Objects are drawn in screen pixels relative to the top left corner of the displayed image,
+    so the engines only differ in where the painter is placed and how a change is repainted.
+
+    Attributes:
+        size_geometry (QRect): The area the image is fit into when it is loaded, set by the engine.
+        annotations (AnnotationStore): The store of the drawn objects.
+        edit_journal (EditJournal): The undo and redo history of the edits of the objects.
+        image_size (QSize): The size of the original image, None without an image.
+        display_size (QSize): The size of the image on screen, None without an image.
+        image_pyramid (ImagePyramid): The reduced resolution levels of the image, built in the background.
+        tile_source (TiledImageSource): The tiles of an image too large to decode at once, None otherwise.
+        scale_factor (float): The zoom level, screen pixels per image pixel.
+        selected_object (int): The id of the object being edited, None if no object is selected.
+        selected_objects (list): The ids of the objects selected with the rubber band, bottom object first.
+        label_list (list): The label names, indexed by category id.
+    """
+
+    def init_canvas_state(self):
+        """
+        Set up the state read by the shared methods, called by the engines from their __init__.
+        """
+        self.start_point = None
+        self.end_point = None
+        self.polygon_points = []
+        self.polygon_move_point = None
+        self.annotations = AnnotationStore()  # Store of the drawn objects
+        # the object list and the other views follow the store through its change events
+        self.annotations.subscribe(self.annotation_changed.emit)
+        self.edit_journal = EditJournal() # Undo and redo history of the edits of the objects
+        self.original_pixmap = None
+        self.image_size = None # The size of the original image
+        self.display_size = None # The size of the image on screen, the zoom is applied when painting
+        self.image_pyramid = None # Reduced resolution levels of the image, built in the background
+        self.pyramid_builder = None
+        self.pyramid_cache_dir = None # Directory of the on-disk pyramid cache, None to disable it
+        self.pyramid_cache_budget = 0 # Size of the on-disk pyramid cache in bytes, 0 to keep every pyramid
+        self.image_loader = None # Decodes the displayed image in the background, None once it is decoded
+        self.preview_loader = None # Decodes the displayed image at the window resolution first, None once it is shown
+        self.load_generation = LoadGeneration() # Token of the displayed image, the background jobs of older images are dropped
+        self.image_cache = DecodedImageCache() # Decoded images, shared with the prefetcher and the mask saving
+        self.placeholder_color = QColor(128, 128, 128) # Drawn in place of the image until it is decoded
+        self.tile_source = None # Tiles of an image too large to decode at once
+        self.tiled_image_pixels = 64 * 1024 * 1024 # Images with more pixels are decoded one tile at a time
+        self.tile_cache = ByteBudgetLRUCache(256 * 1024 * 1024, pixmap_bytes) # Decoded tiles of every tiled image
+        self.fast_zoom = False # Draw the image with fast filtering while the zoom is changing
+        self.smooth_zoom_timer = QTimer(self)
+        self.smooth_zoom_timer.setSingleShot(True)
+        self.smooth_zoom_timer.setInterval(150)
+        self.smooth_zoom_timer.timeout.connect(self.smooth_zoom)
+        self.brush_color = QColor(0, 0, 255, 50)
+        self.polygon_brush_color = QColor(255, 0, 0, 50)
+        self.pen_color = QColor(0, 255, 255)
+        self.title_pen_color = QColor(0, 255, 255)
+        self.selected_rectangle_brush_color = QColor(255, 0, 255, 50)
+        self.selected_polygon_brush_color = QColor(255, 255, 0, 50)
+        # pens and brushes are built once and shared by every frame
+        self.object_pen = QPen(self.pen_color, 2, Qt.SolidLine)
+        self.title_pen = QPen(self.title_pen_color, 2, Qt.SolidLine)
+        self.title_text_pen = QPen(QColor(0, 0, 0), 2, Qt.SolidLine)
+        self.object_brush = QBrush(self.brush_color)
+        self.polygon_brush = QBrush(self.polygon_brush_color)
+        self.selected_rectangle_brush = QBrush(self.selected_rectangle_brush_color)
+        self.selected_polygon_brush = QBrush(self.selected_polygon_brush_color)
+        self.title_brush = QBrush(QColor(255, 255, 255, 75))
+        self.marker_brush = QBrush(self.pen_color)
+        self.band_pen = QPen(self.pen_color, 1, Qt.DashLine)
+        self.selected_object = None # Id of the object being edited
+        self.selected_object_subset = None
+        self.selected_vertex = None
+        self.line_segment = None
+        self.moving_object = False
+        self.selected_objects = [] # Ids of the objects selected with the rubber band, bottom object first
+        self.band_start = None # Corners of the rubber band being dragged, on the original image
+        self.band_end = None
+        self.moving_group = False # The rubber band selection is being dragged
+        self.group_offset = None # The (dx, dy) the selection moved since the drag started
+        self.group_layer = None # The (QPixmap, QPoint) the dragged selection is drawn from, None to draw every object
+        self.selection_rect = QRect() # The area covered by the selected objects on the original image
+        self.last_mouse_position = QPoint()  # Store the last mouse position
+        self.label_list = []
+        self.scale_factor = 1.0
+        self.annotation_mode = ANNOTATION_MODE.NONE
+        self.annotation_type = ANNOTATION_TYPE.NONE
+        self.zoom_in_scale_factor = 1.25
+        self.zoom_out_scale_factor = 0.8
+        self.max_scale_factor = 6
+        self.min_scale_factor = 0.1
+        self.point_click_radious = 5 # The radious of the point click
+        # level of detail for the objects that are not selected, in screen pixels
+        self.lod_marker_size = 4 # objects smaller than this are drawn as a marker
+        self.lod_handle_spacing = 2 * self.point_click_radious + 2 # vertex handles are hidden below this spacing
+        self.lod_title_width = 16 # titles of objects narrower than this on screen are not drawn
+        self.title_cache = TitleCache()
+
+    ## Engine
+
+    def invalidate_image(self, rect=None):
+        """
+        Schedule a repaint of an area of the image, e.g. when a tile or a pyramid level arrived.
+
+        Args:
+            rect (QRect, optional): The area on the original image, the whole image when None.
+        """
+        raise NotImplementedError
+
+    def smooth_zoom(self):
+        """
+        Draw the image again with smooth filtering once the zoom is idle.
+        """
+        raise NotImplementedError
+
+    def map_to_original_image(self, pos):
+        """
+        Map a position on the engine widget to the original image.
+
+        Args:
+            pos (QPoint): The position on the engine widget.
+
+        Returns:
+            QPoint: The position on the original image, None outside of the image.
+        """
+        raise NotImplementedError
+
+    def set_objects_category(self, object_ids, category_id):
+        """
+        Change the label of many objects, as one edit of the undo history.
+
+        Args:
+            object_ids (list): The ids of the objects.
+            category_id (int): The index of the new label.
+        """
+        raise NotImplementedError
+
+    ## Image
+
+    def open_image(self, file_name, image=None, preview=None):
+        """
+        Start displaying an image file: the image is drawn from the image cache, decoded in the
+        background or, when too large to decode at once, one tile at a time. The jobs of the
+        previous image are dropped. The engine fits the image to its window afterwards.
+
+        Args:
+            file_name (str): The path of the image file.
+            image (QImage, optional): The image already decoded, read from the image cache when None. Defaults to None.
+            preview (QImage, optional): The image already scaled to fit the window. Defaults to None.
+        """
+        self.release_tile_source()
+        # the jobs of the image still being decoded are skipped, or dropped when they arrive
+        self.load_generation.next()
+        self.image_loader = None
+        self.preview_loader = None
+        self.pyramid_builder = None
+        image_size = QImageReader(file_name).size()
+        if image is None:
+            # decoded before, e.g. by the prefetcher, together with its fit to window preview
+            image = self.image_cache.get(file_name)
+            if image is not None and preview is None:
+                preview = self.image_cache.get(file_name, PREVIEW)
+        if image_size.width() * image_size.height() > self.tiled_image_pixels and TiledImageSource.supports(file_name):
+            # huge images are never decoded at once, the visible tiles are decoded in the background
+            self.original_pixmap = None
+            self.image_pyramid = None
+            self.tile_source = TiledImageSource(file_name, self.tile_cache, parent=self)
+            self.tile_source.tile_ready.connect(self.invalidate_image)
+            self.image_size = self.tile_source.image_size
+        elif image is not None:
+            self.original_pixmap = QPixmap.fromImage(image)
+            self.image_size = self.original_pixmap.size()
+            self.build_image_pyramid(file_name, image, preview)
+        elif image_size.isValid():
+            # the size is read from the header, the pixels are decoded in the background
+            self.original_pixmap = None
+            self.image_pyramid = None
+            self.image_size = image_size
+            if preview is None:
+                preview = self.image_cache.get(file_name, PREVIEW)
+            if preview is not None:
+                # the preview is drawn until the original is decoded
+                self.image_pyramid = ImagePyramid(file_name, QPixmap.fromImage(preview), image_size)
+            self.decode_image(file_name, preview is None)
+        else:
+            # the reader can not tell the size without decoding the image
+            self.original_pixmap = QPixmap(file_name)
+            self.image_size = self.original_pixmap.size()
+            self.build_image_pyramid(file_name)
+
+    def release_tile_source(self):
+        """
+        Stop drawing the tiled image, the tiles that are not decoded yet are dropped.
+        """
+        if self.tile_source is not None:
+            self.tile_source.tile_ready.disconnect(self.invalidate_image)
+            self.tile_source.cancel()
+            self.tile_source = None
+
+    def decode_image(self, file_name, preview=True):
+        """
+        Start decoding an image in a worker thread. The placeholder is drawn until it is decoded.
+
+        An image at least twice as large as the window is first decoded at the window resolution,
+        which is much faster for a large JPEG as it is decoded at 1/2, 1/4 or 1/8 of its size.
+        The original follows and is drawn once the zoom goes past the preview resolution.
+
+        Args:
+            file_name (str): The path of the image.
+            preview (bool, optional): Decode the image at the window resolution first. Defaults to True.
+        """
+        pool = QThreadPool.globalInstance()
+        fit_size = self.image_size.scaled(self.size_geometry.size(), Qt.KeepAspectRatio)
+        if preview and fit_size.width() * 2 <= self.image_size.width():
+            self.preview_loader = ImageLoader(file_name, fit_size, self.load_generation)
+            self.preview_loader.signals.loaded.connect(self.receive_preview)
+            pool.start(self.preview_loader, 1)
+        self.image_loader = ImageLoader(file_name, generation=self.load_generation)
+        self.image_loader.signals.loaded.connect(self.receive_image)
+        pool.start(self.image_loader)
+
+    def receive_image(self, file_name, image, token):
+        """
+        Receive a decoded image from the worker thread. Images that are no longer displayed are dropped.
+
+        Args:
+            file_name (str): The path of the image.
+            image (QImage): The decoded image, null if decoding failed.
+            token (int): The token of the load the image belongs to.
+        """
+        if self.image_loader is None or not self.load_generation.is_current(token):
+            return
+        self.image_cache.put(file_name, image, self.image_loader.mtime)
+        self.image_loader = None
+        if image.isNull():
+            return
+        # only the upload of the pixels is left to the GUI thread
+        self.original_pixmap = QPixmap.fromImage(image)
+        self.build_image_pyramid(file_name, image)
+        self.invalidate_image()
+
+    def receive_preview(self, file_name, image, token):
+        """
+        Receive the image decoded at the window resolution. It is drawn at every zoom level until
+        the original is decoded, and dropped if the original arrived first.
+
+        Args:
+            file_name (str): The path of the image.
+            image (QImage): The decoded preview, null if decoding failed.
+            token (int): The token of the load the preview belongs to.
+        """
+        if self.preview_loader is None or not self.load_generation.is_current(token):
+            return
+        self.image_cache.put(file_name, image, self.preview_loader.mtime, PREVIEW)
+        self.preview_loader = None
+        if image.isNull() or self.image_pyramid is not None:
+            return
+        self.image_pyramid = ImagePyramid(file_name, QPixmap.fromImage(image), self.image_size)
+        self.invalidate_image()
+
+    def build_image_pyramid(self, file_name, image=None, preview=None):
+        """
+        Start building the image pyramid of the loaded image in the background. The original
+        image, or its preview when zoomed out, is drawn until the reduced levels are ready.
+
+        Args:
+            file_name (str): The path of the loaded image.
+            image (QImage, optional): The decoded image, read back from the original pixmap when None. Defaults to None.
+            preview (QImage, optional): The image scaled to fit the window. Defaults to None.
+        """
+        if self.image_pyramid is not None and self.image_pyramid.file_name == file_name and not self.image_pyramid.has_original():
+            # the preview stays as a reduced level until the pyramid is built
+            self.image_pyramid.set_original(self.original_pixmap)
+        else:
+            self.image_pyramid = ImagePyramid(file_name, self.original_pixmap)
+        if preview is not None:
+            self.image_pyramid.set_levels([preview])
+        if image is None:
+            image = self.original_pixmap.toImage()
+        self.pyramid_builder = PyramidBuilder(file_name, image, self.pyramid_cache_dir, generation=self.load_generation,
+                                              cache_budget=self.pyramid_cache_budget)
+        self.pyramid_builder.signals.finished.connect(self.update_image_pyramid)
+        QThreadPool.globalInstance().start(self.pyramid_builder)
+
+    def update_image_pyramid(self, file_name, levels, token):
+        """
+        Receive the reduced levels of the image pyramid. Levels of an image that is no longer displayed are dropped.
+
+        Args:
+            file_name (str): The path of the image the levels belong to.
+            levels (list): The QImage of every level after level 0.
+            token (int): The token of the load the levels belong to.
+        """
+        if self.image_pyramid is None or not self.load_generation.is_current(token):
+            return
+        self.image_pyramid.set_levels(levels)
+        self.pyramid_builder = None
+        self.invalidate_image()
+
+    def start_fast_zoom(self):
+        """
+        Draw the image with fast filtering until the zoom has not changed for a while,
+        then it is drawn again with smooth filtering.
+        """
+        self.fast_zoom = True
+        self.smooth_zoom_timer.start()
+
+    ## Geometry
+
+    def overlay_margins(self):
+        """
+        Get how far the drawing of an object can reach outside of its bounding box on screen:
+        the vertex handles on every side, the title box above it and the label text to its right.
+
+        Returns:
+            tuple: The (left, top, right, bottom) margins in widget pixels.
+        """
+        title_width = max([self.fontMetrics().horizontalAdvance(label) for label in self.label_list], default=0)
+        margin = self.point_click_radious + 3
+        return margin, margin + 20, margin + title_width, margin
+
+    def object_image_rect(self, rectangle):
+        """
+        Get the area covered by an object on the original image.
+
+        Args:
+            rectangle (AnnotationRecord): The object.
+
+        Returns:
+            QRect: The bounding rectangle of the object.
+        """
+        bbox = rectangle['bbox']
+        rect = QRect(bbox[0], bbox[1], bbox[2], bbox[3]).normalized()
+        bounds = self.annotations.bounds(rectangle)
+        if bounds is not None:
+            rect = rect.united(QRect(QPoint(bounds[0], bounds[1]), QPoint(bounds[2], bounds[3])))
+        return rect
+
+    def interaction_image_rect(self):
+        """
+        Get the area on the original image touched by the current interaction: the selected
+        object, the rectangle being drawn and the polygon being created.
+
+        Returns:
+            QRect: The bounding rectangle of the interaction, empty if nothing is in progress.
+        """
+        rect = QRect()
+        selected = self.get_selected_object()
+        if selected is not None:
+            rect = rect.united(self.object_image_rect(selected))
+        if self.start_point and self.end_point:
+            rect = rect.united(QRect(self.start_point, self.end_point).normalized())
+        if self.polygon_points:
+            rect = rect.united(QPolygon(self.polygon_points).boundingRect())
+        if self.band_start and self.band_end:
+            rect = rect.united(QRect(self.band_start, self.band_end).normalized())
+        if self.selected_objects:
+            rect = rect.united(self.selection_rect)
+        return rect
+
+    @staticmethod
+    def distance(p1, p2):
+        """
+        Calculate the distance between two points.
+        
+        Args:
+        
+            p1 (QPoint): The first point.
+            p2 (QPoint): The second point.
+            
+            Returns:
+            
+                float: The distance between the two points.
+                
+        """
+        return ((p1.x() - p2.x())**2 + (p1.y() - p2.y())**2)**0.5
+
+    @staticmethod
+    def distance_to_center(pos, bbox):
+        """
+        Calculate the distance from a point to the center of a bounding box.
+        
+        Args:
+            pos (QPoint): The position point.
+            bbox (list): The bounding box coordinates [x, y, width, height].
+            
+        Returns:
+            float: The distance from the point to the center of the bounding box.
+        """
+        center_x = bbox[0] + bbox[2] / 2
+        center_y = bbox[1] + bbox[3] / 2
+        return (pos.x() - center_x) ** 2 + (pos.y() - center_y) ** 2
+
+    ## Drawing
+
+    def draw_interaction(self, painter):
+        """
+        Draw the object being created, relative to the top left corner of the displayed image:
+        the rectangle being dragged or the points of the polygon clicked so far, and the
+        rubber band and the objects it selected.
+
+        Args:
+            painter (QPainter): The painter to draw with.
+        """
+        if self.selected_objects or self.band_start:
+            if self.group_layer is None:
+                self.draw_selection(painter)
+            if self.band_start and self.band_end:
+                painter.setPen(self.band_pen)
+                painter.setBrush(Qt.NoBrush)
+                painter.drawRect(QRect(QPoint(int(self.band_start.x() * self.scale_factor), int(self.band_start.y() * self.scale_factor)),
+                                       QPoint(int(self.band_end.x() * self.scale_factor), int(self.band_end.y() * self.scale_factor))).normalized())
+        if self.annotation_type == ANNOTATION_TYPE.BBOX:
+            # print(f"self.rectangles: {self.rectangles}")
+            if self.start_point and self.end_point:
+                painter.setPen(self.object_pen)
+                painter.setBrush(self.object_brush)
+                start_point = QPoint(int(self.start_point.x() * self.scale_factor), int(self.start_point.y() * self.scale_factor))
+                end_point = QPoint(int(self.end_point.x() * self.scale_factor), int(self.end_point.y() * self.scale_factor))
+                rect = QRect(start_point, end_point).normalized()
+                painter.drawEllipse(rect.topLeft(), 5, 5)
+                painter.drawEllipse(rect.topRight(), 5, 5)
+                painter.drawEllipse(rect.bottomLeft(), 5, 5)
+                painter.drawEllipse(rect.bottomRight(), 5, 5)
+                painter.drawRect(rect)
+        elif self.annotation_type == ANNOTATION_TYPE.POLYGON:
+            # print(f"self.rectangles: {self.rectangles}")
+            if self.polygon_points:
+                polygon_points = [QPoint(int(point.x() * self.scale_factor), int(point.y() * self.scale_factor)) for point in self.polygon_points]
+                painter.setPen(self.object_pen)
+                painter.setBrush(self.polygon_brush)
+                painter.drawPolygon(QPolygon(polygon_points))
+                for point in polygon_points:
+                    painter.drawEllipse(point, 5, 5)
+
+    def draw_selection(self, painter):
+        """
+        Highlight the objects of the rubber band selection, relative to the top left corner of the displayed image.
+
+        Args:
+            painter (QPainter): The painter to draw with.
+        """
+        painter.setPen(self.band_pen)
+        painter.setBrush(self.selected_rectangle_brush)
+        scale = self.scale_factor
+        painter.drawRects([QRect(int(bbox[0] * scale), int(bbox[1] * scale), int(bbox[2] * scale), int(bbox[3] * scale))
+                           for bbox in (rectangle.bbox for rectangle in self.selected_records())])
+
+    def draw_object(self, painter, rectangle, selected=False):
+        """
+        Draw an annotation object relative to the top left corner of the displayed image.
+
+        Args:
+            painter (QPainter): The painter to draw with.
+            rectangle (AnnotationRecord): The object.
+            selected (bool): Whether the object is drawn as the selected object.
+        """
+        rect = rectangle['bbox']
+        rect = QRect(int(rect[0] * self.scale_factor), int(rect[1] * self.scale_factor), int(rect[2] * self.scale_factor), int(rect[3] * self.scale_factor))
+        if not selected and max(abs(rect.width()), abs(rect.height())) < self.lod_marker_size:
+            # objects covering a few pixels on screen collapse into a marker
+            painter.setPen(Qt.NoPen)
+            painter.setBrush(self.marker_brush)
+            painter.drawRect(rect.center().x() - 1, rect.center().y() - 1, 3, 3)
+            return
+        painter.setPen(self.object_pen)
+        painter.setBrush(self.selected_rectangle_brush if selected else self.object_brush)
+        if self.annotation_type == ANNOTATION_TYPE.BBOX:
+            if selected or min(abs(rect.width()), abs(rect.height())) >= self.lod_handle_spacing:
+                painter.drawEllipse(rect.topLeft(), 5, 5)
+                painter.drawEllipse(rect.topRight(), 5, 5)
+                painter.drawEllipse(rect.bottomLeft(), 5, 5)
+                painter.drawEllipse(rect.bottomRight(), 5, 5)
+            painter.drawRect(rect)
+        else:
+            painter.drawRect(rect)
+            painter.setBrush(self.selected_polygon_brush if selected else self.polygon_brush)
+            # vertex handles of the other objects are hidden when they would overlap on screen
+            vertex_count = max(self.annotations.vertex_count(rectangle), 1)
+            show_handles = selected or 2 * (abs(rect.width()) + abs(rect.height())) / vertex_count >= self.lod_handle_spacing
+            for polgon in self.annotations.polygons(rectangle): # modified as per polygon list
+                if selected:
+                    polygon_points = to_qpolygon(polgon * self.scale_factor)
+                else:
+                    polygon_points = screen_polygon(polgon, self.scale_factor)
+                painter.drawPolygon(polygon_points)
+                if show_handles:
+                    for point in polygon_points:
+                        painter.drawEllipse(point, 5, 5)
+
+    def draw_title(self, painter, rectangle):
+        """
+        Draw the label title above an annotation object, relative to the top left corner of
+        the displayed image. Objects too small on screen to show a title are skipped.
+
+        Args:
+            painter (QPainter): The painter to draw with.
+            rectangle (AnnotationRecord): The object.
+        """
+        rect, index = rectangle['bbox'], rectangle["category_id"]
+        rect = QRect(int(rect[0] * self.scale_factor), int(rect[1] * self.scale_factor), int(rect[2] * self.scale_factor), int(rect[3] * self.scale_factor))
+        if abs(rect.width()) < self.lod_title_width or not 0 <= index < len(self.label_list):
+            return
+        painter.setPen(self.title_pen)
+        painter.setBrush(self.title_brush)
+        painter.drawRect(rect.topLeft().x(), rect.topLeft().y() - 20, rect.width(), 20)
+        painter.setPen(self.title_text_pen)
+        # the baseline of the text is 5 px above the object, as drawText placed it
+        font = painter.font()
+        painter.drawStaticText(rect.topLeft().x(), rect.topLeft().y() - 5 - self.title_cache.ascent(font),
+                               self.title_cache.text(self.label_list[index], font))
+
+    ## Selection
+
+    def get_selected_object(self):
+        """
+        Get the selected rectangle.
+        
+        Returns:
+        
+            AnnotationRecord: The selected rectangle.
+        """
+        if self.selected_object is None:
+            return None
+        return self.annotations.get(self.selected_object)
+
+    def select_label_from_label_list(self):
+        """Generate a label selection popup dialog."""
+        dialog = LabelPopup(self.label_list, self.annotations.records, self.annotation_type, self.update_label_list_slot_transmitter, self)
+        if dialog.exec_():
+            selected_label, _, selected_id = dialog.get_selected_item()
+            print(f"label list: {self.label_list}")
+            print(f"Selected Label: {selected_label}")
+            print(f"Selected ID: {selected_id}")
+            return selected_label, selected_id
+        return None, None
+
+    def clear_selection(self):
+        """
+        Drop the rubber band selection.
+        """
+        self.selected_objects = []
+        self.selection_rect = QRect()
+        self.band_start = None
+        self.band_end = None
+        self.moving_group = False
+        self.group_offset = None
+        self.group_layer = None
+
+    def selected_records(self):
+        """
+        Get the objects of the rubber band selection.
+
+        Returns:
+            list: The AnnotationRecord of every selected object still in the store, bottom object first.
+        """
+        return [rectangle for rectangle in map(self.annotations.get, self.selected_objects) if rectangle is not None]
+
+    def start_rubber_band(self, click_pos):
+        """
+        Start dragging a rubber band, the previous selection is dropped.
+
+        Args:
+            click_pos (QPoint): The mouse position in widget coordinates.
+        """
+        band_start = self.map_to_original_image(click_pos)
+        self.clear_selection()
+        if band_start is not None:
+            self.band_start = band_start
+            self.band_end = band_start
+            self.moving_object = False
+
+    def update_selection_rect(self):
+        """
+        Compute the area covered by the selected objects again, e.g. after an undo.
+        """
+        self.selection_rect = QRect()
+        for rectangle in self.selected_records():
+            self.selection_rect = self.selection_rect.united(self.object_image_rect(rectangle))
+
+    def relabel_selected_objects(self):
+        """
+        Ask for a label and give it to every object of the rubber band selection.
+        """
+        if not self.selected_objects:
+            return
+        label_selected, _ = self.select_label_from_label_list()
+        if not label_selected or label_selected not in self.label_list:
+            return
+        self.set_objects_category(self.selected_objects, self.label_list.index(label_selected))
@@ -0,0 +1,167 @@
+import numpy as np
+from PyQt5.QtCore import Qt
+from PyQt5.QtGui import QFontMetrics, QPainter, QPicture, QStaticText, QTransform
+from labelvim.utils.annotation_store import to_qpolygon
+
+
+class OverlayCache:
+    """
+    Retained overlay layer for the canvas. Every annotation object that is not being
+    edited is recorded once into a QPicture at the current zoom level and replayed on
+    the following frames, so a repaint does not rebuild the pens, brushes and polygons
+    of the whole scene. The label titles are drawn from the TitleCache instead.
+
+    Attributes:
+        pictures (dict): The recorded pictures, keyed by the object id.
+        scale_factor (float): The zoom level the pictures were recorded at.
+    """
+
+    def __init__(self):
+        """
+        Initializes the OverlayCache.
+        """
+        self.pictures = {}
+        self.scale_factor = None
+
+    def set_scale_factor(self, scale_factor):
+        """
+        Set the zoom level of the overlay. Every picture is dropped when the zoom level changes.
+
+        Args:
+            scale_factor (float): The current zoom level of the canvas.
+        """
+        if scale_factor != self.scale_factor:
+            self.pictures.clear()
+            self.scale_factor = scale_factor
+
+    def picture(self, object_id, render):
+        """
+        Get the recorded picture of an object, recording it first if needed.
+
+        Args:
+            object_id (int): The id of the object.
+            render (callable): Called with a QPainter to draw the object when it is not cached.
+
+        Returns:
+            QPicture: The recorded picture of the object.
+        """
+        picture = self.pictures.get(object_id)
+        if picture is None:
+            picture = QPicture()
+            painter = QPainter(picture)
+            render(painter)
+            painter.end()
+            self.pictures[object_id] = picture
+        return picture
+
+    def cached(self, object_id):
+        """
+        Get the recorded picture of an object without recording it.
+
+        Args:
+            object_id (int): The id of the object.
+
+        Returns:
+            QPicture: The recorded picture, None if the object is not cached.
+        """
+        return self.pictures.get(object_id)
+
+    def invalidate(self, object_id):
+        """
+        Drop the picture of an object, it will be recorded again on the next paint.
+
+        Args:
+            object_id (int): The id of the object.
+        """
+        self.pictures.pop(object_id, None)
+
+    def clear(self):
+        """
+        Drop every recorded picture.
+        """
+        self.pictures.clear()
+
+
+class TitleCache:
+    """
+    Label titles laid out once per label and font. Shaping text is the most expensive part
+    of drawing a title and a scene repeats the same few labels on many objects, so every
+    title is drawn from a prepared QStaticText.
+
+    Attributes:
+        texts (dict): The prepared QStaticText, keyed by (label, font key).
+        ascents (dict): The ascent of every font, keyed by font key.
+    """
+
+    def __init__(self):
+        """
+        Initializes the TitleCache.
+        """
+        self.texts = {}
+        self.ascents = {}
+
+    def text(self, label, font):
+        """
+        Get the laid out text of a label, laying it out first if needed.
+
+        Args:
+            label (str): The label.
+            font (QFont): The font of the title.
+
+        Returns:
+            QStaticText: The text, drawn with its top left corner at the given point.
+        """
+        key = (label, font.key())
+        text = self.texts.get(key)
+        if text is None:
+            text = QStaticText(label)
+            text.setTextFormat(Qt.PlainText)
+            text.setPerformanceHint(QStaticText.AggressiveCaching)
+            text.prepare(QTransform(), font)
+            self.texts[key] = text
+        return text
+
+    def ascent(self, font):
+        """
+        Get the distance from the top of a line of text to its baseline.
+
+        Args:
+            font (QFont): The font of the title.
+
+        Returns:
+            int: The ascent of the font in pixels.
+        """
+        key = font.key()
+        if key not in self.ascents:
+            self.ascents[key] = QFontMetrics(font).ascent()
+        return self.ascents[key]
+
+    def clear(self):
+        """
+        Drop every laid out text, e.g. when the label list changes.
+        """
+        self.texts.clear()
+        self.ascents.clear()
+
+
+def screen_polygon(polygon, scale_factor):
+    """
+    Get the outline of a polygon on screen, simplified for drawing. Consecutive vertices
+    landing on the same screen pixel are merged, so a polygon with thousands of vertices
+    covering a few pixels is drawn with a handful of points. The polygon itself is not changed.
+
+    Args:
+        polygon (np.ndarray): The (n, 2) points of the polygon on the original image.
+        scale_factor (float): The current zoom level of the canvas.
+
+    Returns:
+        QPolygon: The outline in screen pixels.
+    """
+    points = (polygon * scale_factor).astype(np.int32)
+    if len(points) > 1:
+        keep = np.ones(len(points), dtype=bool)
+        keep[1:] = np.any(points[1:] != points[:-1], axis=1)
+        points = points[keep]
+        if len(points) > 1 and (points[0] == points[-1]).all():
+            points = points[:-1]
+    return to_qpolygon(points)
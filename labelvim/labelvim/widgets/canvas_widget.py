@@ -5,17 +5,25 @@ from PyQt5.QtWidgets import *
 from PyQt5.QtCore import *
 from PyQt5.QtGui import *
 from PyQt5 import QtWidgets, QtCore
-from labelvim.widgets.label_pupop import LabelPopup
-from labelvim.utils.config import ANNOTATION_MODE, OBJECT_LIST_ACTION, ANNOTATION_TYPE
+from labelvim.widgets.canvas_base import CanvasBase
+from labelvim.widgets.canvas_overlay import OverlayCache
+from labelvim.utils.config import ANNOTATION_MODE, ANNOTATION_TYPE
+from labelvim.utils.spatial_index import SpatialIndex
+from labelvim.utils.annotation_store import to_qpolygon
+from labelvim.utils.edit_journal import (VertexMoved, VertexInserted, Translated, BoxResized,
+                                         CategoryChanged, PolygonAdded, ObjectAdded, ObjectRemoved, GroupCommand,
+                                         ObjectsTranslated, CategoriesChanged, ObjectsRemoved)
+from labelvim.utils.geometry import point_distances, point_segment_distances, polygon_area
 from enum import Enum
+import numpy as np
 
-class CanvasWidget(QLabel):
+class CanvasWidget(CanvasBase, QLabel):
     """A custom QLabel widget to display images and draw rectangles on them."""
     update_label_list_slot_transmitter = pyqtSignal(list) # Signal to update the label list
     update_label_list_slot_receiver = pyqtSignal(list) # Signal to update the label list
     annotation_data_slot_transmitter = pyqtSignal(list) # Signal to transmit the annotation data
     annotation_data_slot_receiver = pyqtSignal(list) # Signal to receive the annotation data
-    object_list_action_slot = pyqtSignal(list, Enum) # Signal to transmit the object list action
+    annotation_changed = pyqtSignal(object) # Signal to transmit the AnnotationChange of every edit of the objects
     object_selection_notification_slot_receiver = pyqtSignal(int) # Signal to receive the object selection notification
     btn_action_slot = pyqtSignal(Enum) # Signal to transmit the button action
     scale_factor_slot = pyqtSignal(float) # Signal to transmit the scale factor
@@ -38,97 +46,99 @@ class CanvasWidget(QLabel):
         self.scroll_area.setFrameShape(QFrame.Box | QFrame.Plain)
         self.scroll_area.setFrameShadow(QFrame.Sunken)
         
-        self.start_point = None
-        self.end_point = None
-        self.polygon_points = []
-        self.polygon_move_point = None
-        self.rectangles = []  # List to store drawn rectangles
-        self.original_pixmap = None
-        self.current_pixmap = None
-        self.brush_color = QColor(0, 0, 255, 50)
-        self.polygon_brush_color = QColor(255, 0, 0, 50)
-        self.pen_color = QColor(0, 255, 255)
-        self.title_pen_color = QColor(0, 255, 255)
-        self.selected_rectangle_brush_color = QColor(255, 0, 255, 50)
-        self.selected_polygon_brush_color = QColor(255, 255, 0, 50)
-        self.selected_object = None  # List to store selected rectangles
-        self.selected_object_subset = None
-        self.selected_vertex = None
-        self.line_segment = None
-        self.moving_object = False
-        self.last_mouse_position = QPoint()  # Store the last mouse position
-        # self.pixmap = None  # To store the loaded pixmap
-        self.label_list = []
+        self.init_canvas_state()
+        self.scale_factor_w, self.scale_factor_h = 1, 1
+        self.overlay_cache = OverlayCache() # Recorded pictures of the objects that are not being edited
+        self.spatial_index = SpatialIndex(polygon_source=self.indexed_polygons) # Grid of object bounding boxes and polygon edges for hit-testing
+        self.group_layer_pixels = 16 * 1024 * 1024 # Larger selections are dragged without a layer
+        self.pending_mouse_pos = None # The latest mouse move that is not applied yet
+        screen = QGuiApplication.primaryScreen()
+        refresh_rate = screen.refreshRate() if screen is not None and screen.refreshRate() > 0 else 60
+        self.mouse_move_timer = QTimer(self)
+        self.mouse_move_timer.setSingleShot(True)
+        self.mouse_move_timer.setInterval(int(1000 / refresh_rate))
+        self.mouse_move_timer.timeout.connect(self.flush_mouse_move)
         self.update_label_list_slot_receiver.connect(self.update_label_list)
         self.annotation_data_slot_receiver.connect(self.update_annotation_from_json)
         self.btn_action_slot.connect(self.set_annotation_mode)
         self.object_selection_notification_slot_receiver.connect(self.select_object)
-        self.scale_factor = 1.0
-        # self.__reset_scale_factor()
-        self.annotation_mode = ANNOTATION_MODE.NONE
-        self.annotation_type = ANNOTATION_TYPE.NONE
-        self.scale_factor_w, self.scale_factor_h = 1, 1
-        self.zoom_in_scale_factor = 1.25
-        self.zoom_out_scale_factor = 0.8
-        self.max_scale_factor = 6
-        self.point_click_radious = 5 # The radious of the point click
 
     def update_annotation_type(self, annotation_type):
         print(f"Annotation Type: {annotation_type}")
         print(f"OLD Annotation Type: {self.annotation_type}")
         self.annotation_type = annotation_type
         print(f"UPDATED Annotation Type: {self.annotation_type}")
+        self.clear_selection()
+        self.overlay_cache.clear()
+        self.update()
+
+    def load_image(self, file_name, image=None, preview=None):
+        """
+        Display an image file. The objects are cleared, the image is fit to the window.
 
-    def load_image(self, file_name):
+        Args:
+            file_name (str): The path of the image file.
+            image (QImage, optional): The image already decoded, read from the image cache when None. Defaults to None.
+            preview (QImage, optional): The image already scaled to fit the window. Defaults to None.
+        """
         self.clear_annotation()
         self.selected_object = None
-        # emit signal to clear the object list
-        self.object_list_action_slot.emit([None], OBJECT_LIST_ACTION.CLEAR)
         self.annotation_mode = ANNOTATION_MODE.NONE
         self.scale_factor = 1.0
-        # print(f"File Name: {file_name}")
-        self.original_pixmap = QPixmap(file_name)
-        self.current_pixmap = self.original_pixmap.copy()
-        scale_factor = self.size_geometry.width() / self.current_pixmap.width()
+        self.open_image(file_name, image, preview)
+        self.display_size = self.image_size
+        scale_factor = self.size_geometry.width() / self.image_size.width()
         self.max_scale_factor = 4 * scale_factor
         self.min_scale_factor = 0.25 * scale_factor
         # print(f"Max Scale Factor: {self.max_scale_factor}, Min Scale Factor: {self.min_scale_factor}")
         self.scale_to_fit(self.size_geometry.size())
         # self.scale_to_fit(self.size_geometry.size())
         self.update()
-    
+
     def scale_to_fit(self, available_size):
-        if self.original_pixmap:
-            self.current_pixmap = self.original_pixmap.scaled(
-                available_size, Qt.KeepAspectRatio, Qt.SmoothTransformation
-            )
-            self.scale_factor = self.current_pixmap.width() / self.original_pixmap.width()
+        if self.image_size:
+            self.display_size = self.image_size.scaled(available_size, Qt.KeepAspectRatio)
+            self.scale_factor = self.display_size.width() / self.image_size.width()
             self.scale_factor_slot.emit(self.scale_factor)
+            self.start_fast_zoom()
             self.adjust_scroll_bars()
         self.update()
-    
 
     def scale_image(self, factor):
-        if self.original_pixmap:
+        if self.image_size:
             if self.scale_factor * factor < self.min_scale_factor or self.scale_factor * factor > self.max_scale_factor:
                 return
                 
             self.scale_factor *= factor
             self.scale_factor_slot.emit(self.scale_factor)
-            new_size = self.scale_factor * self.original_pixmap.size()
-            self.current_pixmap = self.original_pixmap.scaled(new_size, Qt.KeepAspectRatio, Qt.SmoothTransformation)
+            self.display_size = self.image_size * self.scale_factor
+            self.start_fast_zoom()
             self.adjust_scroll_bars()
 
+    def smooth_zoom(self):
+        """
+        Repaint the image with smooth filtering once the zoom is idle.
+        """
+        self.fast_zoom = False
+        self.update()
+
     def adjust_scroll_bars(self):
-        if self.current_pixmap:
-            self.setFixedSize(self.current_pixmap.size())
+        if self.display_size:
+            self.setFixedSize(self.display_size)
     
     def reset(self):
         self.clear_annotation()
         self.annotation_mode = ANNOTATION_MODE.NONE
         self.scale_factor = 1.0
-        self.current_pixmap = None
+        self.display_size = None
+        self.image_size = None
         self.original_pixmap = None
+        self.image_pyramid = None
+        self.image_loader = None
+        self.preview_loader = None
+        self.pyramid_builder = None
+        self.load_generation.next()
+        self.release_tile_source()
         self.update()
 
     def clear_annotation(self):
@@ -137,7 +147,11 @@ class CanvasWidget(QLabel):
         self.end_point = None
         self.polygon_points.clear()
         self.polygon_move_point = None
-        self.rectangles.clear()
+        self.clear_selection()
+        self.annotations.clear()
+        self.edit_journal.clear()
+        self.overlay_cache.clear()
+        self.rebuild_spatial_index()
         self.update()
     
     def zoom_in(self):
@@ -157,14 +171,103 @@ class CanvasWidget(QLabel):
             self.zoom_in()
         else:
             self.zoom_out()
-    
+
+    ## Start of repaint scheduling
+
+    def image_offset(self):
+        """
+        Get the offset of the displayed image inside the widget.
+
+        Returns:
+
+                tuple: The (x, y) offset of the displayed image.
+        """
+        if self.display_size is None:
+            return 0, 0
+        offset_x = (self.width() - self.display_size.width()) // 2
+        offset_y = (self.height() - self.display_size.height()) // 2
+        return offset_x, offset_y
+
+    def image_rect_to_widget(self, rect):
+        """
+        Map a rectangle on the original image to the widget coordinates.
+
+        Args:
+
+            rect (QRect): The rectangle on the original image.
+
+        Returns:
+
+                QRect: The rectangle in widget coordinates.
+        """
+        offset_x, offset_y = self.image_offset()
+        return QRect(offset_x + int(rect.x() * self.scale_factor), offset_y + int(rect.y() * self.scale_factor),
+                     int(rect.width() * self.scale_factor) + 1, int(rect.height() * self.scale_factor) + 1)
+
+    def widget_rect_to_image(self, rect):
+        """
+        Map a rectangle in the widget coordinates to the original image.
+
+        Args:
+
+            rect (QRect): The rectangle in widget coordinates.
+
+        Returns:
+
+                tuple: The (x0, y0, x1, y1) rectangle on the original image.
+        """
+        offset_x, offset_y = self.image_offset()
+        return ((rect.left() - offset_x) / self.scale_factor, (rect.top() - offset_y) / self.scale_factor,
+                (rect.right() + 1 - offset_x) / self.scale_factor, (rect.bottom() + 1 - offset_y) / self.scale_factor)
+
+    def invalidate_image_rect(self, rect):
+        """
+        Schedule a repaint of a rectangle given on the original image. The rectangle is grown by
+        the size of the vertex handles and the label title so that nothing drawn around it is left behind.
+
+        Args:
+            rect (QRect): The dirty rectangle on the original image.
+        """
+        if rect is None or rect.isNull() or self.display_size is None:
+            return
+        left, top, right, bottom = self.overlay_margins()
+        self.update(self.image_rect_to_widget(rect).adjusted(-left, -top, right, bottom))
+
+    def invalidate_image(self, rect=None):
+        """
+        Schedule a repaint of an area of the image, e.g. when a tile or a pyramid level arrived.
+
+        Args:
+            rect (QRect, optional): The area on the original image, the whole widget when None.
+        """
+        if rect is None:
+            self.update()
+        else:
+            self.invalidate_image_rect(rect)
+
+    def invalidate_object(self, object_id):
+        """
+        Schedule a repaint of the area covered by an object.
+
+        Args:
+            object_id (int): The id of the object.
+        """
+        rectangle = self.annotations.get(object_id)
+        if rectangle is not None:
+            self.invalidate_image_rect(self.object_image_rect(rectangle))
+
     ## Start of mouse events
 
     def mousePressEvent(self, event):
-        if self.original_pixmap:
+        self.flush_mouse_move()
+        dirty_rect = self.interaction_image_rect()
+        if self.image_size:
             click_pos = event.pos()
             if event.button() == Qt.LeftButton:
-                if self.annotation_type == ANNOTATION_TYPE.BBOX:
+                if self.annotation_mode == ANNOTATION_MODE.EDIT and self.start_group_move(click_pos):
+                    # a press on the rubber band selection drags all of its objects
+                    pass
+                elif self.annotation_type == ANNOTATION_TYPE.BBOX:
                     if self.annotation_mode == ANNOTATION_MODE.CREATE:
                         start_point = self.map_to_original_image(click_pos)
                         if start_point:
@@ -220,12 +323,48 @@ class CanvasWidget(QLabel):
                         # self.selected_object = self.select_polygon(new_map)
                         # if self.selected_object is not None:
                         #     self.polygon_move_point = new_map
-        self.update()
+                if self.annotation_mode == ANNOTATION_MODE.EDIT and not self.moving_group:
+                    if self.selected_object is None and self.selected_vertex is None and self.line_segment is None:
+                        # a press beside every object starts a rubber band
+                        self.start_rubber_band(click_pos)
+                    else:
+                        self.clear_selection()
+        self.invalidate_image_rect(dirty_rect.united(self.interaction_image_rect()))
 
     def mouseMoveEvent(self, event):
-        if self.original_pixmap:
-            click_pos = event.pos()
-            if self.annotation_type == ANNOTATION_TYPE.BBOX:
+        # mouse moves are applied once per display refresh, only the latest position is kept
+        self.pending_mouse_pos = event.pos()
+        if not self.mouse_move_timer.isActive():
+            self.mouse_move_timer.start()
+
+    def flush_mouse_move(self):
+        """
+        Apply the latest mouse position received since the last display refresh.
+        """
+        self.mouse_move_timer.stop()
+        if self.pending_mouse_pos is not None:
+            click_pos, self.pending_mouse_pos = self.pending_mouse_pos, None
+            self.apply_mouse_move(click_pos)
+
+    def apply_mouse_move(self, click_pos):
+        """
+        Update the object being drawn or edited for a mouse position. Only the union of the
+        old and new area of the interaction is repainted.
+
+        Args:
+            click_pos (QPoint): The mouse position in widget coordinates.
+        """
+        dirty_rect = self.interaction_image_rect()
+        if self.image_size:
+            if self.band_start is not None:
+                band_end = self.map_to_original_image(click_pos)
+                if band_end:
+                    self.band_end = band_end
+            elif self.moving_group:
+                new_pos = self.map_to_original_image(click_pos)
+                if new_pos:
+                    self.move_selected_objects(new_pos)
+            elif self.annotation_type == ANNOTATION_TYPE.BBOX:
                 if self.start_point and self.annotation_mode == ANNOTATION_MODE.CREATE:
                     end_point = self.map_to_original_image(click_pos)
                     if end_point:
@@ -262,10 +401,18 @@ class CanvasWidget(QLabel):
                         if new_map:
                             self.move_polygon(new_map)
                             self.last_mouse_position = new_map
-        self.update()
+        self.invalidate_image_rect(dirty_rect.united(self.interaction_image_rect()))
     
     def mouseReleaseEvent(self, event):
-        if self.original_pixmap and event.button() == Qt.LeftButton:
+        self.flush_mouse_move()
+        # the steps of the drag are one edit in the undo history
+        self.edit_journal.seal()
+        dirty_rect = self.interaction_image_rect()
+        if self.band_start is not None:
+            self.finish_rubber_band()
+        if self.moving_group:
+            self.finish_group_move()
+        if self.image_size and event.button() == Qt.LeftButton:
             click_pos = event.pos()
             if self.annotation_type == ANNOTATION_TYPE.BBOX:
                 if self.start_point and self.annotation_mode == ANNOTATION_MODE.CREATE:
@@ -285,11 +432,11 @@ class CanvasWidget(QLabel):
                 if self.selected_vertex is not None and self.annotation_mode == ANNOTATION_MODE.EDIT:
                     self.selected_vertex = None
                 elif self.moving_object and self.annotation_mode == ANNOTATION_MODE.EDIT:
-                    self.moving_object = False
+                    self.finish_polygon_move()
                 self.last_mouse_position = None
         self.selected_object = None
         self.selected_object_subset = None
-        self.update()
+        self.invalidate_image_rect(dirty_rect.united(self.interaction_image_rect()))
     
     # def keyPressEvent(self, event):
     #     # Capture the key press event and display the key information
@@ -315,83 +462,150 @@ class CanvasWidget(QLabel):
     def paintEvent(self, event):
         super().paintEvent(event)
         # print("self.rectangles: ", self.rectangles)
-        if self.current_pixmap:
+        if self.display_size:
             painter = QPainter(self)
-            offset_x = (self.width() - self.current_pixmap.width()) // 2
-            offset_y = (self.height() - self.current_pixmap.height()) // 2
-            painter.drawPixmap(offset_x, offset_y, self.current_pixmap)
-            # print(f"offset_x: {offset_x}, offset_y: {offset_y}")
-            painter.setPen(QPen(self.pen_color, 2, Qt.SolidLine))
-            painter.setBrush(QBrush(self.brush_color))
+            # only the exposed part of the widget that is visible in the scroll area is painted
+            exposed_rect = event.rect().intersected(self.visibleRegion().boundingRect())
+            if exposed_rect.isEmpty():
+                return
+            painter.setClipRect(exposed_rect)
+            offset_x, offset_y = self.image_offset()
+            # the zoom is applied while painting, only the source pixels behind the exposed rect are resampled
+            target_rect = exposed_rect.intersected(QRect(QPoint(offset_x, offset_y), self.display_size))
+            if not target_rect.isEmpty() and self.tile_source is not None:
+                painter.save()
+                painter.translate(offset_x, offset_y)
+                painter.scale(self.scale_factor, self.scale_factor)
+                # the tiles of the whole visible area keep loading when only a part of it is repainted
+                view_rect = self.widget_rect_to_image(self.visibleRegion().boundingRect())
+                self.tile_source.draw(painter, *self.widget_rect_to_image(target_rect), self.scale_factor, not self.fast_zoom,
+                                      view_rect)
+                painter.restore()
+            elif not target_rect.isEmpty() and self.image_pyramid is None:
+                painter.fillRect(target_rect, self.placeholder_color)
+            elif not target_rect.isEmpty():
+                # the source pixels are taken from the pyramid level closest to the screen resolution
+                pixmap, (level_x, level_y) = self.image_pyramid.level_for_scale(self.scale_factor)
+                scale_x, scale_y = level_x / self.scale_factor, level_y / self.scale_factor
+                source_rect = QRectF(target_rect.translated(-offset_x, -offset_y))
+                source_rect = QRectF(source_rect.x() * scale_x, source_rect.y() * scale_y,
+                                     source_rect.width() * scale_x, source_rect.height() * scale_y)
+                painter.setRenderHint(QPainter.SmoothPixmapTransform, not self.fast_zoom)
+                painter.drawPixmap(QRectF(target_rect), pixmap, source_rect)
+                painter.setRenderHint(QPainter.SmoothPixmapTransform, False)
+            # annotations are drawn relative to the top left corner of the displayed image
+            painter.translate(offset_x, offset_y)
+            self.overlay_cache.set_scale_factor(self.scale_factor)
             # print(f"Annotation Type: {self.annotation_type}")
-            if self.annotation_type == ANNOTATION_TYPE.BBOX:
-                # print(f"self.rectangles: {self.rectangles}")
-                if self.start_point and self.end_point:
-                    # painter.setPen(QPen(QColor(0, 0, 255), 2, Qt.SolidLine))
-                    
-                    start_point = QPoint(offset_x+int(self.start_point.x() * self.scale_factor), offset_y+int(self.start_point.y() * self.scale_factor))
-                    end_point = QPoint(offset_x+int(self.end_point.x() * self.scale_factor), offset_y+int(self.end_point.y() * self.scale_factor))
-                    rect = QRect(start_point, end_point).normalized()
-                    painter.drawEllipse(rect.topLeft(), 5, 5)
-                    painter.drawEllipse(rect.topRight(), 5, 5)
-                    painter.drawEllipse(rect.bottomLeft(), 5, 5)
-                    painter.drawEllipse(rect.bottomRight(), 5, 5)
-                    painter.drawRect(rect)
-                for rectangle in self.rectangles:
-                    rect, index = rectangle['bbox'], rectangle["category_id"]
-                    painter.setPen(QPen(self.pen_color, 2, Qt.SolidLine))
-                    painter.setBrush(QBrush(self.brush_color))
-                    if self.selected_object is not None and self.selected_object == rectangle["id"]:
-                        painter.setBrush(QBrush(self.selected_rectangle_brush_color))
-                    rect = QRect(offset_x+int(rect[0] * self.scale_factor), offset_y+int(rect[1] * self.scale_factor), int(rect[2] * self.scale_factor), int(rect[3] * self.scale_factor))
-                    text_label = self.label_list[index]
-                    painter.drawEllipse(rect.topLeft(), 5, 5)
-                    painter.drawEllipse(rect.topRight(), 5, 5)
-                    painter.drawEllipse(rect.bottomLeft(), 5, 5)
-                    painter.drawEllipse(rect.bottomRight(), 5, 5)
-                    painter.drawRect(rect)
-                    painter.setPen(QPen(self.title_pen_color, 2, Qt.SolidLine))
-                    painter.setBrush(QBrush(QColor(255, 255, 255, 75)))
-                    painter.drawRect(rect.topLeft().x(), rect.topLeft().y() - 20, rect.width(), 20)
-                    painter.setPen(QPen(QColor(0,0,0), 2, Qt.SolidLine))
-                    painter.drawText(rect.topLeft().x(), rect.topLeft().y() - 5, text_label)
-            elif self.annotation_type == ANNOTATION_TYPE.POLYGON:
-                # print(f"self.rectangles: {self.rectangles}")
-                if self.polygon_points:
-                    polygon_points = [QPoint(offset_x+int(point.x() * self.scale_factor), offset_y+int(point.y() * self.scale_factor)) for point in self.polygon_points]
-                    polgon = QPolygon(polygon_points)
-                    painter.setPen(QPen(self.pen_color, 2, Qt.SolidLine))
-                    painter.setBrush(QBrush(self.polygon_brush_color))
-                    painter.drawPolygon(polgon)
-                    for point in polygon_points:
-                        painter.drawEllipse(point, 5, 5)
-                for rectangle in self.rectangles:
-                    rect, index, polgons = rectangle['bbox'], rectangle["category_id"], rectangle["polygon"]
-                    # print(f"Polygon: {polgon}")
-                    painter.setPen(QPen(self.pen_color, 2, Qt.SolidLine))
-                    painter.setBrush(QBrush(self.brush_color))
+            self.draw_interaction(painter)
+            if self.annotation_type in (ANNOTATION_TYPE.BBOX, ANNOTATION_TYPE.POLYGON):
+                # objects drawn into the exposed rect may have their bounding box outside of it
+                left, top, right, bottom = self.overlay_margins()
+                x0, y0, x1, y1 = self.widget_rect_to_image(exposed_rect.adjusted(-right, -bottom, left, top))
+                visible = [self.annotations.get(object_id) for object_id in self.spatial_index.objects_in_rect(x0, y0, x1, y1)]
+                if self.group_offset:
+                    # the index is not updated while the selection is dragged, it is drawn on its own
+                    dragged = set(self.selected_objects)
+                    visible = [rectangle for rectangle in visible if rectangle is not None and rectangle["id"] not in dragged]
+                for rectangle in visible:
                     if self.selected_object is not None and self.selected_object == rectangle["id"]:
-                        painter.setBrush(QBrush(self.selected_rectangle_brush_color))
-                    rect = QRect(offset_x+int(rect[0] * self.scale_factor), offset_y+int(rect[1] * self.scale_factor), int(rect[2] * self.scale_factor), int(rect[3] * self.scale_factor))
-                    painter.drawRect(rect)
-                    painter.setPen(QPen(self.pen_color, 2, Qt.SolidLine))
-                    painter.setBrush(QBrush(self.polygon_brush_color))
-                    if self.selected_object is not None and self.selected_object == rectangle["id"]:
-                        painter.setBrush(QBrush(self.selected_polygon_brush_color))
-                    for polgon in polgons: # modified as per polygon list
-                        # print(f"Polygon: {polgon}")
-                        painter.drawPolygon(QPolygon([QPoint(offset_x+int(point.x() * self.scale_factor), offset_y+int(point.y() * self.scale_factor)) for point in polgon]))
-                        for point in polgon:
-                            painter.drawEllipse(QPoint(offset_x+int(point.x() * self.scale_factor), offset_y+int(point.y() * self.scale_factor)), 5, 5)
-                    text_label = self.label_list[index]
-                    painter.setPen(QPen(self.title_pen_color, 2, Qt.SolidLine))
-                    painter.setBrush(QBrush(QColor(255, 255, 255, 75)))
-                    painter.drawRect(rect.topLeft().x(), rect.topLeft().y() - 20, rect.width(), 20)
-                    painter.setPen(QPen(QColor(0,0,0), 2, Qt.SolidLine))
-                    painter.drawText(rect.topLeft().x(), rect.topLeft().y() - 5, text_label)
-                    
-        self.update()
-    
+                        # the object being edited is drawn live
+                        self.draw_object(painter, rectangle, selected=True)
+                    else:
+                        painter.drawPicture(0, 0, self.overlay_cache.picture(rectangle["id"], lambda cache_painter: self.draw_object(cache_painter, rectangle)))
+                # the titles are drawn over the objects from the laid out label texts
+                painter.setFont(self.font())
+                for rectangle in visible:
+                    self.draw_title(painter, rectangle)
+                if self.group_offset:
+                    self.draw_dragged_selection(painter)
+
+    def render_group_layer(self):
+        """
+        Draw the selection once into a pixmap, moved with the mouse while the selection is dragged
+        instead of drawing every object of the selection on every frame.
+
+        Returns:
+            tuple: The QPixmap of the layer and the QPoint of its top left corner relative to the
+                displayed image, None if the selection is too large on screen.
+        """
+        left, top, right, bottom = self.overlay_margins()
+        rect = self.selection_rect
+        area = QRect(int(rect.x() * self.scale_factor) - left, int(rect.y() * self.scale_factor) - top,
+                     int(rect.width() * self.scale_factor) + left + right + 1, int(rect.height() * self.scale_factor) + top + bottom + 1)
+        if area.isEmpty() or area.width() * area.height() > self.group_layer_pixels:
+            return None
+        layer = QPixmap(area.size())
+        layer.fill(Qt.transparent)
+        painter = QPainter(layer)
+        painter.translate(-area.x(), -area.y())
+        self.draw_selection(painter)
+        records = self.selected_records()
+        self.overlay_cache.set_scale_factor(self.scale_factor)
+        for rectangle in records:
+            painter.drawPicture(0, 0, self.overlay_cache.picture(rectangle["id"], lambda cache_painter: self.draw_object(cache_painter, rectangle)))
+        painter.setFont(self.font())
+        for rectangle in records:
+            self.draw_title(painter, rectangle)
+        painter.end()
+        return layer, area.topLeft()
+
+    def draw_dragged_selection(self, painter):
+        """
+        Draw the selection being dragged, from its layer or from the pictures recorded before the drag.
+
+        Args:
+            painter (QPainter): The painter to draw with.
+        """
+        shift_x = int(self.group_offset[0] * self.scale_factor)
+        shift_y = int(self.group_offset[1] * self.scale_factor)
+        if self.group_layer is not None:
+            layer, origin = self.group_layer
+            painter.drawPixmap(origin.x() + shift_x, origin.y() + shift_y, layer)
+            return
+        records = self.selected_records()
+        for rectangle in records:
+            picture = self.overlay_cache.cached(rectangle["id"])
+            if picture is None:
+                self.draw_object(painter, rectangle)
+            else:
+                painter.drawPicture(shift_x, shift_y, picture)
+        # the objects are already moved in the store, their titles are drawn at their new place
+        for rectangle in records:
+            self.draw_title(painter, rectangle)
+
+    ## Start of spatial index
+
+    def indexed_polygons(self, object_id):
+        """
+        Get the polygons of an object as the (x, y) points used by the spatial index.
+
+        Args:
+            object_id (int): The id of the object.
+
+        Returns:
+            list: The [x, y] points of every polygon of the object.
+        """
+        return [polygon.tolist() for polygon in self.annotations.polygons(self.annotations.get(object_id))]
+
+    def index_object(self, rectangle):
+        """
+        Add an object to the spatial index, or re-index it after it changed. The polygon
+        edges are indexed the first time a hit-test reaches the object.
+
+        Args:
+            rectangle (AnnotationRecord): The object.
+        """
+        self.spatial_index.insert_object(rectangle['id'], rectangle['bbox'])
+
+    def rebuild_spatial_index(self):
+        """
+        Rebuild the spatial index from all the objects.
+        """
+        self.spatial_index.clear()
+        for rectangle in self.annotations:
+            self.index_object(rectangle)
+
     def update_rectangle(self, **kwargs): # need to rename later
         bbox = kwargs.get('bbox')
         poly = kwargs.get('poly')
@@ -401,9 +615,10 @@ class CanvasWidget(QLabel):
             if label_selected:
                 try:
                     index = self.label_list.index(label_selected)
-                    self.rectangles.append({"category_id": index, "bbox": [bbox.x(), bbox.y(), bbox.width(), bbox.height()], "id": len(self.rectangles), "polygon": []})
-                    # emit signal to add object to the object list
-                    self.object_list_action_slot.emit([self.rectangles[-1]], OBJECT_LIST_ACTION.ADD)
+                    rectangle = self.annotations.add(index, [bbox.x(), bbox.y(), bbox.width(), bbox.height()])
+                    self.edit_journal.record(ObjectAdded(self.annotations, rectangle))
+                    self.index_object(rectangle)
+                    self.invalidate_image_rect(self.object_image_rect(rectangle))
                 except ValueError:
                     print("Label not found in the label list")
         if poly:
@@ -418,53 +633,27 @@ class CanvasWidget(QLabel):
                         # print(f"Polygon: {polygon}")
                         bbox = polygon.boundingRect()
                         # print(f"Bounding Box: {bbox}")
-                        self.rectangles.append({"category_id": index, "bbox": [bbox.x(), bbox.y(), bbox.width(), bbox.height()], "id": len(self.rectangles), "polygon": [poly.copy()]})
-                        # emit signal to add object to the object list
-                        self.object_list_action_slot.emit([self.rectangles[-1]], OBJECT_LIST_ACTION.ADD)
+                        rectangle = self.annotations.add(index, [bbox.x(), bbox.y(), bbox.width(), bbox.height()],
+                                                         [[(point.x(), point.y()) for point in poly]])
+                        self.edit_journal.record(ObjectAdded(self.annotations, rectangle))
+                        self.index_object(rectangle)
+                        self.invalidate_image_rect(self.object_image_rect(rectangle))
                     else:
                         # print(f"Selected ID: {selected_id}")
                         # print(f"rectangles: {self.rectangles[selected_id]}")
-                        rectanlge = self.rectangles[selected_id]
-                        bbox_c = rectanlge["bbox"]
-                        # print(f"Bounding Box: {bbox_c}")
-                        bbox = QRect(bbox_c[0], bbox_c[1], bbox_c[2], bbox_c[3])
-                        # poly_prev = self.rectangles[selected_id]["polygon"]
-                        self.rectangles[selected_id]["polygon"].append(poly.copy())
-                        # print(f"Polygons: {len(self.rectangles[selected_id]['polygon'])}")
-                        # print(f"Polygons: {self.rectangles[selected_id]['polygon']}")
-                        polygon = QPolygon(poly.copy())
-                        bbox_1 = polygon.boundingRect()
-                        bbox = bbox.united(bbox_1)
-                        self.rectangles[selected_id]["bbox"] = [bbox.x(), bbox.y(), bbox.width(), bbox.height()]
+                        rectanlge = self.annotations.get(selected_id)
+                        points = [(point.x(), point.y()) for point in poly]
+                        old_bbox = list(rectanlge['bbox'])
+                        self.annotations.add_polygon(rectanlge, points)
+                        # the bbox is united from the bounds kept for every polygon of the object
+                        self.annotations.update_bbox(rectanlge)
+                        self.edit_journal.record(PolygonAdded(selected_id, old_bbox, len(rectanlge.spans) - 1, points))
+                        self.overlay_cache.invalidate(rectanlge["id"])
+                        self.index_object(rectanlge)
+                        self.invalidate_image_rect(self.object_image_rect(rectanlge))
 
                 except ValueError:
                     print("Label not found in the label list")
-    @staticmethod
-    def distance(p1, p2):
-        """
-        Calculate the distance between two points.
-        
-        Args:
-        
-            p1 (QPoint): The first point.
-            p2 (QPoint): The second point.
-            
-            Returns:
-            
-                float: The distance between the two points.
-                
-        """
-        return ((p1.x() - p2.x())**2 + (p1.y() - p2.y())**2)**0.5
-    
-    @staticmethod
-    def distance_to_line_segment(p, v, w):
-        """Calculate the distance from point p to the line segment vw."""
-        l2 = CanvasWidget.distance(v, w) ** 2
-        if l2 == 0.0:
-            return CanvasWidget.distance(p, v)
-        t = max(0, min(1, ((p.x() - v.x()) * (w.x() - v.x()) + (p.y() - v.y()) * (w.y() - v.y())) / l2))
-        projection = QPoint(int(v.x() + t * (w.x() - v.x())), int(v.y() + t * (w.y() - v.y())))
-        return CanvasWidget.distance(p, projection)
 
     def map_to_original_image(self, pos):
         """
@@ -478,9 +667,8 @@ class CanvasWidget(QLabel):
             
                 QPoint: The position on the original image.
         """
-        displayed_image_size = self.current_pixmap.size()
-        offset_x = (self.width() - self.current_pixmap.width()) // 2
-        offset_y = (self.height() - self.current_pixmap.height()) // 2
+        displayed_image_size = self.display_size
+        offset_x, offset_y = self.image_offset()
         relative_x = pos.x() - offset_x
         relative_y = pos.y() - offset_y
         if 0 <= relative_x < displayed_image_size.width() and 0 <= relative_y < displayed_image_size.height():
@@ -503,8 +691,9 @@ class CanvasWidget(QLabel):
         # Map the click position to the original image coordinates
         # mapped_pos = self.map_to_original_image(pos)
 
-        # Iterate through all rectangles to find the ones containing the point
-        for rect in self.rectangles:
+        # Iterate through the rectangles around the point to find the ones containing it
+        for object_id in self.spatial_index.objects_at(pos.x(), pos.y()):
+            rect = self.annotations.get(object_id)
             rect_obj = QRect(rect["bbox"][0], rect["bbox"][1], rect["bbox"][2], rect["bbox"][3])
             if rect_obj.contains(pos):
                 selected_rectangles.append(rect)
@@ -518,84 +707,60 @@ class CanvasWidget(QLabel):
             )
             self.selected_object = closest_rect["id"]
 
-    @staticmethod
-    def distance_to_center(pos, bbox):
-        """
-        Calculate the distance from a point to the center of a bounding box.
-        
-        Args:
-            pos (QPoint): The position point.
-            bbox (list): The bounding box coordinates [x, y, width, height].
-            
-        Returns:
-            float: The distance from the point to the center of the bounding box.
-        """
-        center_x = bbox[0] + bbox[2] / 2
-        center_y = bbox[1] + bbox[3] / 2
-        return (pos.x() - center_x) ** 2 + (pos.y() - center_y) ** 2
-    
     def find_object_to_edit(self, click_pos):
-        # Iterate from top to bottom (reverse order) to find the topmost object
-        for rectangle in reversed(self.rectangles):
+        mapped_pos = self.map_to_original_image(click_pos)
+        if mapped_pos is None:
+            return None, None
+        # Iterate from top to bottom over the objects near the click to find the topmost one
+        for object_id in self.spatial_index.objects_at(mapped_pos.x(), mapped_pos.y(), 20):
+            rectangle = self.annotations.get(object_id)
             rect = rectangle['bbox']
             vertices = [QPoint(rect[0], rect[1]),  # top-left
                         QPoint(rect[0] + rect[2], rect[1]),  # top-right
                         QPoint(rect[0], rect[1] + rect[3]),  # bottom-left
                         QPoint(rect[0] + rect[2], rect[1] + rect[3])]  # bottom-right
-            mapped_pos = self.map_to_original_image(click_pos)
             for i, vertex in enumerate(vertices):
                 # scaled_vertex = self.scale_point(vertex)
                 if self.distance(vertex, mapped_pos) <= 20:
                     return rectangle['id'], i
         return None, None
 
-
-    def get_selected_object(self):
-        """
-        Get the selected rectangle.
-        
-        Returns:
-        
-            dict: The selected rectangle.
-        """
-        for rect in self.rectangles:
-            if rect["id"] == self.selected_object:
-                return rect
-        return None
-    
     def move_vertex(self, vertex_index, new_pos):
         if self.selected_object is not None:
-            for rectangle in self.rectangles:
-                if rectangle['id'] == self.selected_object:
-                    rect = rectangle['bbox']
-                    if vertex_index == 0:
-                        delta_w = rect[0] - new_pos.x()
-                        delta_h = rect[1] - new_pos.y()
-                        rect[0] = new_pos.x()
-                        rect[1] = new_pos.y()
-                        rect[2] = rect[2] + delta_w
-                        rect[3] = rect[3] + delta_h
-                    elif vertex_index == 1:
-                        delta_w = new_pos.x() - (rect[0] + rect[2])
-                        delta_h = rect[1] - new_pos.y()
-                        rect[1] = new_pos.y()
-                        rect[2] = rect[2] + delta_w
-                        rect[3] = rect[3] + delta_h
-                        # rect[2] = new_pos.x() - rect[0]
-                        # rect[1] = new_pos.y()
-                    elif vertex_index == 2:
-                        delta_w = rect[0] - new_pos.x()
-                        delta_h = new_pos.y() - (rect[1] + rect[3])
-                        rect[0] = new_pos.x()
-                        rect[2] = rect[2] + delta_w
-                        rect[3] = rect[3] + delta_h
-                    elif vertex_index == 3:
-                        delta_w = new_pos.x() - (rect[0] + rect[2])
-                        delta_h = new_pos.y() - (rect[1] + rect[3])
-                        rect[2] = rect[2] + delta_w
-                        rect[3] = rect[3] + delta_h
-                    break
-
+            rectangle = self.get_selected_object()
+            if rectangle is not None:
+                rect = rectangle['bbox']
+                old_rect = list(rect)
+                if vertex_index == 0:
+                    delta_w = rect[0] - new_pos.x()
+                    delta_h = rect[1] - new_pos.y()
+                    rect[0] = new_pos.x()
+                    rect[1] = new_pos.y()
+                    rect[2] = rect[2] + delta_w
+                    rect[3] = rect[3] + delta_h
+                elif vertex_index == 1:
+                    delta_w = new_pos.x() - (rect[0] + rect[2])
+                    delta_h = rect[1] - new_pos.y()
+                    rect[1] = new_pos.y()
+                    rect[2] = rect[2] + delta_w
+                    rect[3] = rect[3] + delta_h
+                    # rect[2] = new_pos.x() - rect[0]
+                    # rect[1] = new_pos.y()
+                elif vertex_index == 2:
+                    delta_w = rect[0] - new_pos.x()
+                    delta_h = new_pos.y() - (rect[1] + rect[3])
+                    rect[0] = new_pos.x()
+                    rect[2] = rect[2] + delta_w
+                    rect[3] = rect[3] + delta_h
+                elif vertex_index == 3:
+                    delta_w = new_pos.x() - (rect[0] + rect[2])
+                    delta_h = new_pos.y() - (rect[1] + rect[3])
+                    rect[2] = rect[2] + delta_w
+                    rect[3] = rect[3] + delta_h
+                self.annotations.geometry_changed(rectangle)
+                self.edit_journal.record(BoxResized(rectangle['id'], old_rect, rect))
+                self.overlay_cache.invalidate(rectangle['id'])
+                self.spatial_index.update_bbox(rectangle['id'], rect)
 
     def move_rectangle(self, new_pos):
         if self.selected_object is not None:
@@ -603,77 +768,80 @@ class CanvasWidget(QLabel):
             if rect is not None:
                 dx = new_pos.x() - self.last_mouse_position.x()
                 dy = new_pos.y() - self.last_mouse_position.y()
+                old_bbox = list(rect["bbox"])
                 rect["bbox"][0] += int(dx)
                 rect["bbox"][1] += int(dy)
-                
-    
-    
+                self.annotations.geometry_changed(rect)
+                self.edit_journal.record(Translated(rect["id"], old_bbox, None, int(dx), int(dy)))
+                self.overlay_cache.invalidate(rect["id"])
+                self.spatial_index.update_bbox(rect["id"], rect["bbox"])
+
     def select_polygon(self, pos):
         selected_polygon = []
         selected_polygon_id = []
         selected_polygon_id_subset = []
-        for polygons in self.rectangles:
-            for poly_idx, polygon in enumerate(polygons['polygon']):
-                poly = polygon.copy()
-                # polygon_points = [QPoint(point.x(), point.y()) for point in poly]
-                # polygon_points = [QPoint(point[0] * self.scale_factor, point[1] * self.scale_factor) for point in polygon_points]
-                polygon_obj = QPolygon(poly)
+        if pos is None:
+            return
+        # only the objects whose bounding box contains the point can contain it
+        for object_id in reversed(self.spatial_index.objects_at(pos.x(), pos.y())):
+            polygons = self.annotations.get(object_id)
+            for poly_idx, polygon in enumerate(self.annotations.polygons(polygons)):
+                polygon_obj = to_qpolygon(polygon)
                 if polygon_obj.containsPoint(pos, Qt.OddEvenFill):
                     selected_polygon.append(polygon)
                     selected_polygon_id.append(polygons['id'])
                     selected_polygon_id_subset.append(poly_idx)
         if selected_polygon:
-            closest_polygon = min(selected_polygon, key=lambda polygon: self.calculate_polygon_area(polygon))
-            self.selected_object = selected_polygon_id[selected_polygon.index(closest_polygon)]
-            self.selected_object_subset = selected_polygon_id_subset[selected_polygon.index(closest_polygon)]
+            closest_polygon = min(range(len(selected_polygon)), key=lambda index: polygon_area(selected_polygon[index]))
+            self.selected_object = selected_polygon_id[closest_polygon]
+            self.selected_object_subset = selected_polygon_id_subset[closest_polygon]
             
             # print(f"Selected Polygon: {selected_polygon}")
             # closest_polygon = min(selected_polygon, key=lambda polygon: self.calculate_polygon_area(polygon))
             # print(f"Selected Polygon: {closest_polygon}")
             # print(f"Selected Polygon: {closest_polygon['id']}")
             # self.selected_object = closest_polygon["id"]
-    
-    @staticmethod
-    def calculate_polygon_area(polygon):
-        area = 0
-        # polygon = QPolygon(polygon['polygon'])
-        polygon = QPolygon(polygon)
-        for i in range(polygon.count()):
-            j = (i + 1) % polygon.count()
-            area += polygon.point(i).x() * polygon.point(j).y()
-            area -= polygon.point(j).x() * polygon.point(i).y()
-        return abs(area) / 2
 
     def move_polygon(self, new_pos):
         if self.selected_object is not None:
             poly = self.get_selected_object()
             dx = new_pos.x() - self.last_mouse_position.x()
             dy = new_pos.y() - self.last_mouse_position.y()
-
-            for i, point in enumerate(poly['polygon'][self.selected_object_subset]):
-                poly['polygon'][self.selected_object_subset][i] = QPoint(point.x() + dx, point.y() + dy)
-            for poly_idx, polygon in enumerate(poly['polygon']):
-                if poly_idx == 0:
-                    bbox = QPolygon(polygon).boundingRect()
-                else:
-                    bbox = bbox.united(QPolygon(polygon).boundingRect())
-            # bbox = QPolygon(poly['polygon'][self.selected_object_subset]).boundingRect()
-            poly['bbox'] = [bbox.x(), bbox.y(), bbox.width(), bbox.height()]
+            old_bbox = list(poly['bbox'])
+            self.annotations.translate_polygon(poly, self.selected_object_subset, dx, dy)
+            self.annotations.update_bbox(poly)
+            self.edit_journal.record(Translated(poly['id'], old_bbox, self.selected_object_subset, dx, dy))
+            self.overlay_cache.invalidate(poly['id'])
+            # only the bounding box follows the drag, the edges are indexed again when it ends
+            self.spatial_index.update_bbox(poly['id'], poly['bbox'])
             self.last_mouse_position = new_pos
+
+    def finish_polygon_move(self):
+        """
+        End the drag of a polygon, its edges are indexed once at their new place.
+        """
+        poly = self.get_selected_object()
+        if poly is not None:
+            self.spatial_index.update_polygon(poly['id'], self.selected_object_subset,
+                                              self.annotations.polygon(poly, self.selected_object_subset).tolist(), poly['bbox'])
+        self.moving_object = False
     
     def move_polygon_vertex(self, new_pos):
         if self.selected_object is not None:
             poly = self.get_selected_object()
             if poly is not None:
-                poly['polygon'][self.selected_object_subset][self.selected_vertex] = new_pos
-                
-                for poly_idx, polygon in enumerate(poly['polygon']):
-                    if poly_idx == 0:
-                        bbox = QPolygon(polygon).boundingRect()
-                    else:
-                        bbox = bbox.united(QPolygon(polygon).boundingRect())
-                    # bbox = QPolygon(poly['polygon'][self.selected_object_subset]).boundingRect()
-                    poly['bbox'] = [bbox.x(), bbox.y(), bbox.width(), bbox.height()]
+                old_bbox = list(poly['bbox'])
+                old_point = self.annotations.polygon(poly, self.selected_object_subset)[self.selected_vertex].tolist()
+                self.annotations.set_vertex(poly, self.selected_object_subset, self.selected_vertex, new_pos.x(), new_pos.y())
+                self.annotations.update_bbox(poly)
+                self.edit_journal.record(VertexMoved(poly['id'], old_bbox, self.selected_object_subset, self.selected_vertex,
+                                                     old_point, (new_pos.x(), new_pos.y())))
+                self.overlay_cache.invalidate(poly['id'])
+                polygon = self.annotations.polygon(poly, self.selected_object_subset)
+                previous_point = polygon[self.selected_vertex - 1].tolist()
+                next_point = polygon[(self.selected_vertex + 1) % len(polygon)].tolist()
+                self.spatial_index.update_vertex(poly['id'], self.selected_object_subset, self.selected_vertex,
+                                                 previous_point, (new_pos.x(), new_pos.y()), next_point, poly['bbox'])
                 
                 # bbox = QPolygon(poly['polygon']).boundingRect()
                 # print(f"Bounding Box in mover polygon vertex: {bbox}")
@@ -684,14 +852,13 @@ class CanvasWidget(QLabel):
         if self.selected_object is not None:
             poly = self.get_selected_object()
             if poly is not None:
-                poly['polygon'][self.selected_object_subset].insert(self.line_segment[1], new_pos)
-                for poly_idx, polygon in enumerate(poly['polygon']):
-                    if poly_idx == 0:
-                        bbox = QPolygon(polygon).boundingRect()
-                    else:
-                        bbox = bbox.united(QPolygon(polygon).boundingRect())
-                    # bbox = QPolygon(poly['polygon'][self.selected_object_subset]).boundingRect()
-                    poly['bbox'] = [bbox.x(), bbox.y(), bbox.width(), bbox.height()]
+                old_bbox = list(poly['bbox'])
+                self.annotations.insert_vertex(poly, self.selected_object_subset, self.line_segment[1], new_pos.x(), new_pos.y())
+                self.annotations.update_bbox(poly)
+                self.edit_journal.record(VertexInserted(poly['id'], old_bbox, self.selected_object_subset, self.line_segment[1],
+                                                        (new_pos.x(), new_pos.y())))
+                self.overlay_cache.invalidate(poly['id'])
+                self.spatial_index.update_polygon(poly['id'], self.selected_object_subset, self.annotations.polygon(poly, self.selected_object_subset).tolist(), poly['bbox'])
                 # bbox = QPolygon(poly['polygon']).boundingRect()
                 # poly['bbox'] = [bbox.x(), bbox.y(), bbox.width(), bbox.height()]
     
@@ -704,41 +871,39 @@ class CanvasWidget(QLabel):
     #             poly['bbox'] = [bbox.x(), bbox.y(), bbox.width(), bbox.height()]
     
     def find_polygon_to_edit(self, click_pos):
-        for polygons in reversed(self.rectangles):
-            polygon = polygons['polygon']
-            # polygon_obj = QPolygon(poly)
-            
+        if click_pos is None:
+            return None, None, None, None
+        # Only the edges near the click can hold the vertex or line segment under it.
+        # Candidates come topmost object first, then by polygon and edge index, the
+        # same order the objects were scanned in before the spatial index.
+        candidates = self.spatial_index.edges_near(click_pos.x(), click_pos.y(), 10)
+        groups = {}
+        for object_id, poly_idx, edge_idx in candidates:
+            groups.setdefault((object_id, poly_idx), []).append(edge_idx)
+        click = (click_pos.x(), click_pos.y())
+        for (object_id, poly_idx), edges in groups.items():
+            poly = self.annotations.polygon(self.annotations.get(object_id), poly_idx)
+            count = len(poly)
+            edges = np.array(edges, dtype=np.int64)
             # Check if click_pos is near any vertex of the polygon
-            for poly_idx, poly in enumerate(polygon):
-                for i, point in enumerate(poly):
-                    if CanvasWidget.distance(QPoint(point.x(), point.y()), click_pos) <= 10:
-                        return polygons['id'], poly_idx, i, None
-                
-                # Check if click_pos is on any line segment of the polygon
-                for i, point in enumerate(poly):
-                    v = QPoint(point.x(), point.y())
-                    w = QPoint(poly[(i + 1) % len(poly)].x(), poly[(i + 1) % len(poly)].y())
-                    # print(f"V: {v}, W: {w}")
-                    # print(f"Click Pos: {click_pos}")
-                    if CanvasWidget.distance_to_line_segment(click_pos, v, w) <= 10:
-                        return polygons['id'], poly_idx, None, (i, (i + 1) % len(poly))
+            vertices = np.unique(np.concatenate((edges, (edges + 1) % count)))
+            near = np.flatnonzero(point_distances(click, poly[vertices]) <= 10)
+            if len(near):
+                return object_id, poly_idx, int(vertices[near[0]]), None
+            # Check if click_pos is on any line segment of the polygon
+            near = np.flatnonzero(point_segment_distances(click, poly[edges], poly[(edges + 1) % count]) <= 10)
+            if len(near):
+                i = int(edges[near[0]])
+                return object_id, poly_idx, None, (i, (i + 1) % count)
 
         return None, None, None, None
 
-    def select_label_from_label_list(self):
-        """Generate a label selection popup dialog."""
-        dialog = LabelPopup(self.label_list, self.rectangles, self.annotation_type, self.update_label_list_slot_transmitter, self)
-        if dialog.exec_():
-            selected_label, _, selected_id = dialog.get_selected_item()
-            print(f"label list: {self.label_list}")
-            print(f"Selected Label: {selected_label}")
-            print(f"Selected ID: {selected_id}")
-            return selected_label, selected_id
-        return None, None
-
     def update_label_list(self, label_list):
         self.label_list = label_list
         print(f"Label List: {self.label_list}")
+        self.overlay_cache.clear()
+        self.title_cache.clear()
+        self.update()
     
     def update_annotation_from_json(self, annotation: list):
         """
@@ -755,20 +920,12 @@ class CanvasWidget(QLabel):
             ...     "iscrowd": 0
             ... }]
         """
-        self.rectangles.clear()
-        for anno in annotation:
-            category_id = anno['category_id']
-            id = anno['id']
-            bbox = anno['bbox']
-            poly = anno['segmentation']
-            polygons = []
-            for polygon in poly:
-                polygons.append([QPoint(polygon[i], polygon[i+1]) for i in range(0, len(polygon), 2)])
-            # polygon = QPolygon([QPoint(poly[i], poly[i+1]) for i in range(0, len(poly), 2)])
-            self.rectangles.append({"category_id": category_id, "bbox": bbox, "id": id, "polygon": polygons.copy()})
-        if len(self.rectangles) > 0:
-            self.object_list_action_slot.emit([self.rectangles], OBJECT_LIST_ACTION.UPDATE)
-        print(f"Rectangles: {len(self.rectangles)}")
+        self.overlay_cache.clear()
+        self.clear_selection()
+        self.annotations.load_coco(annotation)
+        self.edit_journal.clear()
+        self.rebuild_spatial_index()
+        print(f"Rectangles: {len(self.annotations)}")
         self.update()
     
     def update_annotation_to_json(self):
@@ -778,34 +935,8 @@ class CanvasWidget(QLabel):
         Returns:
             list: A list of annotations containing the label and rectangle data.
         """
-        annotations = []
-        print(f"to json rectangles: {len(self.rectangles)}")
-        for rect in self.rectangles:
-            category_id = rect['category_id']
-            id = rect['id']
-            x, y, w, h = rect['bbox'][0], rect['bbox'][1], rect['bbox'][2], rect['bbox'][3]
-            area = w * h
-            polygons = []
-            for polygon in rect['polygon']:
-                poly = []
-                for point in polygon:
-                    poly.append(point.x())
-                    poly.append(point.y())
-                polygons.append(poly)
-            # for point in rect['polygon']:
-            #     polygon.append(point.x())
-            #     polygon.append(point.y())
-            segmentation = polygons
-            iscrowd = 0
-            annotations.append({
-                "id": id,
-                "category_id": category_id,
-                "bbox": [x, y, w, h],
-                "area": area,
-                "segmentation": segmentation,
-                "iscrowd": iscrowd
-            })
-        return annotations
+        print(f"to json rectangles: {len(self.annotations)}")
+        return self.annotations.to_coco()
     
     def set_annotation_mode(self, mode):
         """Set the annotation mode."""
@@ -813,20 +944,19 @@ class CanvasWidget(QLabel):
         print(f"Annotation Mode: {self.annotation_mode}")
         if self.annotation_mode == ANNOTATION_MODE.CLEAR:
             self.clear_annotation()
-            # if len(self.rectangles) > 0:
-            self.object_list_action_slot.emit([None], OBJECT_LIST_ACTION.CLEAR)
             self.annotation_mode = ANNOTATION_MODE.NONE
         elif self.annotation_mode == ANNOTATION_MODE.DELETE:
-            if self.selected_object is not None:
-                for idx, rect in enumerate(self.rectangles):
-                    if rect["id"] == self.selected_object:
-                        self.rectangles.pop(idx)
-                        self.selected_object = None
-                        break
-                # update the new object id
-                for idx, rect in enumerate(self.rectangles):
-                    rect["id"] = idx
-                self.object_list_action_slot.emit([self.rectangles], OBJECT_LIST_ACTION.REMOVE)
+            if self.selected_objects:
+                self.delete_selected_objects()
+            elif self.selected_object is not None:
+                rectangle = self.get_selected_object()
+                if rectangle is not None:
+                    # ids are stable, only the removed object leaves the store, the index and the cache
+                    self.invalidate_image_rect(self.object_image_rect(rectangle))
+                    self.edit_journal.record(ObjectRemoved(self.annotations, rectangle))
+                    self.annotations.remove(rectangle['id'])
+                    self.spatial_index.remove_object(rectangle['id'])
+                    self.overlay_cache.invalidate(rectangle['id'])
                 self.selected_object = None
             self.annotation_mode = ANNOTATION_MODE.CREATE
         elif self.annotation_mode == ANNOTATION_MODE.EDIT:
@@ -838,7 +968,213 @@ class CanvasWidget(QLabel):
         self.update()
 
     def select_object(self, object_id):
+        dirty_rect = self.interaction_image_rect()
+        self.clear_selection()
         if object_id == -1:
             self.selected_object = None
         else:
-            self.selected_object = object_id
\ No newline at end of file
+            self.selected_object = object_id
+        self.invalidate_image_rect(dirty_rect.united(self.interaction_image_rect()))
+
+    ## Start of rubber band selection
+
+    def finish_rubber_band(self):
+        """
+        Select the objects lying entirely inside the rubber band, from a range query on the spatial index.
+        """
+        if self.band_end is not None and self.distance(self.band_start, self.band_end) > 2:
+            rect = QRect(self.band_start, self.band_end).normalized()
+            self.selected_objects = self.spatial_index.objects_within(rect.left(), rect.top(), rect.right(), rect.bottom())
+            self.update_selection_rect()
+        self.band_start = None
+        self.band_end = None
+
+    def start_group_move(self, click_pos):
+        """
+        Start dragging the rubber band selection when the press is on one of its objects.
+
+        Args:
+            click_pos (QPoint): The mouse position in widget coordinates.
+
+        Returns:
+            bool: True if the selection is being dragged.
+        """
+        pos = self.map_to_original_image(click_pos)
+        if not self.selected_objects or pos is None:
+            return False
+        selected = set(self.selected_objects)
+        if any(object_id in selected for object_id in self.spatial_index.objects_at(pos.x(), pos.y())):
+            self.moving_group = True
+            self.last_mouse_position = pos
+        return self.moving_group
+
+    def move_selected_objects(self, new_pos):
+        """
+        Move every object of the rubber band selection with one vectorized translation of the store.
+
+        Args:
+            new_pos (QPoint): The mouse position on the original image.
+        """
+        dx = new_pos.x() - self.last_mouse_position.x()
+        dy = new_pos.y() - self.last_mouse_position.y()
+        records = self.selected_records()
+        if (dx or dy) and records:
+            if self.group_offset is None:
+                self.group_layer = self.render_group_layer()
+            self.annotations.translate_objects(records, dx, dy)
+            self.edit_journal.record(ObjectsTranslated([rectangle.id for rectangle in records], dx, dy))
+            # the index and the pictures are updated once, when the drag ends
+            offset_x, offset_y = self.group_offset or (0, 0)
+            self.group_offset = (offset_x + dx, offset_y + dy)
+            self.selection_rect.translate(dx, dy)
+        self.last_mouse_position = new_pos
+
+    def finish_group_move(self):
+        """
+        End the drag of the selection, the moved objects are recorded again at their new place.
+        """
+        if self.group_offset:
+            records = self.selected_records()
+            self.spatial_index.move_objects([rectangle.id for rectangle in records], [rectangle.bbox for rectangle in records])
+            for rectangle in records:
+                self.overlay_cache.invalidate(rectangle.id)
+        self.group_offset = None
+        self.group_layer = None
+        self.moving_group = False
+
+    def delete_selected_objects(self):
+        """
+        Remove every object of the rubber band selection, as one edit of the undo history.
+        """
+        records = self.selected_records()
+        if records:
+            self.edit_journal.record(ObjectsRemoved(self.annotations, records))
+            self.annotations.remove_objects([rectangle.id for rectangle in records])
+            for rectangle in records:
+                self.spatial_index.remove_object(rectangle.id)
+                self.overlay_cache.invalidate(rectangle.id)
+        self.clear_selection()
+        self.update()
+
+    def set_objects_category(self, object_ids, category_id):
+        """
+        Change the label of many objects, as one edit of the undo history.
+
+        Args:
+            object_ids (list): The ids of the objects.
+            category_id (int): The index of the new label.
+        """
+        records = [rectangle for rectangle in map(self.annotations.get, object_ids)
+                   if rectangle is not None and rectangle.category_id != category_id]
+        if not records:
+            return
+        self.edit_journal.record(CategoriesChanged([rectangle.id for rectangle in records],
+                                                   [rectangle.category_id for rectangle in records], category_id))
+        self.annotations.set_categories(records, category_id)
+        for rectangle in records:
+            self.overlay_cache.invalidate(rectangle.id)
+        self.update()
+
+    ## Start of undo and redo
+
+    def set_object_category(self, object_id, category_id):
+        """
+        Change the label of an object, as one edit of the undo history.
+
+        Args:
+            object_id (int): The id of the object.
+            category_id (int): The index of the new label.
+        """
+        rectangle = self.annotations.get(object_id)
+        if rectangle is None or rectangle['category_id'] == category_id:
+            return
+        old_category_id = rectangle['category_id']
+        self.annotations.set_category(rectangle, category_id)
+        self.edit_journal.record(CategoryChanged(object_id, old_category_id, category_id))
+        self.overlay_cache.invalidate(object_id)
+        self.invalidate_object(object_id)
+
+    def undo(self):
+        """Undo the last edit of the objects."""
+        self.step_edit_history(redo=False)
+
+    def redo(self):
+        """Do the last undone edit of the objects again."""
+        self.step_edit_history(redo=True)
+
+    def step_edit_history(self, redo):
+        """
+        Undo or redo one edit. Only the edited object is updated in the overlay cache and the
+        spatial index, and only the area it covered before and after the edit is repainted.
+
+        Args:
+            redo (bool): True to redo the last undone edit, False to undo the last edit.
+        """
+        self.flush_mouse_move()
+        stack = self.edit_journal.redo_stack if redo else self.edit_journal.undo_stack
+        if not stack:
+            return
+        if isinstance(stack[-1], GroupCommand):
+            self.step_group_history(redo)
+            return
+        object_id = stack[-1].object_id
+        dirty_rect = self.interaction_image_rect()
+        rectangle = self.annotations.get(object_id)
+        if rectangle is not None:
+            dirty_rect = dirty_rect.united(self.object_image_rect(rectangle))
+        command = self.edit_journal.redo(self.annotations) if redo else self.edit_journal.undo(self.annotations)
+        self.overlay_cache.invalidate(object_id)
+        rectangle = self.annotations.get(object_id)
+        if rectangle is None:
+            self.spatial_index.remove_object(object_id)
+            if self.selected_object == object_id:
+                self.selected_object = None
+                self.selected_object_subset = None
+                self.selected_vertex = None
+        elif object_id not in self.spatial_index:
+            if next(reversed(self.annotations.objects)) == object_id:
+                self.index_object(rectangle)
+            else:
+                # an object put back under others, the index takes the drawing order of the store again
+                self.rebuild_spatial_index()
+        elif isinstance(command, VertexMoved):
+            polygon = self.annotations.polygon(rectangle, command.polygon_index)
+            vertex = command.vertex_index
+            self.spatial_index.update_vertex(object_id, command.polygon_index, vertex, polygon[vertex - 1].tolist(),
+                                             polygon[vertex].tolist(), polygon[(vertex + 1) % len(polygon)].tolist(), rectangle['bbox'])
+        elif isinstance(command, Translated) and command.polygon_index is not None:
+            self.spatial_index.update_polygon(object_id, command.polygon_index,
+                                              self.annotations.polygon(rectangle, command.polygon_index).tolist(), rectangle['bbox'])
+        elif isinstance(command, (Translated, BoxResized)):
+            self.spatial_index.update_bbox(object_id, rectangle['bbox'])
+        elif not isinstance(command, CategoryChanged):
+            self.index_object(rectangle)
+        if rectangle is not None:
+            dirty_rect = dirty_rect.united(self.object_image_rect(rectangle))
+        if self.selected_objects:
+            self.selected_objects = [object_id for object_id in self.selected_objects if object_id in self.annotations]
+            self.update_selection_rect()
+            dirty_rect = dirty_rect.united(self.selection_rect)
+        self.invalidate_image_rect(dirty_rect)
+
+    def step_group_history(self, redo):
+        """
+        Undo or redo one edit of many objects, e.g. of a rubber band selection.
+
+        Args:
+            redo (bool): True to redo the last undone edit, False to undo the last edit.
+        """
+        command = self.edit_journal.redo(self.annotations) if redo else self.edit_journal.undo(self.annotations)
+        for object_id in command.object_ids:
+            self.overlay_cache.invalidate(object_id)
+        if isinstance(command, ObjectsTranslated):
+            self.spatial_index.move_objects(command.object_ids, [self.annotations.get(object_id).bbox for object_id in command.object_ids])
+        elif isinstance(command, ObjectsRemoved) and redo:
+            for object_id in command.object_ids:
+                self.spatial_index.remove_object(object_id)
+        elif isinstance(command, ObjectsRemoved):
+            # objects put back under others, the index takes the drawing order of the store again
+            self.rebuild_spatial_index()
+        self.selected_objects = [object_id for object_id in self.selected_objects if object_id in self.annotations]
+        self.update_selection_rect()
+        self.update()
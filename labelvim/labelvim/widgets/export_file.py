@@ -17,6 +17,7 @@ import time
 import numpy as np
 import random
 from labelvim.utils.save_mask import random_colors_palette
+from labelvim.utils.geometry import clip_points, denormalize_points, normalize_points, segmentation_area
 from tqdm import tqdm
 
 def xywh2xyxy(x, y, w, h):
@@ -48,22 +49,12 @@ def yolo2xywh(x_center, y_center, width, height, image_width, image_height):
     return x, y, w, h
 
 def cocoseg2yolo(segmentation, image_width, image_height):
-    yolo_segmentation = []
-    for i in range(0, len(segmentation), 2):
-        x_normalized = segmentation[i] / image_width
-        y_normalized = segmentation[i+1] / image_height
-        yolo_segmentation.append(x_normalized)
-        yolo_segmentation.append(y_normalized)
-    return yolo_segmentation
+    # vertices dragged out of the image are moved onto its border, YOLO coordinates are in [0, 1]
+    points = clip_points(np.asarray(segmentation, dtype=np.float64), image_width, image_height)
+    return normalize_points(points, image_width, image_height).ravel().tolist()
 
 def yolo2cocoseg(yolo_segmentation, image_width, image_height):
-    segmentation = []
-    for i in range(0, len(yolo_segmentation), 2):
-        x = yolo_segmentation[i] * image_width
-        y = yolo_segmentation[i+1] * image_height
-        segmentation.append(x)
-        segmentation.append(y)
-    return segmentation
+    return denormalize_points(yolo_segmentation, image_width, image_height).ravel().tolist()
 
 class YOLOConversion:
     """Class to convert annotations to YOLO format."""
@@ -383,7 +374,8 @@ class COCOConversion:
         """Get annotation info for COCO format."""
         bbox = annotation['bbox']
         segmentation = annotation.get('segmentation', [])
-        area = bbox[2] * bbox[3]
+        # the area of a polygon annotation is the area of its polygons, not of its box
+        area = segmentation_area(segmentation) if segmentation else bbox[2] * bbox[3]
         return {
             "id": annotation_id,
             "image_id": image_id,
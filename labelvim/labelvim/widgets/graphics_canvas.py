@@ -0,0 +1,900 @@
+from PyQt5.QtCore import Qt, QPoint, QPointF, QRect, QRectF, QTimer, pyqtSignal
+from PyQt5.QtGui import QPainter, QPixmapCache, QPolygon, QTransform
+from PyQt5.QtWidgets import QFrame, QGraphicsItem, QGraphicsScene, QGraphicsView
+from enum import Enum
+import numpy as np
+from labelvim.widgets.canvas_base import CanvasBase
+from labelvim.utils.config import ANNOTATION_MODE, ANNOTATION_TYPE, ANNOTATION_CHANGE
+from labelvim.utils.annotation_store import to_qpolygon
+from labelvim.utils.edit_journal import (VertexMoved, VertexInserted, Translated, BoxResized,
+                                         CategoryChanged, PolygonAdded, ObjectAdded, ObjectRemoved, GroupCommand,
+                                         ObjectsTranslated, CategoriesChanged, ObjectsRemoved)
+from labelvim.utils.geometry import point_distances, point_segment_distances, polygon_area
+
+
+class AnnotationItem(QGraphicsItem):
+    """
+    One annotation object on the scene, in original image coordinates. The item keeps the area
+    of its object, so the BSP index of the scene is told about a move before the object is drawn
+    at its new place. The object is drawn by the canvas in screen pixels and cached per item.
+
+    Attributes:
+        canvas (GraphicsCanvasWidget): The canvas drawing the item.
+        object_id (int): The id of the object in the annotation store.
+        rect (QRectF): The area covered by the object on the original image.
+        bounds (QRectF): The area of the object grown by the margins of the canvas, returned by boundingRect.
+    """
+
+    def __init__(self, canvas, object_id):
+        """
+        Initializes the AnnotationItem.
+
+        Args:
+            canvas (GraphicsCanvasWidget): The canvas drawing the item.
+            object_id (int): The id of the object in the annotation store.
+        """
+        super(AnnotationItem, self).__init__()
+        self.canvas = canvas
+        self.object_id = object_id
+        self.rect = QRectF()
+        self.bounds = QRectF()
+        self.setCacheMode(QGraphicsItem.DeviceCoordinateCache)
+        self.refresh()
+
+    def refresh(self):
+        """
+        Read the area of the object again after it changed, and repaint the item.
+        """
+        self.prepareGeometryChange()
+        record = self.canvas.annotations.get(self.object_id)
+        self.rect = QRectF(self.canvas.object_image_rect(record)) if record is not None else QRectF()
+        self.update_bounds()
+        self.update()
+
+    def update_bounds(self):
+        """
+        Grow the area of the object by the margins of the canvas, after prepareGeometryChange was called.
+        """
+        # the handles and the title are drawn around the object at a fixed size on screen
+        left, top, right, bottom = self.canvas.item_margins
+        self.bounds = self.rect.adjusted(-left, -top, right, bottom)
+
+    def boundingRect(self):
+        # asked several times per frame for every item, so it is computed when the object or the zoom changes
+        return self.bounds
+
+    def paint(self, painter, option, widget=None):
+        record = self.canvas.annotations.get(self.object_id)
+        if record is None or self.canvas.annotation_type not in (ANNOTATION_TYPE.BBOX, ANNOTATION_TYPE.POLYGON):
+            return
+        # the object is drawn in screen pixels as on the widget canvas, only the translation of the view is kept.
+        # The store already holds the dragged position of the item, so the translation is the one of the scene origin
+        origin = painter.worldTransform().map(-self.pos())
+        painter.setWorldTransform(QTransform.fromTranslate(origin.x(), origin.y()))
+        self.canvas.draw_object(painter, record, selected=self.canvas.selected_object == self.object_id)
+        painter.setFont(self.canvas.font())
+        self.canvas.draw_title(painter, record)
+
+
+class GraphicsCanvasWidget(CanvasBase, QGraphicsView):
+    """
+    Canvas engine built on QGraphicsView and QGraphicsScene, a drop-in replacement of CanvasWidget
+    with the same signals and public methods.
+
+    Every annotation object is an AnnotationItem of the scene, so the lookups of the objects under
+    the mouse and in the exposed area go through the BSP index of the scene, every object is cached
+    as a pixmap of its own, only the changed items are repainted, and zooming only changes the view
+    transform. The items follow the change events of the annotation store, so the edits, undo and
+    redo only have to change the store. The image is drawn as the background of the view from the
+    same pyramid levels and tiles as the widget canvas.
+    """
+    update_label_list_slot_transmitter = pyqtSignal(list) # Signal to update the label list
+    update_label_list_slot_receiver = pyqtSignal(list) # Signal to update the label list
+    annotation_data_slot_transmitter = pyqtSignal(list) # Signal to transmit the annotation data
+    annotation_data_slot_receiver = pyqtSignal(list) # Signal to receive the annotation data
+    annotation_changed = pyqtSignal(object) # Signal to transmit the AnnotationChange of every edit of the objects
+    object_selection_notification_slot_receiver = pyqtSignal(int) # Signal to receive the object selection notification
+    btn_action_slot = pyqtSignal(Enum) # Signal to transmit the button action
+    scale_factor_slot = pyqtSignal(float) # Signal to transmit the scale factor
+
+    def __init__(self, parent=None):
+        self._selected_object = None
+        self.items_by_id = {}
+        super(GraphicsCanvasWidget, self).__init__(parent)
+        self.size_geometry = QRect(70, 0, 1310, 790)
+        self.setGeometry(70, 0, 1321, 801)
+        self.setFrameShape(QFrame.Box | QFrame.Plain)
+        self.setFrameShadow(QFrame.Sunken)
+        self.setAlignment(Qt.AlignCenter)
+        scene = QGraphicsScene(self)
+        scene.setItemIndexMethod(QGraphicsScene.BspTreeIndex)
+        self.setScene(scene)
+        # only the changed areas are repainted, the image is cached as the background of the view
+        self.setViewportUpdateMode(QGraphicsView.SmartViewportUpdate)
+        self.setCacheMode(QGraphicsView.CacheBackground)
+        self.setBackgroundBrush(self.palette().window())
+        # the cached item pixmaps live in the QPixmapCache, its default 10 MB only holds a few hundred objects
+        self.item_cache_bytes = 128 * 1024 * 1024
+        QPixmapCache.setCacheLimit(max(QPixmapCache.cacheLimit(), self.item_cache_bytes // 1024))
+        self.setMouseTracking(False)
+
+        self.init_canvas_state()
+        # the scene items follow the store through its change events as the other views
+        self.annotations.subscribe(self.apply_annotation_change)
+        self.dirty_items = set() # Objects whose item must read the store again
+        self.item_sync_timer = QTimer(self)
+        self.item_sync_timer.setSingleShot(True)
+        self.item_sync_timer.setInterval(0)
+        self.item_sync_timer.timeout.connect(self.sync_items)
+        self.next_z = 0
+        self.update_label_list_slot_receiver.connect(self.update_label_list)
+        self.annotation_data_slot_receiver.connect(self.update_annotation_from_json)
+        self.btn_action_slot.connect(self.set_annotation_mode)
+        self.object_selection_notification_slot_receiver.connect(self.select_object)
+        self.item_margins = (0, 0, 0, 0) # overlay_margins in original image pixels at the current zoom
+        self.update_item_margins()
+
+    @property
+    def selected_object(self):
+        """int: The id of the selected object, None if no object is selected."""
+        return self._selected_object
+
+    @selected_object.setter
+    def selected_object(self, object_id):
+        if object_id != self._selected_object:
+            # the selected object is drawn differently, both items are cached again
+            for key in (self._selected_object, object_id):
+                item = self.items_by_id.get(key)
+                if item is not None:
+                    item.update()
+            self._selected_object = object_id
+
+    ## Scene items
+
+    def apply_annotation_change(self, change):
+        """
+        Update the items of the scene from a change of the annotation store.
+
+        Args:
+            change (AnnotationChange): The change sent by the store.
+        """
+        if change.kind == ANNOTATION_CHANGE.RESET:
+            self.dirty_items.clear()
+            self.scene().clear()
+            self.items_by_id = {}
+            self.next_z = 0
+            for object_id in change.object_ids:
+                self.add_item(object_id)
+        elif change.kind == ANNOTATION_CHANGE.ADDED:
+            for object_id in change.object_ids:
+                self.add_item(object_id)
+            if change.object_ids and not self.annotations.on_top(change.object_ids):
+                # an object put back under others, e.g. by undo, the stacking order follows the store again
+                for z, object_id in enumerate(self.annotations.objects):
+                    self.items_by_id[object_id].setZValue(z)
+                self.next_z = len(self.annotations)
+        elif change.kind == ANNOTATION_CHANGE.REMOVED:
+            for object_id in change.object_ids:
+                item = self.items_by_id.pop(object_id, None)
+                self.dirty_items.discard(object_id)
+                if item is not None:
+                    self.scene().removeItem(item)
+        elif change.kind == ANNOTATION_CHANGE.GEOMETRY:
+            # the bbox is often updated right after the change, the items read the store once the edit is done.
+            # The items of a dragged selection are only moved, they read the store when the drag ends
+            if self.group_offset is not None:
+                dragged = set(self.selected_objects)
+                self.dirty_items.update(object_id for object_id in change.object_ids if object_id not in dragged)
+            else:
+                self.dirty_items.update(change.object_ids)
+            self.item_sync_timer.start()
+        elif change.kind == ANNOTATION_CHANGE.CATEGORY:
+            for object_id in change.object_ids:
+                item = self.items_by_id.get(object_id)
+                if item is not None:
+                    item.update()
+
+    def add_item(self, object_id):
+        item = AnnotationItem(self, object_id)
+        item.setZValue(self.next_z)
+        self.next_z += 1
+        self.items_by_id[object_id] = item
+        self.scene().addItem(item)
+
+    def sync_items(self):
+        """
+        Bring the items of the objects changed since the last call up to date with the store.
+        """
+        self.item_sync_timer.stop()
+        for object_id in self.dirty_items:
+            item = self.items_by_id.get(object_id)
+            if item is not None:
+                item.refresh()
+        self.dirty_items.clear()
+
+    def update_item_margins(self):
+        """
+        Convert the margins drawn around every object to original image pixels at the current zoom.
+        Every item changes size, so the BSP index is told first.
+        """
+        for item in self.items_by_id.values():
+            item.prepareGeometryChange()
+        self.item_margins = tuple(margin / self.scale_factor for margin in self.overlay_margins())
+        for item in self.items_by_id.values():
+            item.update_bounds()
+
+    def objects_at(self, x, y, radius=0):
+        """
+        Find the objects whose bounding box is within a radius of a point, from the BSP index of the scene.
+
+        Args:
+            x (float): The x coordinate of the point on the original image.
+            y (float): The y coordinate of the point on the original image.
+            radius (float, optional): The search radius. Defaults to 0.
+
+        Returns:
+            list: The object ids, topmost object first.
+        """
+        self.sync_items()
+        area = QRectF(x - radius - 0.5, y - radius - 0.5, 2 * radius + 1, 2 * radius + 1)
+        found = []
+        for item in self.scene().items(area, Qt.IntersectsItemBoundingRect, Qt.DescendingOrder):
+            rect = item.rect
+            if rect.left() - radius <= x <= rect.right() + radius and rect.top() - radius <= y <= rect.bottom() + radius:
+                found.append(item.object_id)
+        return found
+
+    ## Image
+
+    def update_annotation_type(self, annotation_type):
+        print(f"Annotation Type: {annotation_type}")
+        self.annotation_type = annotation_type
+        self.clear_selection()
+        for item in self.items_by_id.values():
+            item.update()
+        self.viewport().update()
+
+    def load_image(self, file_name, image=None, preview=None):
+        """
+        Display an image file. The objects are cleared, the image is fit to the window.
+
+        Args:
+            file_name (str): The path of the image file.
+            image (QImage, optional): The image already decoded, read from the image cache when None. Defaults to None.
+            preview (QImage, optional): The image already scaled to fit the window. Defaults to None.
+        """
+        self.clear_annotation()
+        self.selected_object = None
+        self.annotation_mode = ANNOTATION_MODE.NONE
+        self.scale_factor = 1.0
+        self.open_image(file_name, image, preview)
+        self.scene().setSceneRect(QRectF(0, 0, self.image_size.width(), self.image_size.height()))
+        scale_factor = self.size_geometry.width() / self.image_size.width()
+        self.max_scale_factor = 4 * scale_factor
+        self.min_scale_factor = 0.25 * scale_factor
+        self.scale_to_fit(self.maximumViewportSize())
+
+    def invalidate_image(self, rect=None):
+        """
+        Drop the cached background so an area of the image is drawn again, e.g. when a tile arrived.
+
+        Args:
+            rect (QRect, optional): The area on the original image, the whole image when None.
+        """
+        self.scene().invalidate(QRectF(rect) if rect is not None else self.scene().sceneRect(), QGraphicsScene.BackgroundLayer)
+
+    def drawBackground(self, painter, rect):
+        super(GraphicsCanvasWidget, self).drawBackground(painter, rect)
+        if self.image_size is None:
+            return
+        target_rect = rect.intersected(QRectF(0, 0, self.image_size.width(), self.image_size.height()))
+        if target_rect.isEmpty():
+            return
+        if self.tile_source is not None:
+            # the tiles of the whole visible area keep loading when only a part of it is repainted
+            view_rect = self.mapToScene(self.viewport().rect()).boundingRect()
+            self.tile_source.draw(painter, target_rect.left(), target_rect.top(), target_rect.right(), target_rect.bottom(),
+                                  self.scale_factor, not self.fast_zoom,
+                                  (view_rect.left(), view_rect.top(), view_rect.right(), view_rect.bottom()))
+        elif self.image_pyramid is not None:
+            # the source pixels are taken from the pyramid level closest to the screen resolution
+            pixmap, (level_x, level_y) = self.image_pyramid.level_for_scale(self.scale_factor)
+            source_rect = QRectF(target_rect.x() * level_x, target_rect.y() * level_y,
+                                 target_rect.width() * level_x, target_rect.height() * level_y)
+            painter.setRenderHint(QPainter.SmoothPixmapTransform, not self.fast_zoom)
+            painter.drawPixmap(target_rect, pixmap, source_rect)
+        else:
+            painter.fillRect(target_rect, self.placeholder_color)
+
+    def drawForeground(self, painter, rect):
+        if self.display_size is None:
+            return
+        painter.save()
+        transform = painter.worldTransform()
+        painter.setWorldTransform(QTransform.fromTranslate(transform.dx(), transform.dy()))
+        self.draw_interaction(painter)
+        painter.restore()
+
+    ## Zoom
+
+    def apply_scale_factor(self):
+        self.display_size = self.image_size * self.scale_factor
+        self.update_item_margins()
+        self.setTransform(QTransform.fromScale(self.scale_factor, self.scale_factor))
+        self.scale_factor_slot.emit(self.scale_factor)
+        self.start_fast_zoom()
+
+    def scale_to_fit(self, available_size):
+        if self.image_size:
+            self.scale_factor = self.image_size.scaled(available_size, Qt.KeepAspectRatio).width() / self.image_size.width()
+            self.apply_scale_factor()
+
+    def scale_image(self, factor):
+        if self.image_size:
+            if self.scale_factor * factor < self.min_scale_factor or self.scale_factor * factor > self.max_scale_factor:
+                return
+            self.scale_factor *= factor
+            self.apply_scale_factor()
+
+    def smooth_zoom(self):
+        """
+        Draw the image again with smooth filtering once the zoom is idle.
+        """
+        self.fast_zoom = False
+        self.resetCachedContent()
+        self.viewport().update()
+
+    def zoom_in(self):
+        self.scale_image(self.zoom_in_scale_factor)
+
+    def zoom_out(self):
+        self.scale_image(self.zoom_out_scale_factor)
+
+    def fit_to_window(self):
+        self.scale_to_fit(self.maximumViewportSize())
+
+    def wheelEvent(self, event):
+        if event.angleDelta().y() > 0:
+            self.zoom_in()
+        else:
+            self.zoom_out()
+
+    def reset(self):
+        self.clear_annotation()
+        self.annotation_mode = ANNOTATION_MODE.NONE
+        self.scale_factor = 1.0
+        self.display_size = None
+        self.image_size = None
+        self.original_pixmap = None
+        self.image_pyramid = None
+        self.image_loader = None
+        self.preview_loader = None
+        self.pyramid_builder = None
+        self.load_generation.next()
+        self.release_tile_source()
+        self.scene().setSceneRect(QRectF())
+        self.resetCachedContent()
+        self.viewport().update()
+
+    def clear_annotation(self):
+        """Clear the displayed image from the widget."""
+        self.start_point = None
+        self.end_point = None
+        self.polygon_points.clear()
+        self.polygon_move_point = None
+        self.clear_selection()
+        self.annotations.clear()
+        self.edit_journal.clear()
+        self.viewport().update()
+
+    ## Mapping
+
+    def image_offset(self):
+        """
+        Get the offset of the displayed image inside the viewport.
+
+        Returns:
+            tuple: The (x, y) offset of the displayed image.
+        """
+        if self.display_size is None:
+            return 0, 0
+        offset = self.mapFromScene(QPointF(0, 0))
+        return offset.x(), offset.y()
+
+    def map_to_original_image(self, pos):
+        """
+        Map the position on the viewport to the original image.
+
+        Args:
+            pos (QPoint): The position on the viewport.
+
+        Returns:
+            QPoint: The position on the original image, None outside of the image.
+        """
+        if self.image_size is None:
+            return None
+        point = self.mapToScene(pos)
+        if 0 <= point.x() < self.image_size.width() and 0 <= point.y() < self.image_size.height():
+            return QPoint(int(point.x()), int(point.y()))
+        return None
+
+    def invalidate_image_rect(self, rect):
+        """
+        Schedule a repaint of a rectangle given on the original image, grown by the handles and the title.
+
+        Args:
+            rect (QRect): The dirty rectangle on the original image.
+        """
+        if rect is None or rect.isNull() or self.display_size is None:
+            return
+        left, top, right, bottom = self.item_margins
+        self.scene().update(QRectF(rect).adjusted(-left, -top, right, bottom))
+
+    def invalidate_object(self, object_id):
+        """
+        Schedule a repaint of the area covered by an object.
+
+        Args:
+            object_id (int): The id of the object.
+        """
+        rectangle = self.annotations.get(object_id)
+        if rectangle is not None:
+            self.invalidate_image_rect(self.object_image_rect(rectangle))
+
+    ## Start of mouse events
+
+    def mousePressEvent(self, event):
+        dirty_rect = self.interaction_image_rect()
+        if self.image_size and event.button() == Qt.LeftButton:
+            click_pos = event.pos()
+            if self.annotation_mode == ANNOTATION_MODE.EDIT and self.start_group_move(click_pos):
+                # a press on the rubber band selection drags all of its objects
+                pass
+            elif self.annotation_type == ANNOTATION_TYPE.BBOX:
+                if self.annotation_mode == ANNOTATION_MODE.CREATE:
+                    start_point = self.map_to_original_image(click_pos)
+                    if start_point:
+                        self.start_point = start_point
+                if self.annotation_mode == ANNOTATION_MODE.EDIT:
+                    self.selected_object, self.selected_vertex = self.find_object_to_edit(click_pos)
+                    if self.selected_vertex is None and self.selected_object is None:
+                        # Start moving the rectangle if no vertex is selected
+                        self.last_mouse_position = self.map_to_original_image(click_pos)
+                        self.moving_object = self.last_mouse_position is not None
+                        if self.moving_object:
+                            self.select_rectangle(self.last_mouse_position)
+            elif self.annotation_type == ANNOTATION_TYPE.POLYGON:
+                new_map = self.map_to_original_image(click_pos)
+                self.polygon_move_point = None
+                if self.annotation_mode == ANNOTATION_MODE.CREATE and new_map is not None:
+                    if len(self.polygon_points) == 0:
+                        self.polygon_points.append(new_map)
+                    elif len(self.polygon_points) == 1:
+                        if self.distance(self.polygon_points[0], new_map) > 10:
+                            self.polygon_points.append(new_map)
+                    elif self.distance(self.polygon_points[0], new_map) < 10:
+                        # a click on the first point closes the polygon
+                        self.update_rectangle(poly=self.polygon_points)
+                        dirty_rect = dirty_rect.united(QPolygon(self.polygon_points).boundingRect())
+                        self.polygon_points.clear()
+                    else:
+                        self.polygon_points.append(new_map)
+                elif self.annotation_mode == ANNOTATION_MODE.EDIT:
+                    self.selected_object, self.selected_object_subset, self.selected_vertex, self.line_segment = self.find_polygon_to_edit(new_map)
+                    if self.selected_vertex is None and self.selected_object is None and self.line_segment is None:
+                        self.last_mouse_position = new_map
+                        self.moving_object = new_map is not None
+                        if self.moving_object:
+                            self.select_polygon(new_map)
+            if self.annotation_mode == ANNOTATION_MODE.EDIT and not self.moving_group:
+                if self.selected_object is None and self.selected_vertex is None and self.line_segment is None:
+                    # a press beside every object starts a rubber band
+                    self.start_rubber_band(click_pos)
+                else:
+                    self.clear_selection()
+        self.invalidate_image_rect(dirty_rect.united(self.interaction_image_rect()))
+
+    def mouseMoveEvent(self, event):
+        dirty_rect = self.interaction_image_rect()
+        if self.image_size:
+            new_pos = self.map_to_original_image(event.pos())
+            if new_pos is not None and self.band_start is not None:
+                self.band_end = new_pos
+            elif new_pos is not None and self.moving_group:
+                self.move_selected_objects(new_pos)
+            elif new_pos is not None and self.annotation_type == ANNOTATION_TYPE.BBOX:
+                if self.start_point and self.annotation_mode == ANNOTATION_MODE.CREATE:
+                    self.end_point = new_pos
+                elif self.selected_vertex is not None and self.annotation_mode == ANNOTATION_MODE.EDIT:
+                    self.move_vertex(self.selected_vertex, new_pos)
+                elif self.moving_object and self.annotation_mode == ANNOTATION_MODE.EDIT:
+                    self.move_rectangle(new_pos)
+                    self.last_mouse_position = new_pos
+            elif new_pos is not None and self.annotation_type == ANNOTATION_TYPE.POLYGON and self.annotation_mode == ANNOTATION_MODE.EDIT:
+                if self.selected_object is not None and self.selected_vertex is not None:
+                    self.move_polygon_vertex(new_pos)
+                elif self.selected_object is not None and self.line_segment is not None:
+                    self.last_mouse_position = new_pos
+                    self.add_point_to_polygon(new_pos)
+                    self.selected_vertex = self.line_segment[1]
+                    self.line_segment = None
+                elif self.moving_object and self.selected_object is not None:
+                    self.move_polygon(new_pos)
+        self.sync_items()
+        self.invalidate_image_rect(dirty_rect.united(self.interaction_image_rect()))
+
+    def mouseReleaseEvent(self, event):
+        # the steps of the drag are one edit in the undo history
+        self.edit_journal.seal()
+        dirty_rect = self.interaction_image_rect()
+        if self.band_start is not None:
+            self.finish_rubber_band()
+        if self.moving_group:
+            self.finish_group_move()
+        if self.image_size and event.button() == Qt.LeftButton:
+            if self.annotation_type == ANNOTATION_TYPE.BBOX:
+                if self.start_point and self.annotation_mode == ANNOTATION_MODE.CREATE:
+                    end_point = self.map_to_original_image(event.pos())
+                    if end_point:
+                        self.end_point = end_point
+                        rect = QRect(self.start_point, self.end_point).normalized()
+                        dirty_rect = dirty_rect.united(rect)
+                        if self.distance(self.start_point, self.end_point) > 20:
+                            self.update_rectangle(bbox=rect)
+                self.start_point = None
+                self.end_point = None
+            else:
+                self.last_mouse_position = None
+            self.selected_vertex = None
+            self.moving_object = False
+        self.selected_object = None
+        self.selected_object_subset = None
+        self.invalidate_image_rect(dirty_rect)
+
+    ## Editing
+
+    def update_rectangle(self, **kwargs):
+        bbox = kwargs.get('bbox')
+        poly = kwargs.get('poly')
+        if bbox or poly:
+            label_selected, selected_id = self.select_label_from_label_list()
+            print(f"Selected Label: {label_selected}")
+            if not label_selected:
+                return
+            if label_selected not in self.label_list:
+                print("Label not found in the label list")
+                return
+            index = self.label_list.index(label_selected)
+            if bbox:
+                rectangle = self.annotations.add(index, [bbox.x(), bbox.y(), bbox.width(), bbox.height()])
+                self.edit_journal.record(ObjectAdded(self.annotations, rectangle))
+            elif selected_id == -1:
+                bbox = QPolygon(poly).boundingRect()
+                rectangle = self.annotations.add(index, [bbox.x(), bbox.y(), bbox.width(), bbox.height()],
+                                                 [[(point.x(), point.y()) for point in poly]])
+                self.edit_journal.record(ObjectAdded(self.annotations, rectangle))
+            else:
+                rectangle = self.annotations.get(selected_id)
+                points = [(point.x(), point.y()) for point in poly]
+                old_bbox = list(rectangle['bbox'])
+                self.annotations.add_polygon(rectangle, points)
+                self.annotations.update_bbox(rectangle)
+                self.edit_journal.record(PolygonAdded(selected_id, old_bbox, len(rectangle.spans) - 1, points))
+            self.sync_items()
+
+    def select_rectangle(self, pos):
+        """
+        Select the rectangle containing a point whose center is the closest to it.
+
+        Args:
+            pos (QPoint): The position on the original image.
+        """
+        selected = []
+        for object_id in self.objects_at(pos.x(), pos.y()):
+            rect = self.annotations.get(object_id)
+            if QRect(*rect["bbox"]).contains(pos):
+                selected.append(rect)
+        if selected:
+            self.selected_object = min(selected, key=lambda rect: self.distance_to_center(pos, rect["bbox"]))["id"]
+
+    def find_object_to_edit(self, click_pos):
+        mapped_pos = self.map_to_original_image(click_pos)
+        if mapped_pos is None:
+            return None, None
+        for object_id in self.objects_at(mapped_pos.x(), mapped_pos.y(), 20):
+            rect = self.annotations.get(object_id)['bbox']
+            vertices = [QPoint(rect[0], rect[1]), QPoint(rect[0] + rect[2], rect[1]),
+                        QPoint(rect[0], rect[1] + rect[3]), QPoint(rect[0] + rect[2], rect[1] + rect[3])]
+            for i, vertex in enumerate(vertices):
+                if self.distance(vertex, mapped_pos) <= 20:
+                    return object_id, i
+        return None, None
+
+    def select_polygon(self, pos):
+        if pos is None:
+            return
+        candidates = []
+        for object_id in reversed(self.objects_at(pos.x(), pos.y())):
+            for poly_idx, polygon in enumerate(self.annotations.polygons(self.annotations.get(object_id))):
+                if to_qpolygon(polygon).containsPoint(pos, Qt.OddEvenFill):
+                    candidates.append((polygon_area(polygon), object_id, poly_idx))
+        if candidates:
+            # the smallest polygon under the point, the bottom one on a tie
+            _, self.selected_object, self.selected_object_subset = min(candidates, key=lambda candidate: candidate[0])
+
+    def find_polygon_to_edit(self, click_pos):
+        if click_pos is None:
+            return None, None, None, None
+        click = (click_pos.x(), click_pos.y())
+        # vertices first then edges, polygon after polygon of the topmost object first
+        for object_id in self.objects_at(click[0], click[1], 10):
+            for poly_idx, poly in enumerate(self.annotations.polygons(self.annotations.get(object_id))):
+                if not len(poly):
+                    continue
+                near = np.flatnonzero(point_distances(click, poly) <= 10)
+                if len(near):
+                    return object_id, poly_idx, int(near[0]), None
+                following = np.roll(poly, -1, axis=0)
+                near = np.flatnonzero(point_segment_distances(click, poly, following) <= 10)
+                if len(near):
+                    i = int(near[0])
+                    return object_id, poly_idx, None, (i, (i + 1) % len(poly))
+        return None, None, None, None
+
+    def move_vertex(self, vertex_index, new_pos):
+        rectangle = self.get_selected_object()
+        if rectangle is not None:
+            rect = rectangle['bbox']
+            old_rect = list(rect)
+            x0, y0, x1, y1 = rect[0], rect[1], rect[0] + rect[2], rect[1] + rect[3]
+            # the corners are top-left, top-right, bottom-left and bottom-right
+            if vertex_index in (0, 2):
+                x0 = new_pos.x()
+            else:
+                x1 = new_pos.x()
+            if vertex_index in (0, 1):
+                y0 = new_pos.y()
+            else:
+                y1 = new_pos.y()
+            rect[:] = [x0, y0, x1 - x0, y1 - y0]
+            self.annotations.geometry_changed(rectangle)
+            self.edit_journal.record(BoxResized(rectangle['id'], old_rect, rect))
+
+    def move_rectangle(self, new_pos):
+        rect = self.get_selected_object()
+        if rect is not None:
+            dx = new_pos.x() - self.last_mouse_position.x()
+            dy = new_pos.y() - self.last_mouse_position.y()
+            old_bbox = list(rect["bbox"])
+            rect["bbox"][0] += dx
+            rect["bbox"][1] += dy
+            self.annotations.geometry_changed(rect)
+            self.edit_journal.record(Translated(rect["id"], old_bbox, None, dx, dy))
+
+    def move_polygon(self, new_pos):
+        poly = self.get_selected_object()
+        if poly is not None:
+            dx = new_pos.x() - self.last_mouse_position.x()
+            dy = new_pos.y() - self.last_mouse_position.y()
+            old_bbox = list(poly['bbox'])
+            self.annotations.translate_polygon(poly, self.selected_object_subset, dx, dy)
+            self.annotations.update_bbox(poly)
+            self.edit_journal.record(Translated(poly['id'], old_bbox, self.selected_object_subset, dx, dy))
+            self.last_mouse_position = new_pos
+
+    def move_polygon_vertex(self, new_pos):
+        poly = self.get_selected_object()
+        if poly is not None:
+            old_bbox = list(poly['bbox'])
+            old_point = self.annotations.polygon(poly, self.selected_object_subset)[self.selected_vertex].tolist()
+            self.annotations.set_vertex(poly, self.selected_object_subset, self.selected_vertex, new_pos.x(), new_pos.y())
+            self.annotations.update_bbox(poly)
+            self.edit_journal.record(VertexMoved(poly['id'], old_bbox, self.selected_object_subset, self.selected_vertex,
+                                                 old_point, (new_pos.x(), new_pos.y())))
+
+    def add_point_to_polygon(self, new_pos):
+        poly = self.get_selected_object()
+        if poly is not None:
+            old_bbox = list(poly['bbox'])
+            self.annotations.insert_vertex(poly, self.selected_object_subset, self.line_segment[1], new_pos.x(), new_pos.y())
+            self.annotations.update_bbox(poly)
+            self.edit_journal.record(VertexInserted(poly['id'], old_bbox, self.selected_object_subset, self.line_segment[1],
+                                                    (new_pos.x(), new_pos.y())))
+
+    def set_object_category(self, object_id, category_id):
+        """
+        Change the label of an object, as one edit of the undo history.
+
+        Args:
+            object_id (int): The id of the object.
+            category_id (int): The index of the new label.
+        """
+        rectangle = self.annotations.get(object_id)
+        if rectangle is None or rectangle['category_id'] == category_id:
+            return
+        old_category_id = rectangle['category_id']
+        self.annotations.set_category(rectangle, category_id)
+        self.edit_journal.record(CategoryChanged(object_id, old_category_id, category_id))
+
+    def undo(self):
+        """Undo the last edit of the objects."""
+        self.step_edit_history(redo=False)
+
+    def redo(self):
+        """Do the last undone edit of the objects again."""
+        self.step_edit_history(redo=True)
+
+    def step_edit_history(self, redo):
+        """
+        Undo or redo one edit. The items follow the store, only the edited one is updated.
+
+        Args:
+            redo (bool): True to redo the last undone edit, False to undo the last edit.
+        """
+        command = self.edit_journal.redo(self.annotations) if redo else self.edit_journal.undo(self.annotations)
+        if command is None:
+            return
+        if not isinstance(command, GroupCommand) and command.object_id not in self.annotations and self.selected_object == command.object_id:
+            self.selected_object = None
+            self.selected_object_subset = None
+            self.selected_vertex = None
+        self.sync_items()
+        if self.selected_objects:
+            dirty_rect = self.selection_rect
+            self.selected_objects = [object_id for object_id in self.selected_objects if object_id in self.annotations]
+            self.update_selection_rect()
+            self.invalidate_image_rect(dirty_rect.united(self.selection_rect))
+
+    ## Labels and annotations
+
+    def update_label_list(self, label_list):
+        self.label_list = label_list
+        print(f"Label List: {self.label_list}")
+        self.title_cache.clear()
+        # the titles may be wider, every item is drawn again
+        self.update_item_margins()
+        for item in self.items_by_id.values():
+            item.update()
+
+    def update_annotation_from_json(self, annotation: list):
+        """
+        Update the drawn objects from the annotation data, see CanvasWidget.update_annotation_from_json.
+
+        Args:
+            annotation (list): A list of annotations containing the label and rectangle data.
+        """
+        self.clear_selection()
+        self.annotations.load_coco(annotation)
+        self.edit_journal.clear()
+        print(f"Rectangles: {len(self.annotations)}")
+
+    def update_annotation_to_json(self):
+        """
+        Update the annotation data from the drawn objects.
+
+        Returns:
+            list: A list of annotations containing the label and rectangle data.
+        """
+        return self.annotations.to_coco()
+
+    def set_annotation_mode(self, mode):
+        """Set the annotation mode."""
+        self.annotation_mode = mode
+        print(f"Annotation Mode: {self.annotation_mode}")
+        if self.annotation_mode == ANNOTATION_MODE.CLEAR:
+            self.clear_annotation()
+            self.annotation_mode = ANNOTATION_MODE.NONE
+        elif self.annotation_mode == ANNOTATION_MODE.DELETE:
+            rectangle = self.get_selected_object()
+            if self.selected_objects:
+                self.delete_selected_objects()
+            elif rectangle is not None:
+                self.edit_journal.record(ObjectRemoved(self.annotations, rectangle))
+                self.annotations.remove(rectangle['id'])
+            self.selected_object = None
+            self.annotation_mode = ANNOTATION_MODE.CREATE
+
+    def select_object(self, object_id):
+        self.invalidate_image_rect(self.interaction_image_rect())
+        self.clear_selection()
+        self.selected_object = None if object_id == -1 else object_id
+
+    ## Rubber band selection
+
+    def finish_rubber_band(self):
+        """
+        Select the objects lying entirely inside the rubber band, from the BSP index of the scene.
+        """
+        if self.band_end is not None and self.distance(self.band_start, self.band_end) > 2:
+            self.sync_items()
+            band = QRectF(QRect(self.band_start, self.band_end).normalized())
+            items = [item for item in self.scene().items(band, Qt.IntersectsItemBoundingRect, Qt.AscendingOrder)
+                     if band.contains(item.rect)]
+            self.selected_objects = [item.object_id for item in items]
+            self.update_selection_rect()
+        self.band_start = None
+        self.band_end = None
+
+    def start_group_move(self, click_pos):
+        """
+        Start dragging the rubber band selection when the press is on one of its objects.
+
+        Args:
+            click_pos (QPoint): The mouse position on the viewport.
+
+        Returns:
+            bool: True if the selection is being dragged.
+        """
+        pos = self.map_to_original_image(click_pos)
+        if not self.selected_objects or pos is None:
+            return False
+        selected = set(self.selected_objects)
+        if any(object_id in selected for object_id in self.objects_at(pos.x(), pos.y())):
+            self.moving_group = True
+            self.last_mouse_position = pos
+        return self.moving_group
+
+    def move_selected_objects(self, new_pos):
+        """
+        Move every object of the rubber band selection with one vectorized translation of the store.
+        The cached items are only moved on the scene, they are drawn again when the drag ends.
+
+        Args:
+            new_pos (QPoint): The mouse position on the original image.
+        """
+        dx = new_pos.x() - self.last_mouse_position.x()
+        dy = new_pos.y() - self.last_mouse_position.y()
+        records = self.selected_records()
+        if (dx or dy) and records:
+            if self.group_offset is None:
+                # the BSP index would be rebuilt on every step of the drag, it is left out until the drag ends
+                self.scene().setItemIndexMethod(QGraphicsScene.NoIndex)
+            offset_x, offset_y = self.group_offset or (0, 0)
+            self.group_offset = (offset_x + dx, offset_y + dy)
+            self.annotations.translate_objects(records, dx, dy)
+            self.edit_journal.record(ObjectsTranslated([rectangle.id for rectangle in records], dx, dy))
+            for rectangle in records:
+                self.items_by_id[rectangle.id].setPos(*self.group_offset)
+            self.selection_rect.translate(dx, dy)
+        self.last_mouse_position = new_pos
+
+    def finish_group_move(self):
+        """
+        End the drag of the selection, the moved items read their area from the store again.
+        """
+        if self.group_offset:
+            for object_id in self.selected_objects:
+                item = self.items_by_id.get(object_id)
+                if item is not None:
+                    item.setPos(0, 0)
+                    item.refresh()
+            self.scene().setItemIndexMethod(QGraphicsScene.BspTreeIndex)
+        self.group_offset = None
+        self.moving_group = False
+
+    def delete_selected_objects(self):
+        """
+        Remove every object of the rubber band selection, as one edit of the undo history.
+        """
+        records = self.selected_records()
+        self.invalidate_image_rect(self.selection_rect)
+        if records:
+            self.edit_journal.record(ObjectsRemoved(self.annotations, records))
+            self.annotations.remove_objects([rectangle.id for rectangle in records])
+        self.clear_selection()
+
+    def set_objects_category(self, object_ids, category_id):
+        """
+        Change the label of many objects, as one edit of the undo history.
+
+        Args:
+            object_ids (list): The ids of the objects.
+            category_id (int): The index of the new label.
+        """
+        records = [rectangle for rectangle in map(self.annotations.get, object_ids)
+                   if rectangle is not None and rectangle.category_id != category_id]
+        if not records:
+            return
+        self.edit_journal.record(CategoriesChanged([rectangle.id for rectangle in records],
+                                                   [rectangle.category_id for rectangle in records], category_id))
+        self.annotations.set_categories(records, category_id)
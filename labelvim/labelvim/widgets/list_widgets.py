@@ -1,10 +1,10 @@
 from PyQt5 import QtWidgets
-from PyQt5.QtCore import QStringListModel, Qt, QRect, pyqtSignal, QModelIndex, pyqtSlot
+from PyQt5.QtCore import QStringListModel, QAbstractListModel, QSortFilterProxyModel, Qt, QRect, pyqtSignal, QModelIndex, pyqtSlot
 from PyQt5.QtGui import QStandardItemModel, QStandardItem
 from PyQt5.QtWidgets import QInputDialog, QMessageBox, QMenu, QAction
 
 # External imports
-from labelvim.utils.config import ANNOTATION_TYPE, OBJECT_LIST_ACTION
+from labelvim.utils.config import ANNOTATION_TYPE, ANNOTATION_CHANGE
 from labelvim.widgets.custom_delegets import CustomDelegate
 from enum import Enum
 
@@ -406,44 +406,211 @@ class CustomLabelWidget(QtWidgets.QListView):
         # Emit signal to update the list
         self.update_label_list_slot_transmitter.emit(self.label_list)
 
+class ObjectListModel(QAbstractListModel):
+    """
+    List model of the objects of an AnnotationStore, one row per object in drawing order.
+    The display text of a row is only built when the view asks for it, and the rows follow the
+    change events of the store, so an edit only touches the rows it changes.
+
+    Attributes:
+        store (AnnotationStore): The store the rows are read from.
+        label_list (list): The label names, indexed by category id.
+        ids (list): The id of the object of every row.
+        rows (dict): The row of every object, keyed by object id.
+    """
+
+    def __init__(self, parent=None):
+        """
+        Initializes the ObjectListModel.
+
+        Args:
+            parent (QObject, optional): The parent object. Defaults to None.
+        """
+        super(ObjectListModel, self).__init__(parent)
+        self.store = None
+        self.label_list = []
+        self.ids = []
+        self.rows = {}
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.ids)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or self.store is None:
+            return None
+        object_id = self.ids[index.row()]
+        if role == Qt.UserRole:
+            return object_id
+        if role == Qt.DisplayRole:
+            record = self.store.get(object_id)
+            if record is None:
+                return None
+            category_id = record.category_id
+            label = self.label_list[category_id] if 0 <= category_id < len(self.label_list) else str(category_id)
+            return f"{label} ({object_id})"
+        return None
+
+    def set_store(self, store):
+        """
+        Show the objects of a store.
+
+        Args:
+            store (AnnotationStore): The store.
+        """
+        self.beginResetModel()
+        self.store = store
+        self.ids = list(store.objects) if store is not None else []
+        self.index_rows()
+        self.endResetModel()
+
+    def set_label_list(self, label_list):
+        """
+        Change the label names, every row is displayed again.
+
+        Args:
+            label_list (list): The label names, indexed by category id.
+        """
+        self.label_list = list(label_list)
+        if self.ids:
+            self.dataChanged.emit(self.index(0), self.index(len(self.ids) - 1), [Qt.DisplayRole])
+
+    def object_id(self, row):
+        """
+        Get the id of the object of a row.
+
+        Args:
+            row (int): The row.
+
+        Returns:
+            int: The object id.
+        """
+        return self.ids[row]
+
+    def row_of(self, object_id):
+        """
+        Get the row of an object.
+
+        Args:
+            object_id (int): The object id.
+
+        Returns:
+            int: The row, -1 if the object is not listed.
+        """
+        return self.rows.get(object_id, -1)
+
+    def index_rows(self, start=0):
+        """
+        Record the row of every object from a row on, after rows were inserted or removed.
+
+        Args:
+            start (int, optional): The first row that moved. Defaults to 0.
+        """
+        if start == 0:
+            self.rows = {}
+        for row in range(start, len(self.ids)):
+            self.rows[self.ids[row]] = row
+
+    @staticmethod
+    def row_ranges(rows):
+        """
+        Group rows into ranges of consecutive rows.
+
+        Args:
+            rows (list): The rows, sorted.
+
+        Returns:
+            list: The (first, last) row of every range, in order.
+        """
+        ranges = []
+        for row in rows:
+            if ranges and ranges[-1][1] == row - 1:
+                ranges[-1][1] = row
+            else:
+                ranges.append([row, row])
+        return [tuple(rows_range) for rows_range in ranges]
+
+    def apply_change(self, change):
+        """
+        Update the rows of the changed objects of the store. Geometry changes do not change the list.
+
+        Args:
+            change (AnnotationChange): The change sent by the store.
+        """
+        if change.kind == ANNOTATION_CHANGE.RESET:
+            self.beginResetModel()
+            self.ids = list(change.object_ids)
+            self.index_rows()
+            self.endResetModel()
+        elif change.kind == ANNOTATION_CHANGE.ADDED:
+            if self.store is not None and change.object_ids and not self.store.on_top(change.object_ids):
+                # objects put back under others, e.g. by undo, keep their row in drawing order;
+                # the rows are inserted in order, one range of consecutive rows at a time
+                added = set(change.object_ids)
+                ids = [object_id for object_id in self.store.objects if object_id in added or object_id in self.rows]
+                ranges = self.row_ranges([row for row, object_id in enumerate(ids) if object_id in added])
+                for first, last in ranges:
+                    self.beginInsertRows(QModelIndex(), first, last)
+                    self.ids[first:first] = ids[first:last + 1]
+                    self.endInsertRows()
+                if ranges:
+                    self.index_rows(ranges[0][0])
+                return
+            row = len(self.ids)
+            self.beginInsertRows(QModelIndex(), row, row + len(change.object_ids) - 1)
+            self.ids.extend(change.object_ids)
+            self.index_rows(row)
+            self.endInsertRows()
+        elif change.kind == ANNOTATION_CHANGE.REMOVED:
+            rows = sorted(row for row in map(self.row_of, change.object_ids) if row >= 0)
+            if not rows:
+                return
+            # the last range first, so the rows of the other ranges do not move
+            for first, last in reversed(self.row_ranges(rows)):
+                self.beginRemoveRows(QModelIndex(), first, last)
+                del self.ids[first:last + 1]
+                self.endRemoveRows()
+            for object_id in change.object_ids:
+                self.rows.pop(object_id, None)
+            self.index_rows(rows[0])
+        elif change.kind == ANNOTATION_CHANGE.CATEGORY:
+            rows = [row for row in map(self.row_of, change.object_ids) if row >= 0]
+            if rows:
+                # one update for a bulk relabel, the rows in between are only displayed again
+                self.dataChanged.emit(self.index(min(rows)), self.index(max(rows)), [Qt.DisplayRole])
+
+
 class CustomObjectListWidget(QtWidgets.QListView):
     """
-    A custom QListView widget for displaying and managing a list of labels. 
-    Allows adding new labels by double-clicking and supports updating the list 
-    based on an annotation type.
+    A custom QListView widget listing the annotated objects of the image. The rows are read
+    from the annotation store by an ObjectListModel, behind a filter proxy used for search.
 
     Attributes:
-        model (QStringListModel): The data model for storing label names.
+        model (ObjectListModel): The data model of the objects.
+        proxy (QSortFilterProxyModel): The filter of the rows shown in the view.
         label_list (list): A list to store label names displayed in the list view.
-        annotation_type (str): The type of annotation currently being handled.
     """
-    object_list_slot_receiver = pyqtSignal(list, Enum) # Signal to update the label list
     object_selection_notification_slot = pyqtSignal(int) # Signal to update the label list
 
     def __init__(self, parent=None):
         """
-        Initializes the CustomLabelWidget.
+        Initializes the CustomObjectListWidget.
 
         Args:
             parent (QWidget, optional): The parent widget. Defaults to None.
         """
         super(CustomObjectListWidget, self).__init__(parent)
         # Initialize the model and label list
-        self.model = QStringListModel()
+        self.model = ObjectListModel(self)
+        self.proxy = QSortFilterProxyModel(self)
+        self.proxy.setSourceModel(self.model)
+        self.proxy.setFilterCaseSensitivity(Qt.CaseInsensitive)
         # label list is empty
         self.label_list = [] # list of labels Updated by main.py
-        self.category_id = [] # list of category id
-        self.object_id = []
-        self.object = dict()
         # Set the geometry, model
         self.set_geometry()
         self.set_model()
         # handel clicked event
         self.clicked.connect(self.on_item_clicked)
-        self.set_label_list(self.label_list)
-        # Connect the signals
-        self.object_list_slot_receiver.connect(self.__receiver_action) # Connect the signal to update the label list
-        # self.model.dataChanged.connect(self.handle_data_changed)  # Connect the dataChanged signal
 
     def set_geometry(self):
         """
@@ -457,134 +624,56 @@ class CustomObjectListWidget(QtWidgets.QListView):
         Sets the data model for the list view and enables updates.
         """
         # set the model and enable updates
-        self.setModel(self.model)
+        self.setModel(self.proxy)
         self.setUpdatesEnabled(True)
+        # all the rows have the same height, the view does not measure them one by one
+        self.setUniformItemSizes(True)
         # # Set the edit triggers to NoEditTriggers
         self.setEditTriggers(QtWidgets.QListView.NoEditTriggers)
-    
-    def __receiver_action(self, data: any, action: Enum):
-        data = data[0]
-        if action == OBJECT_LIST_ACTION.UPDATE:
-            if isinstance(data, list):
-                category_id = [label["category_id"] for label in data]
-                object_id = [label['id'] for label in data]
-                self.object = {label['id']: label["category_id"] for label in data}
-                self.set_label_list(category_id=category_id, object_id=object_id)
-        elif action == OBJECT_LIST_ACTION.ADD:
-            if isinstance(data, dict):
-                if data['id'] in self.object:
-                    return
-                self.object[data['id']] = data["category_id"]
-                self.add_label(category_id = data["category_id"], object_id = data['id'])
-        elif action == OBJECT_LIST_ACTION.CLEAR:
-            self.clear_list()
-        elif action == OBJECT_LIST_ACTION.REMOVE:
-            # it will also remove the label from label_list and id from object_id_list
-            # and update the new object_list, with new label_list and object_id_list
-            if isinstance(data, list):
-                self.remove_label(data)
-        elif action == OBJECT_LIST_ACTION.EDIT:
-            if isinstance(data, dict):
-                self.edit_label(data['id'], data["category_id"])
-        else:
-            pass
 
-
-    def set_label_list(self, category_id: list = [], object_id: list = []):
+    def set_store(self, store):
         """
-        Updates the list view with a new list of labels.
+        List the objects of an annotation store.
 
         Args:
-            label_list (list, optional): A list of label names to display. Defaults to an empty list.
+            store (AnnotationStore): The store of the canvas.
         """
-        # Check if the label list is a non-empty list
-        # if isinstance(category_id, list) and len(category_id) > 0 and isinstance(object_id, list) and len(object_id) > 0:
-            # Clear the model before updating
-        self.clear_list()
-        # Update the label list and model
-        self.category_id = category_id
-        self.object_id = object_id
-        print(f"Category ID: {category_id}")
-        print(f"Object ID: {object_id}")
-        object_list = [f"{self.label_list[id]} ({self.object_id[idx]})" for idx, id in enumerate(self.category_id)]
-        # update the model
-        self.model.setStringList(object_list)
-        
-    def clear_list(self):
-        """
-        Clears all items from the list view.
-        """
-        # Clear the list and update the model
-        self.object_id.clear()
-        self.category_id.clear()
-        self.object.clear()
-        self.model.setStringList([])
-    
-    def add_label(self, category_id: str, object_id: int):
-        """
-        Adds a new label to the list view.
+        self.model.set_store(store)
 
-        Args:
-            new_label (str): The label to add.
-        """
-        # Add the new label to the list
-        self.object_id.append(object_id)
-        self.category_id.append(category_id)
-        # object_list = [f"{self.label_list[id]}_{object_id[id]}" for id in self.category_id]
-        object_list = [f"{self.label_list[id]} ({self.object_id[idx]})" for idx, id in enumerate(self.category_id)]
-        # Update the model
-        self.model.setStringList(object_list)
-    
-    def remove_label(self, data: list):
+    def apply_change(self, change):
         """
-        Removes a label from the list view.
+        Update the rows of the changed objects of the annotation store.
 
         Args:
-            label (str): The label to remove.
+            change (AnnotationChange): The change sent by the store.
         """
-        print(f"Data To Be remoed: {data}")
-        category_id = [label["category_id"] for label in data]
-        object_id = [label['id'] for label in data]
-        self.object = {label['id']: label['category_id'] for label in data}
-        self.set_label_list(category_id=category_id, object_id=object_id)
+        self.model.apply_change(change)
 
-    def edit_label(self, object_id, category_id):
+    def set_filter_text(self, text: str):
         """
-        Triggers inline editing for the selected item.
+        Show only the objects whose label or id contains a text.
 
         Args:
-            index (QModelIndex): The index of the item to be edited.
+            text (str): The text to search, an empty text shows every object.
         """
-        # index = self.object_id_list.index(object_id)
-        # self.label_list[index] = label
-        if object_id in self.object:
-            index = self.object_id.index(object_id)
-            self.category_id[index] = category_id
-            self.object[object_id] = category_id
-            object_list = [f"{self.label_list[id]} ({self.object_id[idx]})" for idx, id in enumerate(self.category_id)]
-            # object_list = [f"{self.label_list[id]}_{object_id[id]}" for id in self.category_id] 
-            self.model.setStringList(object_list)
-    
+        self.proxy.setFilterFixedString(text)
+
     def refresh_list(self, label_list: list):
         """
         Refresh the list view
         """
         self.label_list = label_list
-        object_list = [f"{self.label_list[id]} ({self.object_id[idx]})" for idx, id in enumerate(self.category_id)]
-        # object_list = [f"{self.label_list[id]}_{id}" for id in self.category_id]
-        self.model.setStringList(object_list)
+        self.model.set_label_list(label_list)
     
     def on_item_clicked(self, index):
         """
-        Emits the signal with the currently selected item's text.
+        Emits the signal with the id of the clicked object.
 
         Args:
             index (QModelIndex): The index of the current item.
         """
-        # Emit the signal with the selected item's text
-        # print(f"Index: {index.row()}")
-        # print(f"Item: {self.model.data(index, Qt.DisplayRole)}")
-        id = self.object_id[index.row()]
+        # the view index is mapped back to the row of the model
+        id = self.model.object_id(self.proxy.mapToSource(index).row())
         self.object_selection_notification_slot.emit(id)
     
     def mousePressEvent(self, event) -> None:
@@ -3,12 +3,17 @@ import os
 from PyQt5 import QtWidgets
 from layout import Ui_MainWindow
 from PyQt5.QtWidgets import QFileDialog, QApplication
+from PyQt5.QtCore import QRect, QTimer
 from labelvim.utils.utils import get_image_list, return_mattching
 from labelvim.utils.annotaion_manager import AnnotationManager
+from labelvim.utils.image_cache import DecodedImageCache, qimage_to_rgb_array
+from labelvim.utils.image_loader import LoadGeneration
+from labelvim.utils.prefetcher import ImagePrefetcher
 from labelvim.utils.lablelist_reader import label_list_reader as label_list_manager
-from labelvim.utils.config import ANNOTATION_TYPE, ANNOTATION_MODE, OBJECT_LIST_ACTION
+from labelvim.utils.config import ANNOTATION_TYPE, ANNOTATION_MODE, CANVAS_ENGINE
 from labelvim.widgets.task_selection import TaskSelectionDialog
 from labelvim.widgets.canvas_widget import CanvasWidget
+from labelvim.widgets.graphics_canvas import GraphicsCanvasWidget
 from labelvim.widgets.list_widgets import CustomListViewWidget, CustomLabelWidget, CustomObjectListWidget
 from labelvim.widgets.export_file import ExportFileDialog
 from labelvim.utils.config import ConfigSpecHandler
@@ -31,6 +36,13 @@ class LabelVim(QtWidgets.QMainWindow, Ui_MainWindow):
         self.label_file_name = 'label.yaml'
         self.save_mask = False
         self.include_img = False
+        self.pyramid_cache = False
+        self.pyramid_cache_mb = 1024 # Disk space of the image pyramids, the least recently used ones are removed beyond it
+        self.undo_budget_mb = 16 # Memory of the undo history of the objects of an image
+        self.canvas_engine = CANVAS_ENGINE.WIDGET # Engine drawing the image and the objects
+        self.prefetch_ahead = 3 # Images read in the background ahead of the navigation
+        self.prefetch_behind = 1 # Images read in the background behind the navigation
+        self.image_cache_mb = 512 # Memory of the decoded images shared by the canvas, the prefetcher and the mask saving
         self.config_file_name = 'config.yaml'
         self.config_manager = None
 
@@ -43,6 +55,18 @@ class LabelVim(QtWidgets.QMainWindow, Ui_MainWindow):
         self.LabelWidget.setObjectName("LabelWidget")
         self.ObjectLabelListWidget = CustomObjectListWidget(self.centralwidget)
         self.ObjectLabelListWidget.setObjectName("ObjectLabelListWidget")
+        self.ObjectLabelListWidget.set_store(self.Display.annotations)
+        self.image_cache = DecodedImageCache(self.image_cache_mb * 1024 * 1024)
+        self.Display.image_cache = self.image_cache
+        self.prefetcher = ImagePrefetcher(self.prefetch_ahead, self.prefetch_behind, self.image_cache, parent=self)
+        self.prefetcher.fit_size = self.Display.size_geometry.size()
+        self.load_generation = LoadGeneration() # Token of the selected image, the annotation is only read for the latest one
+        # search box of the object list, next to its title
+        self.ObjectSearchEdit = QtWidgets.QLineEdit(self.centralwidget)
+        self.ObjectSearchEdit.setObjectName("ObjectSearchEdit")
+        self.ObjectSearchEdit.setGeometry(QRect(1640, 222, 200, 26))
+        self.ObjectSearchEdit.setPlaceholderText("Search objects")
+        self.ObjectSearchEdit.setClearButtonEnabled(True)
 
         # btn action
         self.OpenDirBtn.clicked.connect(self.__load_directory)
@@ -73,6 +97,20 @@ class LabelVim(QtWidgets.QMainWindow, Ui_MainWindow):
         self.actionZoom_Out.triggered.connect(self.__zoom_out)
         self.actionFit_Windows.triggered.connect(self.__zoom_fit)
         self.actionExport.triggered.connect(self.__handel_export)
+        # undo and redo of the edits of the objects
+        self.actionUndo = QtWidgets.QAction("Undo", self)
+        self.actionUndo.setShortcut("Ctrl+Z")
+        self.actionUndo.triggered.connect(self.__undo)
+        self.actionRedo = QtWidgets.QAction("Redo", self)
+        self.actionRedo.setShortcuts(["Ctrl+Shift+Z", "Ctrl+Y"])
+        self.actionRedo.triggered.connect(self.__redo)
+        self.menuEdit.insertAction(self.actionAnnotation_Type, self.actionUndo)
+        self.menuEdit.insertAction(self.actionAnnotation_Type, self.actionRedo)
+        self.actionRelabel_Selection = QtWidgets.QAction("Relabel Selection", self)
+        self.actionRelabel_Selection.setShortcut("Ctrl+L")
+        self.actionRelabel_Selection.triggered.connect(self.__relabel_selection)
+        self.menuEdit.insertAction(self.actionAnnotation_Type, self.actionRelabel_Selection)
+        self.menuEdit.insertSeparator(self.actionAnnotation_Type)
         # self.actionAnnotation_Type.triggered.connect(self.show_task_selection_dialog)
 
         self.show()
@@ -84,11 +122,9 @@ class LabelVim(QtWidgets.QMainWindow, Ui_MainWindow):
         # Connect signals and slots
         self.FileListWidget.notify_selected_item.connect(self.__load_image)
         self.Display.update_label_list_slot_receiver.emit(self.LabelWidget.label_list)
-        self.Display.update_label_list_slot_transmitter.connect(self.update_label_list_to_Label_Widget)
-        self.Display.scale_factor_slot.connect(self.update_zoom_label)
-        self.Display.object_list_action_slot.connect(self.update_data_to_ObjectListWidget)
+        self.__connect_display()
+        self.ObjectSearchEdit.textChanged.connect(self.ObjectLabelListWidget.set_filter_text)
         self.LabelWidget.update_label_list_slot_transmitter.connect(self.update_label_list_to_Display)
-        self.ObjectLabelListWidget.object_selection_notification_slot.connect(self.Display.object_selection_notification_slot_receiver)
         
         self.json_writer = None
         #
@@ -135,14 +171,37 @@ class LabelVim(QtWidgets.QMainWindow, Ui_MainWindow):
         called when the user selects an image file from the list widget in FileListWidget.
         """
         self.current_index = index
+        token = self.load_generation.next()
+        # nothing is saved into the annotation of the previous image while the new one is read
+        self.annotaion_manager = None
         if self.current_index < 0:
-            self.annotaion_manager = None
             self.__disable_btn_at_start()
             self.Display.reset()
             return
         print(f"current index: {self.current_index}")
         print(f"file name: {file_name}")
+        # the annotation may have been read in the background already, it is taken
+        # before the prefetch window moves on and drops it
+        annotation = self.prefetcher.take_annotation(file_name, self.__annotation_file(file_name))
+        # the pixels are decoded in the background, the jobs of the images passed before are dropped
         self.Display.load_image(file_name)
+        self.prefetcher.prefetch(self.img_file_list, self.current_index, self.__annotation_file)
+        # holding Next or scrolling the list selects many rows in a row, the annotation
+        # is read once the queued events are handled, for the last selected row only
+        QTimer.singleShot(0, lambda: self.__load_annotation(file_name, token, annotation))
+
+    def __load_annotation(self, file_name, token, annotation=None):
+        """
+        Read the annotation of the selected image and send it to the display. It is skipped
+        if another image was selected since.
+
+        Args:
+            file_name (str): The path of the image file.
+            token (int): The token of the selection.
+            annotation (dict, optional): The annotation data read by the prefetcher. Defaults to None.
+        """
+        if not self.load_generation.is_current(token):
+            return
         if self.save_dir:
             f_name = os.path.splitext(os.path.split(file_name)[-1])[0]
             print("==============================")
@@ -151,7 +210,7 @@ class LabelVim(QtWidgets.QMainWindow, Ui_MainWindow):
             if f_name in self.json_list:
                 print(f"JSON file found for {f_name}")
                 print(f"JSON file found for {file_name}")
-                self.annotaion_manager = AnnotationManager(self.save_dir, f_name + '.json')
+                self.annotaion_manager = AnnotationManager(self.save_dir, f_name + '.json', annotation)
                 self.annotaion_data = self.annotaion_manager.annotation
                 self.Display.annotation_data_slot_receiver.emit(self.annotaion_data['annotations'])
                 self.SaveBtn.setEnabled(True)
@@ -167,6 +226,21 @@ class LabelVim(QtWidgets.QMainWindow, Ui_MainWindow):
                 self.ClearAnnotationBtn.setEnabled(False)
                 self.actionSave.setEnabled(False)
 
+    def __annotation_file(self, file_name):
+        """
+        Get the path of the annotation file of an image.
+
+        Args:
+            file_name (str): The path of the image file.
+
+        Returns:
+            str: The path of the JSON file in the save directory, None if the image has no annotation yet.
+        """
+        f_name = os.path.splitext(os.path.split(file_name)[-1])[0]
+        if self.save_dir and f_name in self.json_list:
+            return os.path.join(self.save_dir, f_name + '.json')
+        return None
+
     def __save_directory(self):
         """
         Opens a dialog to select a save directory, loads JSON files from the directory,
@@ -183,6 +257,13 @@ class LabelVim(QtWidgets.QMainWindow, Ui_MainWindow):
                 self.config_parm['annotation_type'] = self.annotation_type.value
                 self.config_parm['save_mask'] = self.save_mask
                 self.config_parm['include_img'] = self.include_img
+                self.config_parm['pyramid_cache'] = self.pyramid_cache
+                self.config_parm['pyramid_cache_mb'] = self.pyramid_cache_mb
+                self.config_parm['undo_budget_mb'] = self.undo_budget_mb
+                self.config_parm['canvas_engine'] = self.canvas_engine.value
+                self.config_parm['prefetch_ahead'] = self.prefetch_ahead
+                self.config_parm['prefetch_behind'] = self.prefetch_behind
+                self.config_parm['image_cache_mb'] = self.image_cache_mb
                 self.config_manager.update_config(self.config_parm)
             else:
                 self.config_file_name = 'config.yaml'
@@ -215,7 +296,49 @@ class LabelVim(QtWidgets.QMainWindow, Ui_MainWindow):
                     self.include_img = False
                 self.config_parm['include_img'] = self.include_img
                 self.__change_icon_save_mask_include_img()
+                if 'pyramid_cache' in self.config_parm.keys():
+                    self.pyramid_cache = self.config_parm['pyramid_cache']
+                else:
+                    self.pyramid_cache = False
+                self.config_parm['pyramid_cache'] = self.pyramid_cache
+                if 'pyramid_cache_mb' in self.config_parm.keys():
+                    self.pyramid_cache_mb = self.config_parm['pyramid_cache_mb']
+                else:
+                    self.pyramid_cache_mb = 1024
+                self.config_parm['pyramid_cache_mb'] = self.pyramid_cache_mb
+                if 'undo_budget_mb' in self.config_parm.keys():
+                    self.undo_budget_mb = self.config_parm['undo_budget_mb']
+                else:
+                    self.undo_budget_mb = 16
+                self.config_parm['undo_budget_mb'] = self.undo_budget_mb
+                if 'canvas_engine' in self.config_parm.keys():
+                    self.__set_canvas_engine(CANVAS_ENGINE(self.config_parm['canvas_engine']))
+                else:
+                    self.__set_canvas_engine(CANVAS_ENGINE.WIDGET)
+                self.config_parm['canvas_engine'] = self.canvas_engine.value
+                if 'prefetch_ahead' in self.config_parm.keys():
+                    self.prefetch_ahead = self.config_parm['prefetch_ahead']
+                else:
+                    self.prefetch_ahead = 3
+                self.config_parm['prefetch_ahead'] = self.prefetch_ahead
+                if 'prefetch_behind' in self.config_parm.keys():
+                    self.prefetch_behind = self.config_parm['prefetch_behind']
+                else:
+                    self.prefetch_behind = 1
+                self.config_parm['prefetch_behind'] = self.prefetch_behind
+                if 'image_cache_mb' in self.config_parm.keys():
+                    self.image_cache_mb = self.config_parm['image_cache_mb']
+                else:
+                    self.image_cache_mb = 512
+                self.config_parm['image_cache_mb'] = self.image_cache_mb
                 self.config_manager.update_config(self.config_parm)
+            self.prefetcher.ahead = self.prefetch_ahead
+            self.prefetcher.behind = self.prefetch_behind
+            self.image_cache.set_budget(int(self.image_cache_mb * 1024 * 1024))
+            self.Display.edit_journal.set_budget(int(self.undo_budget_mb * 1024 * 1024))
+            # image pyramids of large images are kept next to the annotations when enabled
+            self.Display.pyramid_cache_dir = os.path.join(self.save_dir, '.pyramid_cache') if self.pyramid_cache else None
+            self.Display.pyramid_cache_budget = int(self.pyramid_cache_mb * 1024 * 1024)
                 
             self.LabelWidget.update_annotation_type(self.annotation_type)
             print(f"Save Directory: {self.save_dir}")
@@ -311,10 +434,9 @@ class LabelVim(QtWidgets.QMainWindow, Ui_MainWindow):
             self.annotaion_manager.update_annotation(annotation_data)
             self.annotaion_manager.save_annotation()
             if self.save_mask:
-                import cv2
                 # if self.include_img:
-                image_data = cv2.imread(os.path.join(self.load_dir, self.img_file_list[self.current_index]))
-                image_data = cv2.cvtColor(image_data, cv2.COLOR_BGR2RGB)
+                # the displayed image is still decoded in the shared cache, under the path the canvas loaded it from
+                image_data = qimage_to_rgb_array(self.image_cache.load(self.img_file_list[self.current_index]))
                 # else:
                 #     image_data = None
                 if self.annotation_type == ANNOTATION_TYPE.BBOX:
@@ -339,10 +461,14 @@ class LabelVim(QtWidgets.QMainWindow, Ui_MainWindow):
         annotation data if a JSON file is found for the current image.
         """
         # Move to the next index in the file list
+        previous_index = self.current_index
         self.FileListWidget.next_index()
         self.current_index = self.FileListWidget.get_current_index()
         print("========Next Button Clicked========")
         print(f"Current index: {self.current_index}")
+        if self.current_index != previous_index:
+            # the image and its annotation were loaded by __load_image when the selection moved
+            return
         
         # Validate the current index
         if 0 <= self.current_index < len(self.img_list):
@@ -380,12 +506,16 @@ class LabelVim(QtWidgets.QMainWindow, Ui_MainWindow):
         annotation data if a JSON file is found for the current image.
         """
         # Move to the previous index in the file list
+        previous_index = self.current_index
         self.FileListWidget.previous_index()
         self.current_index = self.FileListWidget.get_current_index()
         print("========Previous Button Clicked========")
 
         
         print(f"Current index: {self.current_index}")
+        if self.current_index != previous_index:
+            # the image and its annotation were loaded by __load_image when the selection moved
+            return
         
         # Validate the current index
         if 0 <= self.current_index < len(self.img_list):
@@ -436,8 +566,8 @@ class LabelVim(QtWidgets.QMainWindow, Ui_MainWindow):
                 self.annotaion_manager = AnnotationManager(self.save_dir, current_image + '.json')
                 self.annotaion_manager.update_basic_info(
                     os.path.basename(self.img_file_list[self.current_index]),
-                    self.Display.original_pixmap.height(),
-                    self.Display.original_pixmap.width()
+                    self.Display.image_size.height(),
+                    self.Display.image_size.width()
                 )
                 self.annotaion_data = self.annotaion_manager.annotation
             
@@ -482,6 +612,60 @@ class LabelVim(QtWidgets.QMainWindow, Ui_MainWindow):
     def __zoom_fit(self):
         self.Display.fit_to_window()
 
+    def __undo(self):
+        self.Display.undo()
+
+    def __redo(self):
+        self.Display.redo()
+
+    def __relabel_selection(self):
+        self.Display.relabel_selected_objects()
+
+    def __connect_display(self):
+        """
+        Connect the signals of the canvas to the other widgets.
+        """
+        self.Display.update_label_list_slot_transmitter.connect(self.update_label_list_to_Label_Widget)
+        self.Display.scale_factor_slot.connect(self.update_zoom_label)
+        self.Display.annotation_changed.connect(self.ObjectLabelListWidget.apply_change)
+        self.ObjectLabelListWidget.object_selection_notification_slot.connect(self.Display.object_selection_notification_slot_receiver)
+
+    def __set_canvas_engine(self, engine):
+        """
+        Replace the canvas by the one of another engine. Both engines have the same signals and
+        methods; the displayed image is loaded again on the new canvas.
+
+        Args:
+            engine (CANVAS_ENGINE): The engine to draw the image and the objects with.
+        """
+        if engine == self.canvas_engine:
+            return
+        print(f"Canvas Engine: {engine}")
+        self.canvas_engine = engine
+        # the widget canvas is shown through its scroll area
+        old_display = self.Display
+        self.ObjectLabelListWidget.object_selection_notification_slot.disconnect(old_display.object_selection_notification_slot_receiver)
+        container = old_display.scroll_area if isinstance(old_display, CanvasWidget) else old_display
+        container.hide()
+        container.deleteLater()
+        if engine == CANVAS_ENGINE.GRAPHICS_SCENE:
+            self.Display = GraphicsCanvasWidget(self.centralwidget)
+            self.Display.show()
+        else:
+            self.Display = CanvasWidget(self.centralwidget)
+            self.Display.scroll_area.show()
+        self.Display.setObjectName("Display")
+        self.ObjectLabelListWidget.set_store(self.Display.annotations)
+        self.__connect_display()
+        self.Display.edit_journal.set_budget(old_display.edit_journal.budget)
+        self.Display.pyramid_cache_dir = old_display.pyramid_cache_dir
+        self.Display.pyramid_cache_budget = old_display.pyramid_cache_budget
+        self.Display.image_cache = old_display.image_cache
+        self.Display.update_annotation_type(self.annotation_type)
+        self.Display.update_label_list_slot_receiver.emit(self.LabelWidget.label_list)
+        if 0 <= self.current_index < len(self.img_file_list):
+            self.Display.load_image(self.img_file_list[self.current_index])
+
     def update_zoom_label(self, scale_factor):
         self.ZoomLabel.setText(f"{scale_factor*100:.2f}%")
 
@@ -566,11 +750,6 @@ class LabelVim(QtWidgets.QMainWindow, Ui_MainWindow):
         self.ObjectLabelListWidget.refresh_list(label_list) # Update the label list in the object list widget
         # self.ObjectLabelListWidget.label_list = label_list # Update the label list in the object list widget
     
-    def update_data_to_ObjectListWidget(self, data, action):
-        # print(f"update_data_to_ObjectListWidget: {data}")
-        # print(f"update_data_to_ObjectListWidget: {action}")
-        self.ObjectLabelListWidget.object_list_slot_receiver.emit(data, action)
-    
     def __save_mask_flag_set(self):
         self.save_mask = not self.save_mask
         print(f"Save Mask: {self.save_mask}")
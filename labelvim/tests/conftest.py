@@ -0,0 +1,22 @@
+"""
+Shared setup of the tests. The Qt widgets run on the offscreen platform, so the tests do not need a display.
+
+Usage:
+    python -m pytest -q tests
+"""
+import os
+import sys
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir)))
+
+import pytest
+from PyQt5.QtWidgets import QApplication
+
+
+@pytest.fixture(scope='session')
+def app():
+    """
+    The QApplication shared by the tests.
+    """
+    application = QApplication.instance() or QApplication([])
+    yield application
@@ -0,0 +1,111 @@
+"""
+The array-backed annotation store: round trip of the saved json, edits of the coordinate buffer and change events.
+"""
+import contextlib
+import io
+from labelvim.utils.annotation_store import AnnotationStore
+from labelvim.utils.config import ANNOTATION_CHANGE
+
+
+def coco(object_id, category_id, bbox, *polygons):
+    return {"id": object_id, "category_id": category_id, "bbox": list(bbox), "segmentation": [list(p) for p in polygons]}
+
+
+def square(x, y, size=10):
+    return [x, y, x + size, y, x + size, y + size, x, y + size]
+
+
+def test_coco_round_trip():
+    annotations = [coco(0, 1, [0, 0, 10, 10], square(0, 0)),
+                   coco(4, 0, [20, 20, 10, 10], square(20, 20), square(25, 25, 5)),
+                   coco(2, 2, [5, 5, 3, 4])]
+    store = AnnotationStore()
+    store.load_coco(annotations)
+    assert list(store.objects) == [0, 4, 2]
+    saved = store.to_coco()
+    assert [a["segmentation"] for a in saved] == [a["segmentation"] for a in annotations]
+    assert [a["area"] for a in saved] == [100, 125, 12]
+    # a new object takes the id after the largest one
+    assert store.add(0, [0, 0, 1, 1]).id == 5
+
+
+def test_duplicate_ids_are_renumbered():
+    store = AnnotationStore()
+    with contextlib.redirect_stdout(io.StringIO()) as output:
+        store.load_coco([coco(3, 0, [0, 0, 10, 10], square(0, 0)),
+                         coco(3, 1, [20, 20, 10, 10], square(20, 20)),
+                         coco(1, 2, [40, 40, 10, 10], square(40, 40))])
+    assert "Duplicate annotation id 3" in output.getvalue()
+    assert list(store.objects) == [3, 4, 1]
+    assert [record.category_id for record in store] == [0, 1, 2]
+    assert store.polygon(store.get(4), 0).ravel().tolist() == square(20, 20)
+    assert store.new_id() == 5
+
+
+def test_ids_stay_stable_on_remove():
+    store = AnnotationStore()
+    ids = [store.add(0, [0, 0, 1, 1], [[(0, 0), (1, 0), (1, 1)]]).id for _ in range(4)]
+    store.remove(ids[1])
+    assert list(store.objects) == [ids[0], ids[2], ids[3]]
+    assert store.add(0, [0, 0, 1, 1]).id == 4
+    assert store.position(ids[3]) == 2
+    assert store.position(ids[1]) == -1
+
+
+def test_bbox_follows_vertex_edits():
+    store = AnnotationStore()
+    record = store.add(0, [0, 0, 10, 10], [[(0, 0), (10, 0), (10, 10), (0, 10)]])
+    store.set_vertex(record, 0, 2, 30, 20)
+    store.update_bbox(record)
+    # the box holds the last pixel, like the bounding rect of a QPolygon
+    assert record.bbox == [0, 0, 31, 21]
+    # the vertex on the bounds moves back inside them, the polygon is scanned again
+    store.set_vertex(record, 0, 2, 5, 5)
+    store.update_bbox(record)
+    assert record.bbox == [0, 0, 11, 11]
+    store.translate_polygon(record, 0, 5, 7)
+    store.update_bbox(record)
+    assert record.bbox == [5, 7, 11, 11]
+
+
+def test_buffer_is_compacted():
+    store = AnnotationStore(capacity=8)
+    records = [store.add(0, [0, 0, 10, 10], [[(i, 0), (i + 10, 0), (i + 10, 10)]]) for i in range(100)]
+    store.remove_objects([record.id for record in records[:80]])
+    assert store.size - store.garbage == 20 * 3
+    assert [store.polygon(record, 0)[0].tolist() for record in records[80:]] == [[i, 0] for i in range(80, 100)]
+
+
+def test_changes_are_sent_to_listeners():
+    store = AnnotationStore()
+    changes = []
+    store.subscribe(changes.append)
+    first = store.add(0, [0, 0, 1, 1])
+    second = store.add(0, [0, 0, 1, 1])
+    store.set_categories([first, second], 2)
+    store.remove_objects([first.id, second.id])
+    assert [(change.kind, change.object_ids) for change in changes] == [
+        (ANNOTATION_CHANGE.ADDED, [first.id]),
+        (ANNOTATION_CHANGE.ADDED, [second.id]),
+        (ANNOTATION_CHANGE.CATEGORY, [first.id, second.id]),
+        (ANNOTATION_CHANGE.REMOVED, [first.id, second.id]),
+    ]
+
+
+def test_restore_objects_in_one_change():
+    store = AnnotationStore()
+    for i in range(8):
+        store.add(i % 2, [i, 0, 10, 10], [[(i, 0), (i + 10, 0), (i + 10, 10)]])
+    before = store.to_coco()
+    removed = [0, 3, 4, 7]
+    saved = [(store.position(object_id), object_id, store.get(object_id).category_id, store.get(object_id).bbox,
+              [store.polygon(store.get(object_id), 0).copy()]) for object_id in removed]
+    store.remove_objects(removed)
+    changes = []
+    store.subscribe(changes.append)
+    store.restore_objects(saved)
+    assert [(change.kind, change.object_ids) for change in changes] == [(ANNOTATION_CHANGE.ADDED, removed)]
+    assert store.to_coco() == before
+    # the restored objects are not all on top, the top one alone is
+    assert not store.on_top(removed)
+    assert store.on_top([7]) and store.on_top([6, 7])
@@ -0,0 +1,103 @@
+"""
+The canvas engines only repaint when something changes: an idle canvas paints no frame.
+"""
+import contextlib
+import io
+import time
+import pytest
+from PyQt5.QtCore import QEvent, QObject
+from PyQt5.QtGui import QColor, QImage
+from PyQt5.QtWidgets import QWidget
+from labelvim.utils.config import ANNOTATION_TYPE, ANNOTATION_MODE
+from labelvim.widgets.canvas_widget import CanvasWidget
+from labelvim.widgets.graphics_canvas import GraphicsCanvasWidget
+
+
+class PaintCounter(QObject):
+    """
+    Event filter counting the paint events of a widget.
+    """
+
+    def __init__(self):
+        super(PaintCounter, self).__init__()
+        self.count = 0
+
+    def eventFilter(self, obj, event):
+        if event.type() == QEvent.Paint:
+            self.count += 1
+        return False
+
+
+def process_events(app, seconds):
+    """
+    Run the event loop for a while.
+    """
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        app.processEvents()
+        time.sleep(0.001)
+
+
+def wait_for_background(app, canvas, timeout=10):
+    """
+    Process events until the image is decoded and the image pyramid and the idle smooth repaint are done.
+    """
+    deadline = time.perf_counter() + timeout
+    while (canvas.image_loader is not None or canvas.pyramid_builder is not None
+           or canvas.smooth_zoom_timer.isActive()) and time.perf_counter() < deadline:
+        app.processEvents()
+
+
+@pytest.fixture(params=[CanvasWidget, GraphicsCanvasWidget], ids=['widget', 'graphics'])
+def canvas(request, app, tmp_path):
+    """
+    A shown canvas of each engine with an image and a few boxes, once its background work is done.
+
+    Returns:
+        tuple: The canvas and the widget it paints on.
+    """
+    image = QImage(1600, 1200, QImage.Format_RGB32)
+    image.fill(QColor(40, 70, 100))
+    file_name = str(tmp_path / 'image.png')
+    image.save(file_name)
+    root = QWidget()
+    root.resize(1000, 700)
+    canvas = request.param(root)
+    # the graphics view paints on its viewport
+    surface = canvas.viewport() if isinstance(canvas, GraphicsCanvasWidget) else canvas
+    annotations = [{"id": i, "category_id": i % 2, "bbox": [40 + 60 * i, 50, 50, 40], "segmentation": []}
+                   for i in range(10)]
+    # the canvas reports its progress with print
+    with contextlib.redirect_stdout(io.StringIO()):
+        canvas.update_annotation_type(ANNOTATION_TYPE.BBOX)
+        canvas.update_label_list(['a', 'b'])
+        root.show()
+        canvas.load_image(file_name)
+        wait_for_background(app, canvas)
+        canvas.update_annotation_from_json(annotations)
+        canvas.set_annotation_mode(ANNOTATION_MODE.EDIT)
+        process_events(app, 0.2)
+    yield canvas, surface
+    root.close()
+    root.deleteLater()
+    app.processEvents()
+
+
+def test_idle_canvas_paints_no_frame(app, canvas):
+    canvas, surface = canvas
+    counter = PaintCounter()
+    surface.installEventFilter(counter)
+    process_events(app, 1.0)
+    surface.removeEventFilter(counter)
+    assert counter.count == 0, f"the idle canvas painted {counter.count} frames per second"
+
+
+def test_edit_repaints_canvas(app, canvas):
+    canvas, surface = canvas
+    counter = PaintCounter()
+    surface.installEventFilter(counter)
+    with contextlib.redirect_stdout(io.StringIO()):
+        canvas.update_annotation_from_json([{"id": 0, "category_id": 0, "bbox": [10, 10, 80, 60], "segmentation": []}])
+        process_events(app, 0.2)
+    surface.removeEventFilter(counter)
+    assert counter.count > 0
@@ -0,0 +1,96 @@
+"""
+The undo and redo journal of the edits of an annotation store.
+"""
+from labelvim.utils.annotation_store import AnnotationStore
+from labelvim.utils.edit_journal import (COMMAND_BYTES, EditJournal, ObjectAdded, ObjectRemoved, ObjectsRemoved,
+                                         ObjectsTranslated, VertexMoved)
+
+
+def polygon(x, y, count=64):
+    return [(x + i, y + i % 2) for i in range(count)]
+
+
+def snapshot(store):
+    return [(a["id"], a["category_id"], a["bbox"], a["segmentation"]) for a in store.to_coco()]
+
+
+def add_object(store, journal, x=0, y=0):
+    record = store.add(0, [x, y, 64, 2], [polygon(x, y)])
+    store.update_bbox(record)
+    journal.record(ObjectAdded(store, record))
+    journal.seal()
+    return record
+
+
+def test_drag_steps_merge_into_one_edit():
+    store = AnnotationStore()
+    journal = EditJournal()
+    record = add_object(store, journal)
+    before = snapshot(store)
+    for step in range(1, 6):
+        old = store.polygon(record, 0)[3].tolist()
+        old_bbox = list(record.bbox)
+        store.set_vertex(record, 0, 3, 100 + step, 50 + step)
+        store.update_bbox(record)
+        journal.record(VertexMoved(record.id, old_bbox, 0, 3, old, (100 + step, 50 + step)))
+    journal.seal()
+    assert len(journal) == 2
+    moved = snapshot(store)
+    journal.undo(store)
+    assert snapshot(store) == before
+    journal.redo(store)
+    assert snapshot(store) == moved
+
+
+def test_removed_object_goes_back_to_its_place():
+    store = AnnotationStore()
+    journal = EditJournal()
+    records = [add_object(store, journal, 10 * i) for i in range(4)]
+    before = snapshot(store)
+    journal.record(ObjectRemoved(store, records[1]))
+    store.remove(records[1].id)
+    journal.undo(store)
+    assert snapshot(store) == before
+
+
+def test_group_edits():
+    store = AnnotationStore()
+    journal = EditJournal()
+    records = [add_object(store, journal, 10 * i) for i in range(10)]
+    before = snapshot(store)
+    moved = [record.id for record in records[::3]]
+    for _ in range(3):
+        store.translate_objects([store.get(object_id) for object_id in moved], 5, 1)
+        journal.record(ObjectsTranslated(moved, 5, 1))
+    journal.seal()
+    removed = [store.get(object_id) for object_id in (0, 5, 6, 9)]
+    journal.record(ObjectsRemoved(store, removed))
+    store.remove_objects([record.id for record in removed])
+    after = snapshot(store)
+    journal.undo(store)
+    journal.undo(store)
+    assert snapshot(store) == before
+    journal.redo(store)
+    journal.redo(store)
+    assert snapshot(store) == after
+
+
+def test_history_stays_within_its_budget():
+    store = AnnotationStore()
+    size = COMMAND_BYTES + len(polygon(0, 0)) * 2 * 4
+    journal = EditJournal(budget=5 * size)
+    for i in range(20):
+        add_object(store, journal, i)
+        assert journal.nbytes <= journal.budget
+    assert len(journal) == 5
+    # the undone edits count in the budget too, the next one to redo is kept
+    for _ in range(5):
+        journal.undo(store)
+    journal.set_budget(2 * size)
+    assert journal.nbytes <= journal.budget
+    assert len(journal.redo_stack) == 2
+    assert journal.redo(store).object_id == 15
+    # the last edit is kept even when it alone is over the budget
+    journal.set_budget(1)
+    assert len(journal) == 1 and not journal.redo_stack
+    assert journal.undo(store).object_id == 15
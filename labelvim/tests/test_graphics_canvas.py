@@ -0,0 +1,31 @@
+"""
+The QGraphicsScene canvas engine.
+"""
+import contextlib
+import io
+from PyQt5.QtWidgets import QGraphicsScene
+from labelvim.utils.config import ANNOTATION_TYPE
+from labelvim.widgets.canvas_base import CanvasBase
+from labelvim.widgets.canvas_widget import CanvasWidget
+from labelvim.widgets.graphics_canvas import AnnotationItem, GraphicsCanvasWidget
+
+
+def test_items_follow_the_store(app):
+    canvas = GraphicsCanvasWidget()
+    # the view keeps the scene() method of QGraphicsView
+    assert isinstance(canvas.scene(), QGraphicsScene)
+    with contextlib.redirect_stdout(io.StringIO()):
+        canvas.update_annotation_type(ANNOTATION_TYPE.BBOX)
+        canvas.update_annotation_from_json([{"id": i, "category_id": 0, "bbox": [10 * i, 0, 8, 8], "segmentation": []}
+                                            for i in range(5)])
+    assert sorted(item.object_id for item in canvas.scene().items() if isinstance(item, AnnotationItem)) == list(range(5))
+    canvas.annotations.remove_objects([1, 3])
+    assert sorted(item.object_id for item in canvas.scene().items()) == [0, 2, 4]
+    canvas.deleteLater()
+
+
+def test_engines_share_the_canvas_base():
+    # the drawing and selection code is inherited, not copied from the other engine
+    assert issubclass(CanvasWidget, CanvasBase) and issubclass(GraphicsCanvasWidget, CanvasBase)
+    assert GraphicsCanvasWidget.draw_object is CanvasBase.draw_object
+    assert not issubclass(GraphicsCanvasWidget, CanvasWidget)
@@ -0,0 +1,56 @@
+"""
+The image pyramid levels and their on-disk cache.
+"""
+import os
+import time
+from PyQt5.QtGui import QColor, QImage
+from labelvim.utils.image_pyramid import PyramidBuilder, pyramid_cache_key, trim_pyramid_cache
+
+
+def make_image(directory, name, shade):
+    image = QImage(1024, 768, QImage.Format_RGB32)
+    image.fill(QColor(shade, 80, 120))
+    file_name = os.path.join(directory, name)
+    image.save(file_name)
+    return file_name, image
+
+
+def test_levels_halve_the_image(app):
+    levels = PyramidBuilder('unused', QImage(1024, 768, QImage.Format_RGB32), min_size=256).build_levels()
+    assert [(level.width(), level.height()) for level in levels] == [(512, 384), (256, 192)]
+
+
+def test_cache_keeps_the_recently_used_pyramids(app, tmp_path):
+    cache_dir = str(tmp_path / 'cache')
+    images = [make_image(str(tmp_path), f'{i}.png', 40 * i) for i in range(4)]
+    for file_name, image in images[:3]:
+        PyramidBuilder(file_name, image, cache_dir).run()
+        time.sleep(0.02) # distinct modification times
+    size = trim_pyramid_cache(cache_dir, 0)
+    # reading a pyramid back marks it as used
+    levels = []
+    builder = PyramidBuilder(images[0][0], images[0][1], cache_dir, cache_budget=size)
+    builder.signals.finished.connect(lambda file_name, built, token: levels.extend(built))
+    builder.run()
+    assert [level.width() for level in levels] == [512, 256]
+    time.sleep(0.02)
+    PyramidBuilder(images[3][0], images[3][1], cache_dir, cache_budget=size).run()
+    cached = {pyramid_cache_key(file_name): i for i, (file_name, _) in enumerate(images)}
+    assert sorted(cached[key] for key in os.listdir(cache_dir)) == [0, 2, 3]
+    assert trim_pyramid_cache(cache_dir, 0) <= size
+
+
+def test_corrupt_cache_entry_is_rebuilt(app, tmp_path):
+    cache_dir = str(tmp_path / 'cache')
+    file_name, image = make_image(str(tmp_path), 'image.png', 40)
+    PyramidBuilder(file_name, image, cache_dir).run()
+    index_file = os.path.join(cache_dir, pyramid_cache_key(file_name), 'levels.txt')
+    with open(index_file, 'w') as file:
+        file.write('not a count')
+    levels = []
+    builder = PyramidBuilder(file_name, image, cache_dir)
+    builder.signals.finished.connect(lambda file_name, built, token: levels.extend(built))
+    builder.run()
+    assert [level.width() for level in levels] == [512, 256]
+    with open(index_file) as file:
+        assert file.read() == '2'
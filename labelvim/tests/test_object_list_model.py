@@ -0,0 +1,65 @@
+"""
+The object list model follows the change events of the annotation store, one range of rows at a time.
+"""
+from PyQt5.QtCore import Qt
+from PyQt5.QtTest import QAbstractItemModelTester
+from labelvim.utils.annotation_store import AnnotationStore
+from labelvim.widgets.list_widgets import ObjectListModel
+
+
+def make_model(count):
+    store = AnnotationStore()
+    for i in range(count):
+        store.add(i % 3, [i, i, 10, 10])
+    model = ObjectListModel()
+    model.set_label_list(['a', 'b', 'c'])
+    model.set_store(store)
+    store.subscribe(model.apply_change)
+    # checks the consistency of every signal of the model
+    tester = QAbstractItemModelTester(model, QAbstractItemModelTester.FailureReportingMode.Fatal)
+    return store, model, tester
+
+
+def listed(model):
+    return [model.data(model.index(row), Qt.UserRole) for row in range(model.rowCount())]
+
+
+def test_row_ranges():
+    assert ObjectListModel.row_ranges([]) == []
+    assert ObjectListModel.row_ranges([1, 2, 3, 7, 9, 10]) == [(1, 3), (7, 7), (9, 10)]
+
+
+def test_bulk_remove_by_ranges(app):
+    store, model, tester = make_model(12)
+    removed = []
+    model.rowsRemoved.connect(lambda parent, first, last: removed.append((first, last)))
+    store.remove_objects([1, 2, 3, 7, 8, 11])
+    assert removed == [(11, 11), (7, 8), (1, 3)]
+    assert listed(model) == list(store.objects) == [0, 4, 5, 6, 9, 10]
+    assert [model.row_of(object_id) for object_id in store.objects] == list(range(6))
+    assert model.row_of(7) == -1
+
+
+def test_objects_put_back_keep_their_rows(app):
+    store, model, tester = make_model(10)
+    records = [store.get(object_id) for object_id in (0, 4, 5, 9)]
+    saved = [(store.position(record.id), record.id, record.category_id, record.bbox, []) for record in records]
+    store.remove_objects([record.id for record in records])
+    inserted = []
+    model.rowsInserted.connect(lambda parent, first, last: inserted.append((first, last)))
+    store.restore_objects(saved)
+    assert inserted == [(0, 0), (4, 5), (9, 9)]
+    assert listed(model) == list(store.objects) == list(range(10))
+    assert [model.row_of(object_id) for object_id in range(10)] == list(range(10))
+    # a new object goes on top
+    store.add(0, [0, 0, 1, 1])
+    assert listed(model) == list(range(11))
+
+
+def test_bulk_relabel_is_one_update(app):
+    store, model, tester = make_model(10)
+    changed = []
+    model.dataChanged.connect(lambda top_left, bottom_right, roles: changed.append((top_left.row(), bottom_right.row())))
+    store.set_categories([store.get(object_id) for object_id in (2, 3, 6)], 1)
+    assert changed == [(2, 6)]
+    assert model.data(model.index(3)).startswith('b')
@@ -0,0 +1,90 @@
+"""
+Hit-testing with the grid spatial index, and keeping it in sync with the edits of the canvas.
+"""
+import contextlib
+import io
+from PyQt5.QtCore import QPoint
+from labelvim.utils.config import ANNOTATION_TYPE, ANNOTATION_MODE
+from labelvim.utils.spatial_index import GridIndex, SpatialIndex
+from labelvim.widgets.canvas_widget import CanvasWidget
+
+SQUARE = [(0, 0), (100, 0), (100, 100), (0, 100)]
+
+
+def shifted(points, dx, dy):
+    return [(x + dx, y + dy) for x, y in points]
+
+
+def test_grid_query_and_large_rectangles():
+    grid = GridIndex(cell_size=10, max_cells=4)
+    grid.insert('small', (0, 0, 5, 5))
+    grid.insert('large', (0, 0, 1000, 1000))
+    assert grid.query(1, 1, 2, 2) == {'small', 'large'}
+    assert grid.query(500, 500, 501, 501) == {'large'}
+    grid.insert('small', (50, 50, 55, 55))
+    assert grid.query(1, 1, 2, 2) == {'large'}
+    grid.remove('large')
+    assert grid.query(0, 0, 1000, 1000) == {'small'}
+    assert len(grid) == 1
+
+
+def test_objects_topmost_first():
+    index = SpatialIndex()
+    index.insert_object(1, [0, 0, 100, 100], [SQUARE])
+    index.insert_object(2, [50, 50, 100, 100], [shifted(SQUARE, 50, 50)])
+    assert index.objects_at(75, 75) == [2, 1]
+    assert index.objects_in_rect(0, 0, 60, 60) == [1, 2]
+    assert index.objects_within(-1, -1, 101, 101) == [1]
+    # a replaced object keeps its drawing order
+    index.insert_object(1, [50, 50, 100, 100], [shifted(SQUARE, 50, 50)])
+    assert index.objects_at(75, 75) == [2, 1]
+    index.remove_object(2)
+    assert index.objects_at(75, 75) == [1]
+    assert 2 not in index and len(index) == 1
+
+
+def test_edges_near_follow_polygon_updates():
+    index = SpatialIndex()
+    index.insert_object(1, [0, 0, 100, 100], [SQUARE])
+    assert index.edges_near(50, 0, 2) == [(1, 0, 0)]
+    index.update_polygon(1, 0, shifted(SQUARE, 300, 0), [300, 0, 100, 100])
+    assert index.edges_near(50, 0, 2) == []
+    assert index.edges_near(350, 0, 2) == [(1, 0, 0)]
+    index.update_vertex(1, 0, 1, (300, 0), (450, 0), (400, 100), [300, 0, 150, 100])
+    assert (1, 0, 1) in index.edges_near(450, 0, 2)
+
+
+def test_lazy_edges_after_move():
+    polygons = {1: [SQUARE]}
+    index = SpatialIndex(polygon_source=polygons.__getitem__)
+    index.insert_object(1, [0, 0, 100, 100])
+    assert index.unindexed == {1}
+    assert index.edges_near(50, 0, 2) == [(1, 0, 0)]
+    assert not index.unindexed
+    polygons[1] = [shifted(SQUARE, 200, 200)]
+    index.move_objects([1], [[200, 200, 100, 100]])
+    assert index.edges_near(50, 0, 2) == []
+    assert index.edges_near(250, 200, 2) == [(1, 0, 0)]
+
+
+def test_dragged_polygon_is_indexed_on_release(app):
+    canvas = CanvasWidget()
+    with contextlib.redirect_stdout(io.StringIO()):
+        canvas.update_annotation_type(ANNOTATION_TYPE.POLYGON)
+        canvas.update_annotation_from_json([{"id": 0, "category_id": 0, "bbox": [0, 0, 100, 100],
+                                             "segmentation": [[0, 0, 100, 0, 100, 100, 0, 100]]}])
+        canvas.set_annotation_mode(ANNOTATION_MODE.EDIT)
+    assert canvas.find_polygon_to_edit(QPoint(100, 100))[:3] == (0, 0, 2)
+    canvas.selected_object = 0
+    canvas.selected_object_subset = 0
+    canvas.last_mouse_position = QPoint(50, 50)
+    for step in range(1, 11):
+        canvas.move_polygon(QPoint(50 + 20 * step, 50 + 10 * step))
+    # the bounding box follows the drag
+    assert canvas.spatial_index.objects_at(300, 200) == [0]
+    canvas.finish_polygon_move()
+    assert canvas.find_polygon_to_edit(QPoint(100, 100))[0] is None
+    assert canvas.find_polygon_to_edit(QPoint(300, 200))[:3] == (0, 0, 2)
+    canvas.undo()
+    assert canvas.update_annotation_to_json()[0]["segmentation"] == [[0, 0, 100, 0, 100, 100, 0, 100]]
+    canvas.deleteLater()